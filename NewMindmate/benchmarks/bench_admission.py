@@ -0,0 +1,85 @@
+"""
+Admission control benchmark
+
+Simulates one doctor batch-analyzing a caseload while other doctors run
+interactive queries against a Cognitive API that takes --bulk-ms per
+analysis and --query-ms per query. Reports interactive query latency
+(queueing + upstream) with:
+
+  fifo      - plain semaphore of --slots, first come first served
+  priority  - PriorityLimiter with interactive-first queueing and
+              --reserved slots kept for interactive work
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_admission [--analyses 200] [--queries 50] [--slots 8] [--reserved 2]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from NewMindmate.services.admission import BULK, INTERACTIVE, PriorityLimiter
+
+
+class FifoLimiter:
+    def __init__(self, slots: int):
+        self.semaphore = asyncio.Semaphore(slots)
+
+    def slot(self, priority: int):
+        return self.semaphore
+
+
+async def simulate(limiter, args) -> list:
+    rng = random.Random(0)
+    latencies = []
+
+    async def analysis():
+        async with limiter.slot(BULK):
+            await asyncio.sleep(args.bulk_ms / 1000 * rng.uniform(0.5, 1.5))
+
+    async def query():
+        start = time.perf_counter()
+        async with limiter.slot(INTERACTIVE):
+            await asyncio.sleep(args.query_ms / 1000 * rng.uniform(0.5, 1.5))
+        latencies.append(time.perf_counter() - start)
+
+    async def doctors():
+        for _ in range(args.queries):
+            await asyncio.sleep(args.think_ms / 1000 * rng.uniform(0.5, 1.5))
+            asyncio.create_task(query())
+
+    bulk = [asyncio.create_task(analysis()) for _ in range(args.analyses)]
+    await doctors()
+    await asyncio.gather(*bulk)
+    while len(latencies) < args.queries:
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--reserved", type=int, default=2)
+    parser.add_argument("--bulk-ms", type=float, default=500)
+    parser.add_argument("--query-ms", type=float, default=100)
+    parser.add_argument("--think-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    print(f"{'scheduler':<10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, limiter in (
+        ("fifo", FifoLimiter(args.slots)),
+        ("priority", PriorityLimiter(args.slots, args.reserved)),
+    ):
+        latencies = sorted(asyncio.run(simulate(limiter, args)))
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(
+            f"{name:<10} {statistics.median(latencies) * 1000:>8.0f} "
+            f"{p95 * 1000:>8.0f} {latencies[-1] * 1000:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Audio playback seek benchmark
+
+Times random seeks (single 64KB Range requests) against GET /audio/{path} and
+reports p50/p95 latency for each serving path:
+
+    storage, signing     every request signs a new URL, then fetches from storage
+    storage, cached URL  signed URL reused, bytes still fetched from storage
+    disk cache           recording is hot and served from the local disk cache
+
+Runs the app in-process against a simulated storage service with the given
+round-trip and signing latencies. Pass --url to time seeks against a running
+server instead (e.g. http://localhost:8000/audio/audio/<patient>/<sha256>.wav).
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_audio_playback [--seeks 200] [--size-mb 20]
+        [--storage-ms 40] [--sign-ms 80] [--url URL]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+SEEK_BYTES = 64 * 1024
+PATH = "audio/bench/recording.wav"
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(0.95 * (len(samples) - 1))]
+    print(f"{label:<22} {statistics.median(samples) * 1000:>9.2f} {p95 * 1000:>9.2f}")
+
+
+async def time_seeks(client, url, size, seeks, rng, before_each=None):
+    samples = []
+    for _ in range(seeks):
+        if before_each:
+            before_each()
+        start = rng.randrange(0, size - SEEK_BYTES)
+        began = time.perf_counter()
+        response = await client.get(url, headers={"Range": f"bytes={start}-{start + SEEK_BYTES - 1}"})
+        assert response.status_code == 206, response.status_code
+        samples.append(time.perf_counter() - began)
+    return samples
+
+
+async def bench_live(url, seeks, rng):
+    async with httpx.AsyncClient(timeout=30) as client:
+        head = await client.get(url, headers={"Range": "bytes=0-0"})
+        size = int(head.headers["content-range"].rsplit("/", 1)[1])
+        summarize("live server", await time_seeks(client, url, size, seeks, rng))
+
+
+async def bench_in_process(args, rng):
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+    os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+    from NewMindmate import main
+    from NewMindmate.services import audio_playback as playback
+
+    audio = os.urandom(int(args.size_mb * 1024 * 1024))
+
+    async def storage(request):
+        await asyncio.sleep(args.storage_ms / 1000)
+        byte_range = playback.parse_range(request.headers.get("range"), len(audio))
+        if byte_range is None:
+            return httpx.Response(200, content=audio, headers={"content-length": str(len(audio))})
+        start, end = byte_range
+        return httpx.Response(206, content=audio[start:end + 1], headers={
+            "content-range": f"bytes {start}-{end}/{len(audio)}",
+        })
+
+    def sign(path, expires_in):
+        time.sleep(args.sign_ms / 1000)
+        return {"signedURL": f"https://storage.bench/{path}?token=x"}
+
+    supabase = MagicMock()
+    supabase.storage.from_.return_value.create_signed_url.side_effect = sign
+    storage_client = httpx.AsyncClient(transport=httpx.MockTransport(storage))
+
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            patch.object(main, "get_supabase", return_value=supabase), \
+            patch.object(playback, "get_client", return_value=storage_client), \
+            patch.object(playback, "SIGNED_URLS", playback.SignedUrlCache()), \
+            patch.object(playback, "AUDIO_DISK_CACHE", playback.AudioDiskCache(cache_dir, max_bytes=len(audio) * 8)):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            url = f"/audio/{PATH}"
+            # Keep the recording cold (never admitted) for the storage phases
+            playback.AUDIO_DISK_CACHE.min_requests = args.seeks * 10
+            cold = await time_seeks(
+                client, url, len(audio), args.seeks, rng,
+                before_each=lambda: playback.SIGNED_URLS.invalidate(main.AUDIO_BUCKET_NAME, PATH),
+            )
+            warm = await time_seeks(client, url, len(audio), args.seeks, rng)
+
+            playback.AUDIO_DISK_CACHE.min_requests = 1
+            await client.get(url, headers={"Range": "bytes=0-0"})
+            while PATH not in playback.AUDIO_DISK_CACHE:
+                await asyncio.sleep(0.01)
+            disk = await time_seeks(client, url, len(audio), args.seeks, rng)
+
+    summarize("storage, signing", cold)
+    summarize("storage, cached URL", warm)
+    summarize("disk cache", disk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeks", type=int, default=200)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--storage-ms", type=float, default=40, help="Simulated storage round trip")
+    parser.add_argument("--sign-ms", type=float, default=80, help="Simulated URL signing call")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{args.seeks} seeks of {SEEK_BYTES // 1024}KB\n")
+    print(f"{'path':<22} {'p50 ms':>9} {'p95 ms':>9}")
+    if args.url:
+        asyncio.run(bench_live(args.url, args.seeks, rng))
+    else:
+        asyncio.run(bench_in_process(args, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Response compression benchmark
+
+Builds representative bodies for three endpoints and reports, per encoding,
+the wire size and the CPU time to encode (server) and decode (client):
+
+  analytics  - PatientData with five memoryMetrics time series
+  sessions   - session list with transcripts
+  memories   - memory list with base64 float32 embeddings
+
+Encodings: JSON with identity, gzip (levels 1 and 6), brotli and zstd when
+installed, and MessagePack (plain and gzip) when msgpack is installed.
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_compression [--points 2000] [--sessions 200] [--memories 500] [--repeat 5]
+"""
+import argparse
+import base64
+import gzip
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import numpy as np
+
+from NewMindmate.services import compression
+from NewMindmate.services.serialization import dumps, msgpack
+
+WORDS = (
+    "garden granddaughter Boston aquarium remember wedding church kitchen recipe brother "
+    "summer lake fishing school teacher piano Sunday market bakery neighbour dog walk"
+).split()
+
+
+def analytics_body(points: int, rng: random.Random) -> dict:
+    start = datetime(2024, 1, 1)
+    series = {
+        name: [
+            {"timestamp": (start + timedelta(hours=6 * i)).isoformat(), "score": round(60 + 30 * rng.random(), 2)}
+            for i in range(points)
+        ]
+        for name in ("shortTermRecall", "longTermRecall", "semanticMemory", "episodicMemory", "workingMemory")
+    }
+    return {"patientId": str(uuid4()), "patientName": "Ann Smith", "memoryMetrics": series}
+
+
+def sessions_body(count: int, rng: random.Random) -> list:
+    patient_id = str(uuid4())
+    return [
+        {
+            "session_id": str(uuid4()),
+            "patient_id": patient_id,
+            "session_date": (datetime(2024, 1, 1) + timedelta(days=i)).isoformat(),
+            "exercise_type": "memory_recall",
+            "transcript": "\n".join(
+                f"{rng.choice(['Patient', 'Assistant'])}: " + " ".join(rng.choices(WORDS, k=12)) for _ in range(60)
+            ),
+            "notable_events": ["Mentioned Boston"],
+            "overall_score": round(100 * rng.random(), 1),
+            "created_at": (datetime(2024, 1, 1) + timedelta(days=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def memories_body(count: int, rng: random.Random) -> list:
+    vectors = np.random.default_rng(0).standard_normal((count, 1536)).astype("<f4")
+    return [
+        {
+            "memory_id": str(uuid4()),
+            "title": " ".join(rng.choices(WORDS, k=3)),
+            "description": " ".join(rng.choices(WORDS, k=30)),
+            "tags": rng.choices(WORDS, k=3),
+            "significance_level": rng.randint(1, 10),
+            "embedding": base64.b64encode(vectors[i].tobytes()).decode(),
+            "embedding_encoding": "float32-le-base64",
+        }
+        for i in range(count)
+    ]
+
+
+def codecs():
+    """name -> (serialize, encode, decode)"""
+    result = {
+        "json": (dumps, None, None),
+        "json+gzip-1": (dumps, lambda b: gzip.compress(b, 1, mtime=0), gzip.decompress),
+        "json+gzip-6": (dumps, lambda b: gzip.compress(b, 6, mtime=0), gzip.decompress),
+    }
+    if compression.brotli is not None:
+        result[f"json+br-{compression.BROTLI_QUALITY}"] = (dumps, compression.ENCODERS["br"], compression.brotli.decompress)
+    if compression.zstandard is not None:
+        decompressor = compression.zstandard.ZstdDecompressor()
+        result[f"json+zstd-{compression.ZSTD_LEVEL}"] = (dumps, compression.ENCODERS["zstd"], decompressor.decompress)
+    if msgpack is not None:
+        packb = lambda content: msgpack.packb(content, use_bin_type=True)
+        result["msgpack"] = (packb, None, None)
+        result["msgpack+gzip-6"] = (packb, lambda b: gzip.compress(b, 6, mtime=0), gzip.decompress)
+    return result
+
+
+def timed(fn, arg, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(arg)
+        samples.append(time.perf_counter() - start)
+    return out, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--memories", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    bodies = {
+        "analytics": analytics_body(args.points, rng),
+        "sessions": sessions_body(args.sessions, rng),
+        "memories": memories_body(args.memories, rng),
+    }
+
+    for endpoint, content in bodies.items():
+        baseline = len(dumps(content))
+        print(f"\n{endpoint} ({baseline:,} bytes as JSON)")
+        print(f"{'encoding':<16} {'wire bytes':>12} {'ratio':>7} {'serialize ms':>13} {'encode ms':>10} {'decode ms':>10}")
+        for name, (serialize, encode, decode) in codecs().items():
+            body, serialize_s = timed(serialize, content, args.repeat)
+            wire, encode_s = timed(encode, body, args.repeat) if encode else (body, 0.0)
+            decode_s = timed(decode, wire, args.repeat)[1] if decode else 0.0
+            print(
+                f"{name:<16} {len(wire):>12,} {baseline / len(wire):>6.1f}x "
+                f"{serialize_s * 1000:>13.2f} {encode_s * 1000:>10.2f} {decode_s * 1000:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Score series downsampling benchmark
+
+For score histories of growing length, reports the JSON size of the full
+series and the time to produce a --max-points chart series:
+
+  full     - every point, serialized (what analytics returned before)
+  lttb     - LTTB over the whole history on each request
+  pyramid  - query of a prebuilt SeriesPyramid (built once per data version,
+             build time shown separately)
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_downsampling [--max-points 300] [--lengths 1000,10000,100000] [--repeat 20]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from NewMindmate.services.downsampling import SeriesPyramid, lttb
+
+
+def series(length):
+    rng = np.random.default_rng(0)
+    x = np.arange(length, dtype=np.float64) * 86400
+    y = np.clip(70 + np.cumsum(rng.normal(0, 0.5, length)) + rng.normal(0, 3, length), 0, 100)
+    return x, y
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def as_json(x, y, positions):
+    base = datetime(2000, 1, 1)
+    return json.dumps([{"timestamp": (base + timedelta(seconds=float(x[i]))).isoformat(), "score": float(y[i])} for i in positions])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-points", type=int, default=300)
+    parser.add_argument("--lengths", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'full KB':>8} {'chart KB':>9} {'lttb ms':>8} {'build ms':>9} {'pyramid ms':>11}")
+    for length in (int(n) for n in args.lengths.split(",")):
+        x, y = series(length)
+        full_kb = len(as_json(x, y, range(length))) / 1024
+        lttb_ms, kept = timed(lambda: lttb(x, y, args.max_points), args.repeat)
+        build_ms, pyramid = timed(lambda: SeriesPyramid(x, y), 1)
+        query_ms, _ = timed(lambda: pyramid.query(args.max_points), args.repeat)
+        chart_kb = len(as_json(x, y, kept)) / 1024
+        print(f"{length:>8} {full_kb:>8.0f} {chart_kb:>9.1f} {lttb_ms:>8.2f} {build_ms:>9.1f} {query_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Embedding representation benchmark
+
+Measures, for N memories with 1536-dim embeddings:
+  - resident memory of list-of-float embeddings vs float32 NumPy arrays
+  - bytes on the wire per memory for each embedding_format
+  - encode time per memory
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_embeddings [--memories 1000]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from NewMindmate.db.vector_utils import VECTOR_DIM, as_float32, encode_embedding, to_pgvector
+
+
+def measure_memory(build) -> int:
+    tracemalloc.start()
+    value = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.memories, VECTOR_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    as_lists = vectors.tolist()
+
+    print(f"memories: {args.memories}, dim: {VECTOR_DIM}\n")
+
+    list_bytes = measure_memory(lambda: [v.tolist() for v in vectors])
+    array_bytes = measure_memory(lambda: [as_float32(v) for v in as_lists])
+    matrix_bytes = measure_memory(lambda: np.array(as_lists, dtype=np.float32))
+    print("In-process memory")
+    print(f"  List[float] per memory      {list_bytes / args.memories:>10,.0f} B")
+    print(f"  float32 array per memory    {array_bytes / args.memories:>10,.0f} B")
+    print(f"  float32 matrix per memory   {matrix_bytes / args.memories:>10,.0f} B\n")
+
+    sample = vectors[: min(200, args.memories)]
+    formats = {
+        "json list (before)": lambda v: json.dumps(v.tolist()),
+        "pgvector literal": to_pgvector,
+        "base64 float32": lambda v: json.dumps(encode_embedding(v, "base64")),
+        "base64 float16": lambda v: json.dumps(encode_embedding(v, "base64_f16")),
+    }
+    print("Bytes on the wire per memory embedding")
+    baseline = None
+    for name, encode in formats.items():
+        start = time.perf_counter()
+        sizes = [len(encode(v)) for v in sample]
+        elapsed = (time.perf_counter() - start) / len(sample)
+        size = sum(sizes) / len(sizes)
+        baseline = baseline or size
+        print(f"  {name:<20} {size:>8,.0f} B  ({baseline / size:4.1f}x smaller)  {elapsed * 1e6:7.1f} µs/encode")
+
+
+if __name__ == "__main__":
+    main()
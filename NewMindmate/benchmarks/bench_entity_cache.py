@@ -0,0 +1,80 @@
+"""
+Entity cache benchmark
+
+Replays Zipf-distributed single-row lookups (a few hot patients and sessions
+get most reads) against a simulated Supabase round trip of --db-ms, with a
+write (and invalidation) every --write-every reads, and reports hit ratio,
+database loads and mean / p99 lookup latency:
+
+  none    - every lookup goes to the database
+  local   - in-process LRU + TTL
+  shared  - local tier plus the Redis backend at --redis-url, two "workers"
+            alternating requests (needs the redis package and a server, e.g.
+            python -m NewMindmate.redis_standin)
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_entity_cache [--lookups 5000] [--rows 2000] [--db-ms 4] [--redis-url redis://localhost:6380/0]
+"""
+import argparse
+import random
+import time
+
+from NewMindmate.services.entity_cache import EntityCache, RedisBackend
+
+
+def workload(args):
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.rows)]
+    return rng.choices(range(args.rows), weights=weights, k=args.lookups)
+
+
+def run(name, caches, ids, args):
+    loads = 0
+
+    def load_row(entity_id):
+        nonlocal loads
+        loads += 1
+        time.sleep(args.db_ms / 1000)
+        return {"patient_id": str(entity_id), "name": f"Patient {entity_id}"}
+
+    latencies = []
+    for i, entity_id in enumerate(ids):
+        cache = caches[i % len(caches)] if caches else None
+        start = time.perf_counter()
+        if cache is None:
+            load_row(entity_id)
+        else:
+            cache.get_or_load("patients", entity_id, lambda: load_row(entity_id))
+            if args.write_every and i % args.write_every == 0:
+                cache.invalidate("patients", entity_id)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(
+        f"{name:<8} {1 - loads / len(ids):>9.1%} {loads:>8} "
+        f"{sum(latencies) / len(latencies) * 1000:>9.3f} {latencies[int(0.99 * (len(latencies) - 1))] * 1000:>8.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--db-ms", type=float, default=4.0)
+    parser.add_argument("--write-every", type=int, default=50)
+    parser.add_argument("--max-entries", type=int, default=512)
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    ids = workload(args)
+    print(f"{'cache':<8} {'hit ratio':>9} {'db loads':>8} {'mean ms':>9} {'p99 ms':>8}")
+    run("none", [], ids, args)
+    run("local", [EntityCache(max_entries=args.max_entries, ttl=60)], ids, args)
+    if args.redis_url:
+        workers = [EntityCache(max_entries=args.max_entries, ttl=60, backend=RedisBackend(args.redis_url)) for _ in range(2)]
+        run("shared", workers, ids, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Quantized memory search benchmark
+
+Builds exact, int8 and binary per-patient indexes over synthetic clustered
+embeddings (memories about the same people/places sit close together) and
+reports recall@k against exact search, query latency and index memory.
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_quantization [--memories 5000] [--queries 200] [--k 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from NewMindmate.db.memory_index import PatientMemoryIndex, QuantizedPatientMemoryIndex
+from NewMindmate.db.vector_utils import VECTOR_DIM
+
+
+def make_embeddings(n: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, VECTOR_DIM)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((n, VECTOR_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(index, queries, truth, k: int) -> tuple:
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        got = {row["memory_id"] for row in index.search(query, k)}
+        hits += len(got & expected)
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return hits / (len(queries) * k), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_embeddings(args.memories, args.clusters, rng)
+    ids = [f"m{i}" for i in range(args.memories)]
+    by_id = dict(zip(ids, vectors))
+    queries = make_embeddings(args.queries, args.clusters, rng)
+
+    exact = PatientMemoryIndex("bench", VECTOR_DIM, capacity=args.memories)
+    for memory_id, vector in by_id.items():
+        exact.add(memory_id, vector)
+    truth = [{row["memory_id"] for row in exact.search(q, args.k)} for q in queries]
+
+    def fetch(memory_ids):
+        return {mid: by_id[mid] for mid in memory_ids}
+
+    _, exact_latency = recall_at_k(exact, queries, truth, args.k)
+    print(f"memories: {args.memories}, dim: {VECTOR_DIM}, k: {args.k}\n")
+    print(f"{'index':<18} {'bytes':>12} {'saving':>7} {'recall@k':>9} {'ms/query':>9}")
+    print(f"{'float32 exact':<18} {exact.nbytes:>12,} {'1.0x':>7} {1.0:>9.3f} {exact_latency * 1000:>9.2f}")
+
+    for mode in ("int8", "binary"):
+        for oversample in (1, 4, 10):
+            index = QuantizedPatientMemoryIndex("bench", VECTOR_DIM, mode, fetch, capacity=args.memories, oversample=oversample)
+            for memory_id, vector in by_id.items():
+                index.add(memory_id, vector)
+            if oversample == 1:
+                # No rerank headroom: measures the quantized first pass alone
+                index.fetch_vectors = lambda memory_ids: {}
+            recall, latency = recall_at_k(index, queries, truth, args.k)
+            label = f"{mode} x{oversample}" + ("" if oversample > 1 else " (no rerank)")
+            saving = exact.nbytes / index.nbytes
+            print(f"{label:<18} {index.nbytes:>12,} {saving:>6.1f}x {recall:>9.3f} {latency * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Serialization microbenchmark
+
+Compares the cost of turning N session rows into a JSON response body:
+
+  pydantic   - SessionResponse(**row) per row, then FastAPI's response_model
+               validation + jsonable_encoder + stdlib json (the old path)
+  validated  - response_model validation, serialized with orjson
+  trusted    - trusted_rows() projection, serialized with orjson
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_serialization [--rows 1000 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from NewMindmate.schemas import SessionResponse
+from NewMindmate.services.serialization import dumps, trusted_rows, orjson
+
+
+TRANSCRIPT = (
+    "Doctor: Can you tell me about your granddaughter? "
+    "Patient: She lives in Boston, we went to the aquarium last month. "
+) * 20
+
+
+def make_rows(n: int) -> List[dict]:
+    base = datetime(2024, 1, 1)
+    patient_id = str(uuid4())
+    return [
+        {
+            "session_id": str(uuid4()),
+            "patient_id": patient_id,
+            "session_date": (base + timedelta(days=i)).isoformat(),
+            "exercise_type": "memory_recall",
+            "transcript": TRANSCRIPT,
+            "ai_extracted_data": {"summary": "Recalled family trip", "confidence": 0.82},
+            "cognitive_test_scores": [
+                {"test": "short_term_recall", "score": 7, "max_score": 10},
+                {"test": "semantic_memory", "score": 8, "max_score": 10},
+            ],
+            "notable_events": ["Mentioned Boston", "Named granddaughter"],
+            "doctor_notes": None,
+            "overall_score": 75.0,
+            "created_at": (base + timedelta(days=i)).isoformat(),
+            "audio_url": None,
+        }
+        for i in range(n)
+    ]
+
+
+def pydantic_path(rows: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[SessionResponse])
+    models = [SessionResponse(**row) for row in rows]
+    validated = adapter.validate_python(models, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def validated_orjson_path(rows: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[SessionResponse])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def trusted_path(rows: List[dict]) -> bytes:
+    return dumps(trusted_rows(rows, SessionResponse))
+
+
+def bench(fn, rows: List[dict], repeat: int) -> tuple:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(rows)
+        timings.append(time.perf_counter() - start)
+        size = len(body)
+    timings.sort()
+    return timings[len(timings) // 2], size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"orjson available: {orjson is not None}")
+    print(f"{'rows':>7} {'path':<10} {'median ms':>10} {'µs/row':>8} {'bytes':>12} {'speedup':>8}")
+    for n in args.rows:
+        rows = make_rows(n)
+        baseline = None
+        for name, fn in (("pydantic", pydantic_path), ("validated", validated_orjson_path), ("trusted", trusted_path)):
+            median, size = bench(fn, rows, args.repeat)
+            baseline = baseline or median
+            print(f"{n:>7} {name:<10} {median * 1000:>10.1f} {median / n * 1e6:>8.1f} {size:>12,} {baseline / median:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
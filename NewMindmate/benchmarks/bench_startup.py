@@ -0,0 +1,87 @@
+"""
+Startup benchmark
+
+Each run starts a fresh interpreter and measures:
+
+    import        importing NewMindmate.main
+    first request app start (lifespan entered) to the first /health response
+    ready         app start to /ready answering 200 (warm-up finished)
+
+--eager imports numpy and supabase before the app, which is what importing
+the app cost before those became lazy.
+
+Requests go through httpx.ASGITransport, so no server or database is needed;
+the Supabase client is built against placeholder credentials if none are set.
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_startup [--runs 5] [--eager]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def child(eager: bool) -> None:
+    os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+    os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+    start = time.perf_counter()
+    if eager:
+        import numpy  # noqa: F401
+        import supabase  # noqa: F401
+    from NewMindmate.main import app
+    imported = time.perf_counter()
+
+    import httpx
+
+    async def serve():
+        async with app.router.lifespan_context(app):
+            began = time.perf_counter()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+                assert (await client.get("/health")).status_code == 200
+                first = time.perf_counter()
+                while (await client.get("/ready")).status_code != 200:
+                    await asyncio.sleep(0.001)
+                warm = time.perf_counter()
+        return began, first, warm
+
+    began, first, warm = asyncio.run(serve())
+    print(json.dumps({
+        "import": imported - start,
+        "first_request": first - began,
+        "ready": warm - began,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="Import numpy and supabase up front")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager)
+        return
+
+    command = [sys.executable, "-m", "NewMindmate.benchmarks.bench_startup", "--child"]
+    if args.eager:
+        command.append("--eager")
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.runs} runs, {'eager' if args.eager else 'lazy'} imports\n")
+    print(f"{'phase':<14} {'median ms':>10} {'max ms':>10}")
+    for phase in ("import", "first_request", "ready"):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<14} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
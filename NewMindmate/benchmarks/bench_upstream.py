@@ -0,0 +1,79 @@
+"""
+Upstream tail latency benchmark
+
+Simulates an upstream whose answers take --base-ms (log-normal spread) but
+where --stuck-pct of requests hang on a stuck connection until the timeout.
+Sends --requests sequential calls three ways and reports p50 / p95 / p99 /
+max latency, failures and extra upstream load:
+
+  fixed     - single attempt with a fixed --fixed-timeout
+  adaptive  - single attempt with the adaptive timeout (3 x p99)
+  hedged    - adaptive timeout plus a hedge after the p95
+
+Usage:
+    python -m NewMindmate.benchmarks.bench_upstream [--requests 1000] [--stuck-pct 2] [--base-ms 20]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from NewMindmate.services import metrics
+from NewMindmate.services.upstream import AdaptiveTimeout, request
+
+
+def make_send(rng: random.Random, args, counter: list):
+    async def send(timeout, headers):
+        counter[0] += 1
+        if rng.random() < args.stuck_pct / 100:
+            await asyncio.sleep(timeout)
+            raise httpx.ReadTimeout("stuck connection")
+        await asyncio.sleep(rng.lognormvariate(0, 0.4) * args.base_ms / 1000)
+        return httpx.Response(200)
+    return send
+
+
+async def run(name: str, args) -> None:
+    rng = random.Random(0)
+    attempts = [0]
+    send = make_send(rng, args, attempts)
+    if name == "fixed":
+        policy = AdaptiveTimeout("bench", name, args.fixed_timeout, args.fixed_timeout, args.fixed_timeout)
+    else:
+        policy = AdaptiveTimeout("bench", name, default=args.fixed_timeout, floor=0.01, ceiling=args.fixed_timeout)
+
+    latencies, failures = [], 0
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        try:
+            await request(policy, send, hedge=(name == "hedged"))
+        except httpx.TimeoutException:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(
+        f"{name:<9} {pick(0.5):>8.1f} {pick(0.95):>8.1f} {pick(0.99):>8.1f} {latencies[-1] * 1000:>9.1f} "
+        f"{failures:>9} {attempts[0] / args.requests - 1:>8.1%} "
+        f"{metrics.UPSTREAM_HEDGE_WINS.value('bench', name):>5.0f}/{metrics.UPSTREAM_HEDGES.value('bench', name):<4.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--stuck-pct", type=float, default=2.0)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--fixed-timeout", type=float, default=1.0, help="seconds (scaled-down stand-in for 10-60 s)")
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>9} {'failures':>9} {'extra':>8} {'hedge won/fired':>15}")
+    for name in ("fixed", "adaptive", "hedged"):
+        asyncio.run(run(name, args))
+
+
+if __name__ == "__main__":
+    main()
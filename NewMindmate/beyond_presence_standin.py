@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Beyond Presence calls API, for developing call ingestion
+without live avatar calls.
+
+Serves /v1/calls, /v1/calls/{call_id} and /v1/calls/{call_id}/messages with
+the same page shape the client understands ({data, next_cursor}). Calls are
+loaded from BEY_STANDIN_FILE (JSON list of calls, each with a "messages" list)
+or added with POST /v1/calls.
+
+Usage:
+    uv run uvicorn NewMindmate.beyond_presence_standin:app --port 8100
+    BEY_BASE_URL=http://localhost:8100/v1 BEY_API_KEY=dev CALL_INGEST_POLL_SECONDS=30 \\
+        uv run uvicorn NewMindmate.main:app
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import FastAPI, HTTPException, Query
+
+app = FastAPI(title="Beyond Presence Stand-in")
+
+PAGE_SIZE = 50
+
+_calls: Dict[str, Dict] = {}
+
+
+def load_calls(path: str) -> None:
+    with open(path) as f:
+        for call in json.load(f):
+            add_call(call)
+
+
+def add_call(call: Dict) -> Dict:
+    call = dict(call)
+    call.setdefault("id", str(uuid4()))
+    call.setdefault("started_at", datetime.now(timezone.utc).isoformat())
+    call.setdefault("ended_at", None)
+    call.setdefault("metadata", {})
+    call.setdefault("messages", [])
+    _calls[call["id"]] = call
+    return call
+
+
+def _page(items: List, cursor: Optional[str]) -> Dict:
+    start = int(cursor or 0)
+    end = start + PAGE_SIZE
+    return {"data": items[start:end], "next_cursor": str(end) if end < len(items) else None}
+
+
+def _summary(call: Dict) -> Dict:
+    return {k: v for k, v in call.items() if k != "messages"}
+
+
+@app.get("/v1/calls")
+def list_calls(cursor: Optional[str] = Query(None)):
+    # Newest first, like the real API
+    calls = sorted(_calls.values(), key=lambda call: call["started_at"], reverse=True)
+    return _page([_summary(call) for call in calls], cursor)
+
+
+@app.post("/v1/calls", status_code=201)
+def create_call(call: Dict):
+    return _summary(add_call(call))
+
+
+@app.get("/v1/calls/{call_id}")
+def get_call(call_id: str):
+    if call_id not in _calls:
+        raise HTTPException(status_code=404, detail="Call not found")
+    return _summary(_calls[call_id])
+
+
+@app.get("/v1/calls/{call_id}/messages")
+def get_call_messages(call_id: str, cursor: Optional[str] = Query(None)):
+    if call_id not in _calls:
+        raise HTTPException(status_code=404, detail="Call not found")
+    return _page(_calls[call_id]["messages"], cursor)
+
+
+if os.getenv("BEY_STANDIN_FILE"):
+    load_calls(os.environ["BEY_STANDIN_FILE"])
@@ -0,0 +1,412 @@
+"""
+In-process per-patient memory index
+
+Each patient has at most a few thousand memories, so an exact index is cheap:
+embeddings are kept L2-normalized in one contiguous float32 matrix and a top-k
+query is a single matrix-vector product plus argpartition.
+
+With MEMORY_EMBEDDING_QUANTIZATION=int8|binary the index holds only quantized
+codes (4x / 32x smaller), scans those, and reranks the best candidates with
+full-precision embeddings fetched from the memories table.
+
+Indexes are built lazily from the memories table on first search, updated in
+place by store_memory_embedding (which also uses them to fold near-duplicate
+memories into existing ones), and evicted least-recently-used once the
+total size exceeds MEMORY_INDEX_MAX_MB. A build and the in-place updates of
+the same patient hold one of MEMORY_INDEX_LOCK_STRIPES locks, so a memory
+inserted while its patient's index is being built is applied to that index
+rather than lost.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from NewMindmate.db import quantization
+from NewMindmate.services.startup import lazy_import
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+np = lazy_import("numpy")
+
+
+MEMORY_INDEX_MAX_MB = float(os.getenv("MEMORY_INDEX_MAX_MB", "256"))
+MEMORY_INDEX_LOCK_STRIPES = 64
+
+
+def _normalize(vec: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    n = scores.shape[0]
+    k = min(k, n)
+    top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class PatientMemoryIndex:
+    """Exact cosine-similarity index over one patient's memories"""
+
+    def __init__(self, patient_id: str, dim: int, capacity: int = 64):
+        self.patient_id = patient_id
+        self.dim = dim
+        self._ids: List[str] = []
+        self._rows: List[Dict] = []
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._allocate(max(capacity, 1))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._positions
+
+    # Storage hooks (overridden by QuantizedPatientMemoryIndex)
+    def _allocate(self, capacity: int) -> None:
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+
+    @property
+    def _capacity(self) -> int:
+        return self._matrix.shape[0]
+
+    def _resize(self, capacity: int) -> None:
+        old, n = self._matrix, len(self._ids)
+        self._allocate(capacity)
+        self._matrix[:n] = old[:n]
+
+    def _store(self, position: int, vector: np.ndarray) -> None:
+        self._matrix[position] = vector
+
+    def _move(self, src: int, dst: int) -> None:
+        self._matrix[dst] = self._matrix[src]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        return self._matrix[: len(self._ids)] @ query
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes
+
+    def _grow(self, needed: int) -> None:
+        if needed > self._capacity:
+            self._resize(max(needed, self._capacity * 2))
+
+    def _slot(self, memory_id: str, row: Optional[Dict]) -> int:
+        metadata = {k: v for k, v in (row or {}).items() if not k.startswith("embedding")}
+        metadata.setdefault("memory_id", memory_id)
+        position = self._positions.get(memory_id)
+        if position is None:
+            position = len(self._ids)
+            self._grow(position + 1)
+            self._ids.append(memory_id)
+            self._rows.append(metadata)
+            self._positions[memory_id] = position
+        else:
+            self._rows[position] = metadata
+        return position
+
+    def add(self, memory_id: str, vector: np.ndarray, row: Optional[Dict] = None) -> None:
+        """Insert or replace a memory's vector"""
+        vector = _normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            self._store(self._slot(memory_id, row), vector)
+
+    def update_row(self, memory_id: str, fields: Dict) -> bool:
+        """Merge changed columns into a memory's metadata, keeping its vector"""
+        with self._lock:
+            position = self._positions.get(memory_id)
+            if position is None:
+                return False
+            self._rows[position] = dict(self._rows[position], **fields)
+            return True
+
+    def remove(self, memory_id: str) -> bool:
+        """Drop a memory by swapping the last row into its slot"""
+        with self._lock:
+            position = self._positions.pop(memory_id, None)
+            if position is None:
+                return False
+            last = len(self._ids) - 1
+            if position != last:
+                self._move(last, position)
+                self._ids[position] = self._ids[last]
+                self._rows[position] = self._rows[last]
+                self._positions[self._ids[position]] = position
+            self._ids.pop()
+            self._rows.pop()
+            return True
+
+    def _filtered_scores(self, query: np.ndarray, where: Optional[Callable[[Dict], bool]]) -> np.ndarray:
+        scores = self._scores(query)
+        if where is not None:
+            mask = np.fromiter((bool(where(row)) for row in self._rows), dtype=bool, count=len(self._rows))
+            scores = np.where(mask, scores, -np.inf)
+        return scores
+
+    def search(self, query: np.ndarray, k: int = 5, where: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """
+        Return up to k memory rows with a cosine 'similarity' key, best first
+
+        where optionally filters on row metadata (e.g. emotional_tone).
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            if not self._ids or k <= 0:
+                return []
+            scores = self._filtered_scores(query, where)
+            return [
+                dict(self._rows[i], similarity=float(scores[i]))
+                for i in _top_k(scores, k)
+                if scores[i] != -np.inf
+            ]
+
+
+class QuantizedPatientMemoryIndex(PatientMemoryIndex):
+    """
+    Index over int8 or binary codes with full-precision rerank
+
+    search() scans the codes, keeps k * oversample candidates and rescores
+    them exactly with vectors from fetch_vectors (memory_id -> embedding).
+    """
+
+    def __init__(
+        self,
+        patient_id: str,
+        dim: int,
+        mode: str,
+        fetch_vectors: Callable[[List[str]], Dict[str, np.ndarray]],
+        capacity: int = 64,
+        oversample: int = quantization.MEMORY_RERANK_OVERSAMPLE,
+    ):
+        self.mode = mode
+        self.fetch_vectors = fetch_vectors
+        self.oversample = max(oversample, 1)
+        super().__init__(patient_id, dim, capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        width = quantization.code_width(self.dim, self.mode)
+        self._codes = np.zeros((capacity, width), dtype=quantization.code_dtype(self.mode))
+        self._scales = np.ones(capacity, dtype=np.float32)
+
+    @property
+    def _capacity(self) -> int:
+        return self._codes.shape[0]
+
+    def _resize(self, capacity: int) -> None:
+        codes, scales, n = self._codes, self._scales, len(self._ids)
+        self._allocate(capacity)
+        self._codes[:n] = codes[:n]
+        self._scales[:n] = scales[:n]
+
+    def _store(self, position: int, vector: np.ndarray) -> None:
+        codes, scale = quantization.quantize(vector, self.mode)
+        self._codes[position] = codes
+        self._scales[position] = scale or 1.0
+
+    def _move(self, src: int, dst: int) -> None:
+        self._codes[dst] = self._codes[src]
+        self._scales[dst] = self._scales[src]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        n = len(self._ids)
+        if self.mode == "int8":
+            return quantization.int8_scores(self._codes[:n], self._scales[:n], query)
+        return quantization.binary_scores(self._codes[:n], query, self.dim)
+
+    @property
+    def nbytes(self) -> int:
+        return self._codes.nbytes + self._scales.nbytes
+
+    def add_codes(self, memory_id: str, codes: np.ndarray, scale: Optional[float], row: Optional[Dict] = None) -> None:
+        """Insert precomputed codes (as stored in memories.embedding_quantized)"""
+        with self._lock:
+            position = self._slot(memory_id, row)
+            self._codes[position] = codes
+            self._scales[position] = scale or 1.0
+
+    def search(self, query: np.ndarray, k: int = 5, where: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            if not self._ids or k <= 0:
+                return []
+            approx = self._filtered_scores(query, where)
+            candidates = [i for i in _top_k(approx, k * self.oversample) if approx[i] != -np.inf]
+            candidate_ids = [self._ids[i] for i in candidates]
+            rows = [self._rows[i] for i in candidates]
+        try:
+            vectors = self.fetch_vectors(candidate_ids)
+        except Exception as e:
+            print(f"⚠️  Rerank fetch failed, using quantized scores: {e}")
+            vectors = {}
+        exact = np.array([
+            float(_normalize(vectors[mid]) @ query) if mid in vectors else float(approx[i])
+            for mid, i in zip(candidate_ids, candidates)
+        ], dtype=np.float32)
+        return [dict(rows[j], similarity=float(exact[j])) for j in _top_k(exact, k)]
+
+
+class MemoryIndexCache:
+    """LRU cache of per-patient indexes bounded by total matrix bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._indexes: "OrderedDict[str, PatientMemoryIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-patient build/update locks, striped to keep their number fixed
+        self._patient_locks = [threading.Lock() for _ in range(MEMORY_INDEX_LOCK_STRIPES)]
+
+    def __contains__(self, patient_id: str) -> bool:
+        return str(patient_id) in self._indexes
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in list(self._indexes.values()))
+
+    def get(self, patient_id: str) -> Optional[PatientMemoryIndex]:
+        """Return the loaded index for a patient (marking it recently used), or None"""
+        with self._lock:
+            index = self._indexes.get(str(patient_id))
+            if index is not None:
+                self._indexes.move_to_end(str(patient_id))
+            return index
+
+    def _patient_lock(self, patient_id: str) -> threading.Lock:
+        return self._patient_locks[hash(str(patient_id)) % len(self._patient_locks)]
+
+    def get_or_build(self, supabase: Client, patient_id: str) -> PatientMemoryIndex:
+        index = self.get(patient_id)
+        if index is not None:
+            return index
+        # Held from the load until the index is registered: writes landing meanwhile wait and then apply to it
+        with self._patient_lock(patient_id):
+            index = self.get(patient_id)
+            if index is not None:
+                return index
+            index = build_patient_index(supabase, str(patient_id))
+            with self._lock:
+                self._indexes[str(patient_id)] = index
+                self._evict_locked()
+        return index
+
+    def add(self, patient_id: str, memory_id: str, vector: np.ndarray, row: Optional[Dict] = None) -> None:
+        """Apply an insert to the patient's index if it is loaded (or being built)"""
+        with self._patient_lock(patient_id):
+            index = self.get(patient_id)
+            if index is None:
+                return
+            index.add(memory_id, vector, row)
+        with self._lock:
+            self._evict_locked()
+
+    def update_row(self, patient_id: str, memory_id: str, fields: Dict) -> None:
+        """Apply a metadata update to the patient's index if it is loaded (or being built)"""
+        with self._patient_lock(patient_id):
+            index = self.get(patient_id)
+            if index is not None:
+                index.update_row(str(memory_id), fields)
+
+    def refresh(self, supabase: Client, patient_id: str, memory_id: str) -> None:
+        """Reload one memory into the patient's index if it is loaded (for writes made elsewhere)"""
+        from NewMindmate.db.vector_utils import as_float32
+
+        with self._patient_lock(patient_id):
+            index = self.get(patient_id)
+            if index is None:
+                return
+            result = supabase.table("memories").select("*").eq("memory_id", str(memory_id)).execute()
+            row = result.data[0] if result.data else None
+            if row is None or row.get("embedding") is None or str(row.get("patient_id")) != str(patient_id):
+                index.remove(str(memory_id))
+                return
+            index.add(str(memory_id), as_float32(row["embedding"]), row)
+        with self._lock:
+            self._evict_locked()
+
+    def remove(self, memory_id: str, patient_id: Optional[str] = None) -> None:
+        """Remove a memory from whichever loaded index holds it"""
+        if patient_id is not None:
+            candidates = [self._indexes.get(str(patient_id))]
+        else:
+            candidates = list(self._indexes.values())
+        for index in candidates:
+            if index is not None and index.remove(str(memory_id)):
+                return
+
+    def invalidate(self, patient_id: Optional[str] = None) -> None:
+        """Drop one patient's index (or all of them); it is rebuilt on next search"""
+        with self._lock:
+            if patient_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(str(patient_id), None)
+
+    def _evict_locked(self) -> None:
+        total = sum(index.nbytes for index in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            _, evicted = self._indexes.popitem(last=False)
+            total -= evicted.nbytes
+
+
+def _vector_fetcher(supabase: Client) -> Callable[[List[str]], Dict[str, np.ndarray]]:
+    from NewMindmate.db.vector_utils import as_float32
+
+    def fetch(memory_ids: List[str]) -> Dict[str, np.ndarray]:
+        if not memory_ids:
+            return {}
+        result = supabase.table("memories").select("memory_id,embedding").in_("memory_id", memory_ids).execute()
+        return {
+            str(row["memory_id"]): as_float32(row["embedding"])
+            for row in (result.data or [])
+            if row.get("embedding") is not None
+        }
+
+    return fetch
+
+
+def build_patient_index(
+    supabase: Client,
+    patient_id: str,
+    mode: str = quantization.MEMORY_EMBEDDING_QUANTIZATION,
+) -> PatientMemoryIndex:
+    """Load a patient's memories into a fresh index (exact or quantized)"""
+    from NewMindmate.db.vector_utils import VECTOR_DIM, MEMORY_COLUMNS_NO_EMBEDDING, as_float32
+
+    if mode == "none":
+        result = supabase.table("memories").select("*").eq("patient_id", patient_id).execute()
+        rows = [row for row in (result.data or []) if row.get("embedding") is not None]
+        index = PatientMemoryIndex(patient_id, VECTOR_DIM, capacity=len(rows))
+        for row in rows:
+            index.add(str(row["memory_id"]), as_float32(row["embedding"]), row)
+        return index
+
+    # Only the compact codes are transferred; rows stored before quantization
+    # was enabled (or with another mode) are quantized here from full vectors.
+    columns = MEMORY_COLUMNS_NO_EMBEDDING + ",embedding_quantized,embedding_scale,embedding_quantization"
+    result = supabase.table("memories").select(columns).eq("patient_id", patient_id).execute()
+    rows = result.data or []
+    fetch = _vector_fetcher(supabase)
+    index = QuantizedPatientMemoryIndex(patient_id, VECTOR_DIM, mode, fetch, capacity=len(rows))
+    missing = {}
+    for row in rows:
+        memory_id = str(row["memory_id"])
+        metadata = {k: v for k, v in row.items() if not k.startswith("embedding_")}
+        if row.get("embedding_quantized") and row.get("embedding_quantization") == mode:
+            codes = quantization.decode_codes(row["embedding_quantized"], mode)
+            index.add_codes(memory_id, codes, row.get("embedding_scale"), metadata)
+        else:
+            missing[memory_id] = metadata
+    if missing:
+        for memory_id, vector in fetch(list(missing)).items():
+            if memory_id in missing:
+                index.add(memory_id, vector, missing[memory_id])
+    return index
+
+
+MEMORY_INDEX = MemoryIndexCache(max_bytes=int(MEMORY_INDEX_MAX_MB * 1024 * 1024))
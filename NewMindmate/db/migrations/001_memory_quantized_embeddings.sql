@@ -0,0 +1,12 @@
+-- Quantized embedding columns for memories (MEMORY_EMBEDDING_QUANTIZATION=int8|binary)
+--
+-- embedding_quantized     base64 codes of the unit-normalized embedding
+--                         int8: 1 byte/dim, binary: sign bits, 1 bit/dim
+-- embedding_scale         int8 dequantization scale (NULL for binary)
+-- embedding_quantization  mode the codes were produced with
+--
+-- The full-precision `embedding` column is kept for reranking.
+
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding_quantized text;
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding_scale real;
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding_quantization text;
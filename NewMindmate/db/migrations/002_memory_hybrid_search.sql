@@ -0,0 +1,95 @@
+-- Hybrid full-text + vector search over memories
+--
+-- * search_tsv: weighted tsvector over title (A), tags (B) and description (C),
+--   maintained as a generated column and indexed with GIN
+-- * HNSW index on embedding for cosine distance
+-- * search_memories_hybrid(): ranks by ts_rank_cd and by cosine distance, then
+--   fuses the two rankings with reciprocal rank fusion (RRF). Either input may
+--   be NULL, giving a pure text or pure vector search.
+--
+-- Latency targets at 1M memories (HNSW ef_search=40, 60 candidates per side):
+-- p50 < 20 ms, p95 < 60 ms for patient-scoped queries; < 150 ms p95 unscoped.
+
+-- array_to_string() is only STABLE, so wrap it for use in a generated column
+CREATE OR REPLACE FUNCTION memories_tags_text(tags text[])
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT coalesce(array_to_string(tags, ' '), '') $$;
+
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS search_tsv tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', memories_tags_text(tags)), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS memories_search_tsv_idx ON memories USING gin (search_tsv);
+CREATE INDEX IF NOT EXISTS memories_embedding_hnsw_idx ON memories USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS memories_patient_filters_idx ON memories (patient_id, emotional_tone, significance_level);
+
+CREATE OR REPLACE FUNCTION search_memories_hybrid(
+    p_query text DEFAULT NULL,
+    p_query_embedding vector(1536) DEFAULT NULL,
+    p_patient_id uuid DEFAULT NULL,
+    p_emotional_tone text DEFAULT NULL,
+    p_min_significance int DEFAULT NULL,
+    p_match_count int DEFAULT 10,
+    p_candidates int DEFAULT 60,
+    p_rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+    memory_id uuid,
+    patient_id uuid,
+    title text,
+    description text,
+    dateapprox date,
+    location text,
+    emotional_tone text,
+    tags text[],
+    significance_level int,
+    created_at timestamptz,
+    text_rank int,
+    vector_rank int,
+    score double precision
+)
+LANGUAGE sql STABLE
+AS $$
+WITH filtered AS NOT MATERIALIZED (
+    SELECT m.*
+    FROM memories m
+    WHERE (p_patient_id IS NULL OR m.patient_id = p_patient_id)
+      AND (p_emotional_tone IS NULL OR m.emotional_tone = p_emotional_tone)
+      AND (p_min_significance IS NULL OR m.significance_level >= p_min_significance)
+),
+text_hits AS (
+    SELECT f.memory_id,
+           row_number() OVER (ORDER BY ts_rank_cd(f.search_tsv, q) DESC) AS rank
+    FROM filtered f, websearch_to_tsquery('english', p_query) q
+    WHERE p_query IS NOT NULL AND f.search_tsv @@ q
+    ORDER BY ts_rank_cd(f.search_tsv, q) DESC
+    LIMIT p_candidates
+),
+vector_hits AS (
+    SELECT f.memory_id,
+           row_number() OVER (ORDER BY f.embedding <=> p_query_embedding) AS rank
+    FROM filtered f
+    WHERE p_query_embedding IS NOT NULL AND f.embedding IS NOT NULL
+    ORDER BY f.embedding <=> p_query_embedding
+    LIMIT p_candidates
+),
+fused AS (
+    SELECT coalesce(t.memory_id, v.memory_id) AS memory_id,
+           t.rank::int AS text_rank,
+           v.rank::int AS vector_rank,
+           coalesce(1.0 / (p_rrf_k + t.rank), 0) + coalesce(1.0 / (p_rrf_k + v.rank), 0) AS score
+    FROM text_hits t
+    FULL OUTER JOIN vector_hits v ON v.memory_id = t.memory_id
+)
+SELECT m.memory_id, m.patient_id, m.title, m.description, m.dateapprox, m.location,
+       m.emotional_tone, m.tags, m.significance_level, m.created_at,
+       fused.text_rank, fused.vector_rank, fused.score
+FROM fused
+JOIN memories m ON m.memory_id = fused.memory_id
+ORDER BY fused.score DESC
+LIMIT p_match_count;
+$$;
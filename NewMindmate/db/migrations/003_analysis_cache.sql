@@ -0,0 +1,14 @@
+-- Content-addressed cache of Cognitive API session analyses
+--
+-- content_hash is SHA-256 over (transcript, patient profile fields, analysis
+-- version); see services/analysis_cache.py. Rows are immutable per hash, so
+-- bumping ANALYSIS_VERSION simply stops old rows from being looked up.
+
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    content_hash text PRIMARY KEY,
+    analysis_version text NOT NULL,
+    result jsonb NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS analysis_cache_version_idx ON analysis_cache (analysis_version, created_at);
@@ -0,0 +1,17 @@
+-- Checkpoints for the Beyond Presence call -> session ingestion pipeline
+--
+-- One row per call; see services/call_ingestion.py for the status flow
+-- (pending -> session_created -> analyzed | failed). session_id is reserved
+-- before the session insert so restarts never create duplicate sessions.
+
+CREATE TABLE IF NOT EXISTS call_ingestions (
+    call_id text PRIMARY KEY,
+    patient_id uuid NOT NULL REFERENCES patients (patient_id) ON DELETE CASCADE,
+    session_id uuid NOT NULL,
+    status text NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'session_created', 'analyzed', 'failed')),
+    error text,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS call_ingestions_status_idx ON call_ingestions (status) WHERE status <> 'analyzed';
@@ -0,0 +1,15 @@
+-- Append-only transcript chunks for live call ingestion
+--
+-- Each flush of a session's transcript buffer appends one row with the new
+-- lines (see services/transcript_stream.py), so a growing transcript costs
+-- O(new lines) per write instead of rewriting sessions.transcript. The full
+-- transcript is copied into sessions.transcript when the stream ends.
+
+CREATE TABLE IF NOT EXISTS transcript_chunks (
+    session_id uuid NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    seq int NOT NULL,
+    content text NOT NULL,
+    line_count int NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (session_id, seq)
+);
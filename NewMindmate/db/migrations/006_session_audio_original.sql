@@ -0,0 +1,4 @@
+-- Keep the original upload when a session's audio_url points at the compact
+-- mono 16 kHz rendition produced by services/audio_normalization.py
+
+ALTER TABLE sessions ADD COLUMN IF NOT EXISTS audio_original_url text;
@@ -0,0 +1,35 @@
+-- Row versions for conditional GETs (services/conditional.py)
+-- updated_at moves on every insert and update, so the newest updated_at plus
+-- the row count identifies the state of a patient's sessions or memories.
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE patients ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE sessions ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+-- Existing rows start at their creation time
+UPDATE patients SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE sessions SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE memories SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+DROP TRIGGER IF EXISTS patients_set_updated_at ON patients;
+CREATE TRIGGER patients_set_updated_at BEFORE UPDATE ON patients
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS sessions_set_updated_at ON sessions;
+CREATE TRIGGER sessions_set_updated_at BEFORE UPDATE ON sessions
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS memories_set_updated_at ON memories;
+CREATE TRIGGER memories_set_updated_at BEFORE UPDATE ON memories
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- The version probe reads the newest row per patient
+CREATE INDEX IF NOT EXISTS sessions_patient_updated_at_idx ON sessions (patient_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS memories_patient_updated_at_idx ON memories (patient_id, updated_at DESC);
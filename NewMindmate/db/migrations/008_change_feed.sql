@@ -0,0 +1,68 @@
+-- Row change notifications for services/change_feed.py
+--
+-- Every insert, update and delete on patients, sessions and memories sends a
+-- NOTIFY on the mindmate_changes channel, whoever made the write (the API,
+-- run_analysis, clear_data.py, generate_data.py, the SQL editor). The payload
+-- carries keys only, never row contents, to stay far below NOTIFY's 8000 byte
+-- limit; listeners refetch what they need. TRUNCATE sends one table-wide
+-- notification with a null id.
+
+CREATE OR REPLACE FUNCTION notify_row_change() RETURNS trigger AS $$
+DECLARE
+    keys text;
+    row_id text;
+    row_patient_id text;
+    row_updated_at text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('mindmate_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text);
+        RETURN NULL;
+    END IF;
+
+    -- Read the key columns only: converting the whole row (embeddings,
+    -- transcripts) is wasted work, and an oversized payload fails the write.
+    -- TG_ARGV[0] is the primary key column of the table.
+    keys := format(
+        'SELECT ($1).%I::text, ($1).patient_id::text, to_json(($1).updated_at) #>> ''{}''',
+        TG_ARGV[0]
+    );
+    IF TG_OP = 'DELETE' THEN
+        EXECUTE keys INTO row_id, row_patient_id, row_updated_at USING OLD;
+    ELSE
+        EXECUTE keys INTO row_id, row_patient_id, row_updated_at USING NEW;
+    END IF;
+
+    PERFORM pg_notify('mindmate_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', row_id,
+        'patient_id', row_patient_id,
+        'updated_at', row_updated_at
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS patients_notify_change ON patients;
+CREATE TRIGGER patients_notify_change AFTER INSERT OR UPDATE OR DELETE ON patients
+    FOR EACH ROW EXECUTE FUNCTION notify_row_change('patient_id');
+
+DROP TRIGGER IF EXISTS sessions_notify_change ON sessions;
+CREATE TRIGGER sessions_notify_change AFTER INSERT OR UPDATE OR DELETE ON sessions
+    FOR EACH ROW EXECUTE FUNCTION notify_row_change('session_id');
+
+DROP TRIGGER IF EXISTS memories_notify_change ON memories;
+CREATE TRIGGER memories_notify_change AFTER INSERT OR UPDATE OR DELETE ON memories
+    FOR EACH ROW EXECUTE FUNCTION notify_row_change('memory_id');
+
+DROP TRIGGER IF EXISTS patients_notify_truncate ON patients;
+CREATE TRIGGER patients_notify_truncate AFTER TRUNCATE ON patients
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_row_change();
+
+DROP TRIGGER IF EXISTS sessions_notify_truncate ON sessions;
+CREATE TRIGGER sessions_notify_truncate AFTER TRUNCATE ON sessions
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_row_change();
+
+DROP TRIGGER IF EXISTS memories_notify_truncate ON memories;
+CREATE TRIGGER memories_notify_truncate AFTER TRUNCATE ON memories
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_row_change();
@@ -0,0 +1,9 @@
+-- Retry bookkeeping for call ingestion checkpoints (services/call_ingestion.py)
+--
+-- attempts counts consecutive failures of the current stage (transcript fetch
+-- while pending, analysis while failed). Retries wait until next_retry_at,
+-- doubling each time, and stop once attempts reaches INGEST_MAX_ATTEMPTS
+-- (next_retry_at is then null).
+
+ALTER TABLE call_ingestions ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0;
+ALTER TABLE call_ingestions ADD COLUMN IF NOT EXISTS next_retry_at timestamptz;
@@ -0,0 +1,98 @@
+"""
+Embedding quantization
+
+int8:   symmetric per-vector scale, 1 byte/dim (4x smaller than float32)
+binary: sign bits packed 8 per byte, 1 bit/dim (32x smaller), Hamming distance
+
+Quantized codes drive a cheap first pass; callers rerank the best candidates
+with the full-precision embeddings.
+"""
+from __future__ import annotations
+
+import os
+import base64
+from typing import Dict, Optional, Tuple
+
+from NewMindmate.services.startup import lazy_import
+
+np = lazy_import("numpy")
+
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Set to int8 or binary to store quantized codes alongside each embedding and
+# serve the in-process index from them
+MEMORY_EMBEDDING_QUANTIZATION = os.getenv("MEMORY_EMBEDDING_QUANTIZATION", "none").lower()
+if MEMORY_EMBEDDING_QUANTIZATION not in QUANTIZATION_MODES:
+    raise RuntimeError(
+        f"Invalid MEMORY_EMBEDDING_QUANTIZATION={MEMORY_EMBEDDING_QUANTIZATION!r}; expected one of {QUANTIZATION_MODES}"
+    )
+
+# Candidates kept from the quantized pass per requested result
+MEMORY_RERANK_OVERSAMPLE = int(os.getenv("MEMORY_RERANK_OVERSAMPLE", "4"))
+
+
+def quantize_int8(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Return (int8 codes, scale) such that codes * scale ~= vector"""
+    vector = np.asarray(vector, dtype=np.float32)
+    peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def quantize_binary(vector: np.ndarray) -> np.ndarray:
+    """Pack the sign bit of each dimension, 8 dimensions per byte"""
+    return np.packbits(np.asarray(vector) > 0)
+
+
+def quantize(vector: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[float]]:
+    if mode == "int8":
+        return quantize_int8(vector)
+    if mode == "binary":
+        return quantize_binary(vector), None
+    raise ValueError(f"Unsupported quantization mode: {mode}")
+
+
+def quantized_columns(vector: np.ndarray, mode: str) -> Dict:
+    """Columns stored on a memories row for its quantized (unit-normalized) embedding"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    codes, scale = quantize(vector / norm if norm > 0 else vector, mode)
+    return {
+        "embedding_quantized": encode_codes(codes),
+        "embedding_scale": scale,
+        "embedding_quantization": mode,
+    }
+
+
+def code_width(dim: int, mode: str) -> int:
+    return dim if mode == "int8" else (dim + 7) // 8
+
+
+def code_dtype(mode: str):
+    return np.int8 if mode == "int8" else np.uint8
+
+
+def encode_codes(codes: np.ndarray) -> str:
+    return base64.b64encode(codes.tobytes()).decode("ascii")
+
+
+def decode_codes(data: str, mode: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=code_dtype(mode))
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray, block: int = 1024) -> np.ndarray:
+    """Approximate dot products of int8-coded rows against a float32 query"""
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], block):
+        stop = start + block
+        scores[start:stop] = codes[start:stop].astype(np.float32) @ query
+    return scores * scales
+
+
+def binary_scores(codes: np.ndarray, query: np.ndarray, dim: int) -> np.ndarray:
+    """Approximate cosine from Hamming distance between sign-bit codes"""
+    query_bits = quantize_binary(query)
+    hamming = np.bitwise_count(codes ^ query_bits).sum(axis=1, dtype=np.int32)
+    return 1.0 - 2.0 * hamming.astype(np.float32) / dim
@@ -1,15 +1,37 @@
+from __future__ import annotations
+
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
+from NewMindmate.services.metrics import instrument_supabase
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Missing Supabase credentials in .env file")
+_client = None
+_client_lock = threading.Lock()
 
 def get_supabase() -> Client:
-    """Return a singleton Supabase client"""
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Return a singleton Supabase client (built, and credentials checked, on first use)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise RuntimeError("Missing Supabase credentials in .env file")
+                # Imported here: the supabase package is a large share of import time
+                from supabase import create_client
+                _client = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+    return _client
+
+class LazySupabase:
+    """Module-level stand-in for the client that builds it on first attribute access"""
+
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
@@ -1,12 +1,175 @@
-import numpy as np
-from supabase import Client
-from typing import List
+from __future__ import annotations
+
+import base64
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
 from uuid import uuid4
 
+from NewMindmate.db.memory_index import MEMORY_INDEX
+from NewMindmate.db.quantization import MEMORY_EMBEDDING_QUANTIZATION, quantized_columns
+from NewMindmate.services.startup import lazy_import
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+np = lazy_import("numpy")
+
 VECTOR_DIM = 1536  # Must match your embeddings model
 
-def store_memory_embedding(supabase: Client, patient_id: str, title: str, description: str, embedding: List[float], dateapprox=None, location=None, emotional_tone=None, tags=None, significance_level=1):
-    """Store a memory with embedding in Supabase"""
+EmbeddingLike = Union["np.ndarray", Sequence[float], str]
+
+# Wire formats for embeddings in API responses
+_WIRE_DTYPES = {"base64": "<f4", "base64_f16": "<f2"}
+ENCODING_LABELS = {"base64": "float32-le-base64", "base64_f16": "float16-le-base64"}
+
+# Cosine similarity at or above which a new memory is folded into an existing
+# one instead of being inserted. Set above 1 to disable.
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.95"))
+MAX_SIGNIFICANCE = 10
+
+# Columns of the memories table without the embedding, for embedding_format=none
+MEMORY_COLUMNS_NO_EMBEDDING = (
+    "memory_id,patient_id,title,description,dateapprox,location,peopleinvolved,"
+    "emotional_tone,tags,significance_level,created_at"
+)
+
+
+def as_float32(embedding: EmbeddingLike) -> np.ndarray:
+    """
+    Normalize an embedding to a contiguous float32 array
+
+    Accepts NumPy arrays, lists of floats, pgvector text ("[0.1,0.2,...]")
+    and base64-encoded little-endian float32.
+    """
+    if isinstance(embedding, np.ndarray):
+        return np.ascontiguousarray(embedding, dtype=np.float32)
+    if isinstance(embedding, str):
+        text = embedding.strip()
+        if text.startswith("["):
+            return np.fromstring(text[1:-1], dtype=np.float32, sep=",")
+        return decode_embedding(text)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def encode_embedding(embedding: EmbeddingLike, fmt: str = "base64") -> str:
+    """Encode an embedding as base64 little-endian float32 (or float16 for base64_f16)"""
+    vec = as_float32(embedding).astype(_WIRE_DTYPES[fmt], copy=False)
+    return base64.b64encode(vec.tobytes()).decode("ascii")
+
+
+def decode_embedding(data: str, fmt: str = "base64") -> np.ndarray:
+    """Decode a base64 embedding back into a float32 array"""
+    raw = base64.b64decode(data)
+    return np.frombuffer(raw, dtype=_WIRE_DTYPES[fmt]).astype(np.float32)
+
+
+def to_pgvector(embedding: EmbeddingLike) -> str:
+    """
+    Render an embedding as a pgvector literal
+
+    Seven significant digits are within float32 rounding, so the literal is
+    about half the size of a JSON list of Python float reprs.
+    """
+    vec = as_float32(embedding)
+    return "[" + ",".join(np.char.mod("%.7g", vec).tolist()) + "]"
+
+
+def format_memory_embedding(row: Dict, fmt: str = "base64") -> Dict:
+    """Rewrite a memory row's embedding into the requested wire format (in place)"""
+    embedding = row.get("embedding")
+    if fmt == "none":
+        row.pop("embedding", None)
+        return row
+    if embedding is None:
+        return row
+    if fmt == "json":
+        row["embedding"] = as_float32(embedding).tolist()
+    else:
+        row["embedding"] = encode_embedding(embedding, fmt)
+        row["embedding_encoding"] = ENCODING_LABELS[fmt]
+    return row
+
+
+def format_memory_rows(rows: List[Dict], fmt: str = "base64") -> List[Dict]:
+    return [format_memory_embedding(row, fmt) for row in rows]
+
+
+def memory_columns(fmt: str = "base64") -> str:
+    """Select list for memories; skips transferring embeddings that will be dropped"""
+    return MEMORY_COLUMNS_NO_EMBEDDING if fmt == "none" else "*"
+
+
+def merge_memory_fields(existing: Dict, duplicates: Sequence[Dict]) -> Dict:
+    """
+    Columns to update on a memory that absorbs near-duplicates
+
+    Tags are unioned (existing order first) and significance is bumped by one
+    per duplicate, starting from the higher of the two, capped at MAX_SIGNIFICANCE.
+    """
+    tags = list(existing.get("tags") or [])
+    significance = existing.get("significance_level") or 1
+    for duplicate in duplicates:
+        tags.extend(tag for tag in (duplicate.get("tags") or []) if tag not in tags)
+        significance = max(significance, duplicate.get("significance_level") or 1) + 1
+    return {"tags": tags, "significance_level": min(significance, MAX_SIGNIFICANCE)}
+
+
+def find_duplicate_groups(vectors: np.ndarray, threshold: float = MEMORY_DEDUP_THRESHOLD, block: int = 1024) -> Dict[int, List[int]]:
+    """
+    Greedy near-duplicate clustering over an (n, dim) matrix
+
+    Rows are visited in order; each row not yet absorbed keeps every later,
+    unabsorbed row whose cosine similarity reaches threshold. Similarities are
+    computed block-wise as matrix products. Returns {kept_row: [duplicate_rows]}.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms > 0, norms, 1)
+    n = matrix.shape[0]
+    absorbed = np.zeros(n, dtype=bool)
+    groups: Dict[int, List[int]] = {}
+    for start in range(0, n, block):
+        sims = matrix[start:start + block] @ matrix.T
+        for offset, row in enumerate(sims):
+            i = start + offset
+            if absorbed[i]:
+                continue
+            hits = np.flatnonzero(row[i + 1:] >= threshold) + i + 1
+            hits = hits[~absorbed[hits]]
+            if hits.size:
+                absorbed[hits] = True
+                groups[i] = hits.tolist()
+    return groups
+
+
+def find_near_duplicate(supabase: Client, patient_id: str, embedding: EmbeddingLike, threshold: float = MEMORY_DEDUP_THRESHOLD) -> Optional[Dict]:
+    """Closest existing memory of the patient if its similarity reaches threshold"""
+    index = MEMORY_INDEX.get_or_build(supabase, str(patient_id))
+    hits = index.search(as_float32(embedding), 1)
+    if hits and hits[0]["similarity"] >= threshold:
+        return hits[0]
+    return None
+
+
+def store_memory_embedding(supabase: Client, patient_id: str, title: str, description: str, embedding: Optional[EmbeddingLike], dateapprox=None, location=None, emotional_tone=None, tags=None, significance_level=1, dedupe=True):
+    """
+    Store a memory with embedding in Supabase
+
+    With dedupe, a memory whose embedding is within MEMORY_DEDUP_THRESHOLD of
+    one the patient already has is merged into it (tags appended, significance
+    bumped) and the existing memory_id is returned instead of inserting.
+    """
+    vector = as_float32(embedding) if embedding is not None else None
+    if vector is not None and dedupe and MEMORY_DEDUP_THRESHOLD <= 1:
+        duplicate = find_near_duplicate(supabase, patient_id, vector)
+        if duplicate is not None:
+            existing_id = str(duplicate["memory_id"])
+            changes = merge_memory_fields(duplicate, [{"tags": tags, "significance_level": significance_level}])
+            supabase.table("memories").update(changes).eq("memory_id", existing_id).execute()
+            MEMORY_INDEX.update_row(patient_id, existing_id, changes)
+            print(f"🔁 Merged near-duplicate memory '{title}' into {existing_id} (similarity {duplicate['similarity']:.3f})")
+            return existing_id
+
     memory_id = str(uuid4())
     payload = {
         "memory_id": memory_id,
@@ -18,27 +181,104 @@ def store_memory_embedding(supabase: Client, patient_id: str, title: str, descri
         "emotional_tone": emotional_tone,
         "tags": tags or [],
         "significance_level": significance_level,
-        "embedding": embedding,
+        "embedding": to_pgvector(vector) if vector is not None else None,
     }
+    if vector is not None and MEMORY_EMBEDDING_QUANTIZATION != "none":
+        payload.update(quantized_columns(vector, MEMORY_EMBEDDING_QUANTIZATION))
     result = supabase.table("memories").insert(payload).execute()
     if not result.data:
         raise RuntimeError(f"Failed to insert memory embedding: {result}")
+    if vector is not None:
+        MEMORY_INDEX.add(patient_id, memory_id, vector, payload)
     return memory_id
 
-def search_similar_memories(supabase: Client, patient_id: str, query_embedding: List[float], limit=5):
+def search_similar_memories(supabase: Client, patient_id: str, query_embedding: EmbeddingLike, limit=5):
     """
-    Perform vector similarity search in Supabase pgvector
+    Top-k cosine similarity search over a patient's memories
+
+    Served from the in-process per-patient index, which is loaded from the
+    memories table on first use and kept current by store_memory_embedding.
+    Returned rows carry a 'similarity' key and no embedding.
     """
-    # Supabase pgvector query: cosine similarity
-    sql = f"""
-    SELECT *,
-           1 - (embedding <#> '{query_embedding}') AS similarity
-    FROM memories
-    WHERE patient_id = '{patient_id}'
-    ORDER BY embedding <#> '{query_embedding}' ASC
-    LIMIT {limit};
+    index = MEMORY_INDEX.get_or_build(supabase, str(patient_id))
+    return index.search(as_float32(query_embedding), limit)
+
+
+RRF_K = 60  # Standard reciprocal rank fusion constant
+HYBRID_CANDIDATES = 60  # Candidates taken from each ranking before fusion
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Dict]], limit: int = 10, k: int = RRF_K) -> List[Dict]:
+    """
+    Fuse ranked lists of memory rows with reciprocal rank fusion
+
+    Args:
+        rankings: name -> rows ordered best first (e.g. {"text": [...], "vector": [...]})
+        limit: number of fused rows to return
+        k: RRF damping constant
+
+    Returns:
+        Rows ordered by fused score, each with 'score' and '<name>_rank' keys
     """
-    res = supabase.rpc("execute_sql", {"query": sql}).execute()  # or use direct SQL API
-    if not res.data:
-        return []
-    return res.data
+    fused: Dict[str, Dict] = {}
+    for name, rows in rankings.items():
+        for rank, row in enumerate(rows, start=1):
+            memory_id = str(row["memory_id"])
+            entry = fused.get(memory_id)
+            if entry is None:
+                entry = {key: value for key, value in row.items() if not key.endswith("_rank") and key != "score"}
+                entry.update({f"{other}_rank": None for other in rankings})
+                entry["score"] = 0.0
+                fused[memory_id] = entry
+            entry[f"{name}_rank"] = rank
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:limit]
+
+
+def hybrid_search_memories(
+    supabase: Client,
+    query: Optional[str] = None,
+    query_embedding: Optional[EmbeddingLike] = None,
+    patient_id: Optional[str] = None,
+    emotional_tone: Optional[str] = None,
+    min_significance: Optional[int] = None,
+    limit: int = 10,
+) -> List[Dict]:
+    """
+    Full-text + vector memory search fused with reciprocal rank fusion
+
+    Patient-scoped queries with an embedding take the vector ranking from the
+    in-process index and only the text ranking from Postgres; everything else
+    runs in the search_memories_hybrid RPC (GIN + HNSW, migration 002).
+    """
+    params = {
+        "p_query": query or None,
+        "p_query_embedding": None,
+        "p_patient_id": str(patient_id) if patient_id else None,
+        "p_emotional_tone": emotional_tone,
+        "p_min_significance": min_significance,
+        "p_match_count": limit,
+        "p_candidates": HYBRID_CANDIDATES,
+        "p_rrf_k": RRF_K,
+    }
+
+    if patient_id and query_embedding is not None:
+        def matches_filters(row: Dict) -> bool:
+            if emotional_tone is not None and row.get("emotional_tone") != emotional_tone:
+                return False
+            if min_significance is not None and (row.get("significance_level") or 0) < min_significance:
+                return False
+            return True
+
+        index = MEMORY_INDEX.get_or_build(supabase, str(patient_id))
+        vector_hits = index.search(as_float32(query_embedding), HYBRID_CANDIDATES, where=matches_filters)
+        text_hits = []
+        if query:
+            text_params = dict(params, p_match_count=HYBRID_CANDIDATES)
+            text_hits = supabase.rpc("search_memories_hybrid", text_params).execute().data or []
+        return reciprocal_rank_fusion({"text": text_hits, "vector": vector_hits}, limit=limit)
+
+    if query_embedding is not None:
+        params["p_query_embedding"] = to_pgvector(query_embedding)
+    result = supabase.rpc("search_memories_hybrid", params).execute()
+    return result.data or []
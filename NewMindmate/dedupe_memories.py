@@ -0,0 +1,94 @@
+"""
+Backfill: merges near-duplicate memories that were stored before ingest-time
+deduplication existed.
+
+For each patient, memories are visited oldest first; every later memory whose
+embedding is within MEMORY_DEDUP_THRESHOLD (cosine) of a kept one is folded
+into it (tags appended, significance bumped) and deleted.
+
+Usage:
+    python -m NewMindmate.dedupe_memories [--apply] [--threshold 0.95] [--patient-id ID]
+"""
+import argparse
+
+import numpy as np
+
+from NewMindmate.db.supabase_client import get_supabase
+from NewMindmate.db.vector_utils import (
+    MEMORY_DEDUP_THRESHOLD,
+    MEMORY_INDEX,
+    as_float32,
+    find_duplicate_groups,
+    merge_memory_fields,
+)
+
+
+def dedupe_patient(supabase, patient_id: str, threshold: float = MEMORY_DEDUP_THRESHOLD, apply: bool = False) -> int:
+    """Merge one patient's near-duplicate memories; returns how many were (or would be) removed"""
+    result = (
+        supabase.table("memories")
+        .select("memory_id,title,tags,significance_level,created_at,embedding")
+        .eq("patient_id", patient_id)
+        .order("created_at")
+        .execute()
+    )
+    rows = [row for row in (result.data or []) if row.get("embedding") is not None]
+    if len(rows) < 2:
+        return 0
+
+    groups = find_duplicate_groups(np.stack([as_float32(row["embedding"]) for row in rows]), threshold)
+    removed = 0
+    for kept, duplicates in groups.items():
+        canonical = rows[kept]
+        duplicate_rows = [rows[i] for i in duplicates]
+        changes = merge_memory_fields(canonical, duplicate_rows)
+        duplicate_ids = [row["memory_id"] for row in duplicate_rows]
+        print(f"  - '{canonical['title']}' absorbs {len(duplicate_ids)}: "
+              + ", ".join(f"'{row['title']}'" for row in duplicate_rows))
+        if apply:
+            supabase.table("memories").update(changes).eq("memory_id", canonical["memory_id"]).execute()
+            supabase.table("memories").delete().in_("memory_id", duplicate_ids).execute()
+        removed += len(duplicate_ids)
+
+    if apply and removed:
+        MEMORY_INDEX.invalidate(patient_id)
+    return removed
+
+
+def dedupe_memories(threshold: float = MEMORY_DEDUP_THRESHOLD, apply: bool = False, patient_id: str = None):
+    """Run the backfill over one patient or every patient"""
+    supabase = get_supabase()
+
+    if patient_id:
+        patient_ids = [patient_id]
+    else:
+        result = supabase.table("patients").select("patient_id").execute()
+        patient_ids = [row["patient_id"] for row in (result.data or [])]
+
+    mode = "Merging" if apply else "Dry run:"
+    print(f"\n🔍 {mode} near-duplicate memories for {len(patient_ids)} patient(s) (threshold {threshold})\n")
+
+    total = 0
+    for pid in patient_ids:
+        try:
+            removed = dedupe_patient(supabase, pid, threshold, apply)
+        except Exception as e:
+            print(f"❌ Failed to dedupe memories for patient {pid}: {e}")
+            continue
+        if removed:
+            print(f"✅ Patient {pid}: {removed} duplicate(s)\n")
+        total += removed
+
+    verb = "Removed" if apply else "Would remove"
+    print(f"\n🎉 {verb} {total} near-duplicate memories.")
+    if not apply and total:
+        print("   Re-run with --apply to merge them.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Write merges (default is a dry run)")
+    parser.add_argument("--threshold", type=float, default=MEMORY_DEDUP_THRESHOLD)
+    parser.add_argument("--patient-id", default=None)
+    args = parser.parse_args()
+    dedupe_memories(args.threshold, args.apply, args.patient_id)
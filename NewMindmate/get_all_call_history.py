@@ -1,14 +1,11 @@
 from fastapi import FastAPI, HTTPException, Header
-import requests
 import os
+from NewMindmate.services import beyond_presence_client as beyond_presence
 
 app = FastAPI(title="Beyond Presence Call Message Retriever")
 
-BEYOND_PRESENCE_BASE_URL = "https://api.beyondpresence.ai/v1"
-
-
 @app.get("/calls/{call_id}/messages")
-def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
+async def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
     """
     Retrieve all prior messages from a Beyond Presence call.
 
@@ -23,19 +20,8 @@ def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
     if not api_key:
         raise HTTPException(status_code=401, detail="Missing Beyond Presence API key.")
 
-    url = f"{BEYOND_PRESENCE_BASE_URL}/calls/{call_id}/messages"
-    headers = {
-        "x-api-key": api_key,
-        "Accept": "application/json"
-    }
-
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        messages = response.json()
-        return {"call_id": call_id, "messages": messages}
-
-    except requests.exceptions.HTTPError as e:
-        raise HTTPException(status_code=response.status_code, detail=str(e))
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request failed: {e}")
+        messages = await beyond_presence.get_call_messages(call_id, api_key)
+    except beyond_presence.BeyondPresenceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"call_id": call_id, "messages": messages}
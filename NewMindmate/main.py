@@ -1,20 +1,62 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, BackgroundTasks, HTTPException, File, UploadFile, Form, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from NewMindmate.db.supabase_client import get_supabase
+from NewMindmate.db.vector_utils import format_memory_rows, memory_columns, hybrid_search_memories
 from pydantic import BaseModel
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, date
 import os
+import asyncio
+import hashlib
+import httpx
+from contextlib import asynccontextmanager
 from pathlib import Path
-from NewMindmate.schemas import DoctorCreate, DoctorResponse, DoctorRecordCreate, DoctorRecordResponse, PatientResponse, PatientCreate, SessionResponse, SessionCreate, MemoryResponse, MemoryCreate
-from NewMindmate.routes.cognitive_routes import router as cognitive_router
-import requests
+from NewMindmate.schemas import DoctorCreate, DoctorResponse, DoctorRecordCreate, DoctorRecordResponse, PatientResponse, PatientCreate, SessionResponse, SessionCreate, MemoryResponse, MemoryCreate, EmbeddingFormat, MemorySearchRequest, MemorySearchResult, CallMessagesBatchRequest, CallMessagesBatchResponse, CallIngestRequest, BatchGetRequest, PatientBatchResponse, SessionBatchResponse, PatientSessionsBatchRequest, PatientSessionsBatchResponse, PatientDetailResponse, PatientSessionSummary, PatientMemorySummary
+from NewMindmate.routes.cognitive_routes import router as cognitive_router, analyze_session as run_cognitive_analysis
+from NewMindmate.services.metrics import MetricsMiddleware, CONTENT_TYPE_LATEST, render_latest
+from NewMindmate.services.tracing import TracingMiddleware
+from NewMindmate.services.startup import READINESS, lazy_import, start_warm_up
+from NewMindmate.services import entity_cache
+from NewMindmate.services.conditional import etag_matches, make_etag, not_modified, table_version, with_etag
+from NewMindmate.services.compression import CompressionMiddleware
+from NewMindmate.services.serialization import ContentNegotiationMiddleware, FastJSONResponse, project_row, trusted_response, trusted_rows
+from NewMindmate.services import beyond_presence_client as beyond_presence
+from NewMindmate.services import audio_playback as playback
+from NewMindmate.services.transcript_stream import TRANSCRIPT_STREAMS
+from NewMindmate.services.audio_normalization import AUDIO_NORMALIZE_DEFAULT, AUDIO_POOL, compact_path, normalize_audio
+from NewMindmate.services.call_ingestion import CALL_INGEST_POLL_SECONDS, CallIngestionPipeline, poll_completed_calls
+from NewMindmate.services.change_feed import CHANGE_FEED, DASHBOARDS, start_change_feed
 
 # ------------------------------
 # App Initialization
 # ------------------------------
-app = FastAPI(title="MindMate API", version="0.2.0")
+# Built off the request path after startup; /ready reports when they are done
+WARMUP_STEPS = [
+    ("supabase_client", lambda: get_supabase()),
+    ("numpy", lambda: lazy_import("numpy").ndarray),
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = start_warm_up(READINESS, WARMUP_STEPS)
+    poller = None
+    if CALL_INGEST_POLL_SECONDS > 0 and os.getenv("BEY_API_KEY"):
+        pipeline = CallIngestionPipeline(get_supabase(), os.getenv("BEY_API_KEY"), run_cognitive_analysis)
+        poller = asyncio.create_task(poll_completed_calls(pipeline))
+    change_feed = start_change_feed(CHANGE_FEED, get_supabase)
+    yield
+    warmup.cancel()
+    if poller is not None:
+        poller.cancel()
+    if change_feed is not None:
+        change_feed.cancel()
+    await beyond_presence.close_client()
+    await playback.close_client()
+
+app = FastAPI(title="MindMate API", version="0.2.0", default_response_class=FastJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +65,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Innermost, so metrics and traces see the bytes actually sent
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ContentNegotiationMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # ------------------------------
 # Include Cognitive API Routes
@@ -36,6 +83,19 @@ app.include_router(cognitive_router)
 def health():
     return {"status": "ok", "message": "MindMate API running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the warm-up steps have finished"""
+    report = READINESS.report()
+    return FastJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+# ------------------------------
+# Metrics (Prometheus scrape target)
+# ------------------------------
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # ------------------------------
 # Patients
 # ------------------------------
@@ -43,7 +103,7 @@ def health():
 def list_patients():
     supabase = get_supabase()
     result = supabase.table("patients").select("*").execute()
-    return result.data
+    return trusted_response(result.data, PatientResponse)
 
 @app.post("/patients", response_model=PatientResponse)
 def create_patient(payload: PatientCreate):
@@ -51,14 +111,125 @@ def create_patient(payload: PatientCreate):
     result = supabase.table("patients").insert(payload.model_dump()).execute()
     return result.data[0]
 
+# ------------------------------
+# Patient Detail
+# ------------------------------
+# Embedded relations: response key -> (table, projected model, order column)
+PATIENT_DETAIL_RELATIONS = {
+    "recent_sessions": ("sessions", PatientSessionSummary, "session_date"),
+    "top_memories": ("memories", PatientMemorySummary, "significance_level"),
+    "doctor_records": ("doctor_records", DoctorRecordResponse, "created_at"),
+}
+
+def patient_detail_select() -> str:
+    """Patient columns plus each relation embedded under its alias with only the fields we return"""
+    embeds = [
+        f"{alias}:{table}({','.join(model.model_fields)})"
+        for alias, (table, model, _) in PATIENT_DETAIL_RELATIONS.items()
+    ]
+    return ",".join(["*"] + embeds)
+
+@app.get("/patients/{patient_id}/detail", response_model=PatientDetailResponse)
+def get_patient_detail(
+    patient_id: UUID,
+    sessions_limit: int = Query(10, ge=0, le=100),
+    memories_limit: int = Query(10, ge=0, le=100),
+    records_limit: int = Query(5, ge=0, le=100),
+):
+    """
+    Patient with recent sessions, top memories and latest doctor records
+
+    One PostgREST query: the relations are embedded, projected and limited
+    server-side instead of being fetched by four separate requests.
+    """
+    limits = {"recent_sessions": sessions_limit, "top_memories": memories_limit, "doctor_records": records_limit}
+    supabase = get_supabase()
+    query = supabase.table("patients").select(patient_detail_select()).eq("patient_id", str(patient_id))
+    for alias, (_, _, order_column) in PATIENT_DETAIL_RELATIONS.items():
+        query = query.order(order_column, desc=True, foreign_table=alias).limit(limits[alias], foreign_table=alias)
+    result = query.execute()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    row = result.data[0]
+    detail = project_row(row, PatientResponse)
+    for alias, (_, model, _) in PATIENT_DETAIL_RELATIONS.items():
+        detail[alias] = trusted_rows(row.get(alias) or [], model)
+    return FastJSONResponse(detail)
+
+# ------------------------------
+# Batch Reads
+# ------------------------------
+def fetch_rows_by_ids(table: str, key: str, ids: List[UUID], columns: str = "*") -> dict:
+    """
+    Rows whose key column is in ids, fetched with a single in_ query
+
+    Returns:
+        Dict mapping str(id) -> row
+    """
+    supabase = get_supabase()
+    unique_ids = list(dict.fromkeys(str(i) for i in ids))
+    result = supabase.table(table).select(columns).in_(key, unique_ids).execute()
+    return {row[key]: row for row in result.data or []}
+
+def order_by_request(ids: List[UUID], rows: dict):
+    """(rows in request order without duplicates, IDs with no row)"""
+    found, missing = [], []
+    for i in dict.fromkeys(ids):
+        row = rows.get(str(i))
+        if row is None:
+            missing.append(str(i))
+        else:
+            found.append(row)
+    return found, missing
+
+@app.post("/patients:batchGet", response_model=PatientBatchResponse)
+def batch_get_patients(payload: BatchGetRequest):
+    rows = fetch_rows_by_ids("patients", "patient_id", payload.ids)
+    patients, missing = order_by_request(payload.ids, rows)
+    return FastJSONResponse({"patients": trusted_rows(patients, PatientResponse), "missing": missing})
+
+@app.post("/sessions:batchGet", response_model=SessionBatchResponse)
+def batch_get_sessions(payload: BatchGetRequest):
+    rows = fetch_rows_by_ids("sessions", "session_id", payload.ids)
+    sessions, missing = order_by_request(payload.ids, rows)
+    return FastJSONResponse({"sessions": trusted_rows(sessions, SessionResponse), "missing": missing})
+
+@app.post("/sessions:batchGetByPatient", response_model=PatientSessionsBatchResponse)
+def batch_get_sessions_by_patient(payload: PatientSessionsBatchRequest):
+    """Most recent sessions of many patients with one query (per-patient limit applied here)"""
+    patient_ids = list(dict.fromkeys(str(i) for i in payload.patient_ids))
+    supabase = get_supabase()
+    result = (
+        supabase.table("sessions")
+        .select("*")
+        .in_("patient_id", patient_ids)
+        .order("session_date", desc=True)
+        .execute()
+    )
+    by_patient = {patient_id: [] for patient_id in patient_ids}
+    for row in result.data or []:
+        sessions = by_patient.get(row["patient_id"])
+        if sessions is not None and len(sessions) < payload.limit_per_patient:
+            sessions.append(row)
+    return FastJSONResponse({
+        "results": [
+            {"patient_id": patient_id, "sessions": trusted_rows(sessions, SessionResponse)}
+            for patient_id, sessions in by_patient.items()
+        ]
+    })
+
 # ------------------------------
 # Sessions
 # ------------------------------
 @app.get("/sessions", response_model=List[SessionResponse])
-def list_sessions():
+def list_sessions(if_none_match: Optional[str] = Header(default=None)):
     supabase = get_supabase()
+    etag = make_etag("sessions", table_version(supabase, "sessions"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     result = supabase.table("sessions").select("*").execute()
-    return result.data
+    return with_etag(trusted_response(result.data, SessionResponse), etag)
 
 @app.post("/sessions", response_model=SessionResponse)
 def create_session(payload: SessionCreate):
@@ -66,6 +237,117 @@ def create_session(payload: SessionCreate):
     result = supabase.table("sessions").insert(payload.model_dump()).execute()
     return result.data[0]
 
+@app.get("/sessions/{session_id}/transcript")
+def get_session_transcript(session_id: UUID):
+    """
+    Current transcript of a session, including a call still in progress.
+
+    While a call is streaming this returns a consistent partial transcript
+    (`live` is true on the instance holding the stream).
+    """
+    supabase = get_supabase()
+    current = TRANSCRIPT_STREAMS.read(supabase, session_id)
+    if current is not None:
+        return current
+
+    result = supabase.table("sessions").select("session_id,transcript").eq("session_id", str(session_id)).execute()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Session not found")
+    transcript = result.data[0].get("transcript") or ""
+    lines = len(transcript.splitlines())
+    return {"session_id": str(session_id), "transcript": transcript, "lines": lines, "flushed_lines": lines, "live": False}
+
+@app.websocket("/sessions/{session_id}/transcript/stream")
+async def stream_session_transcript(
+    websocket: WebSocket,
+    session_id: UUID,
+    flush_messages: Optional[int] = Query(None, ge=1),
+    flush_seconds: Optional[float] = Query(None, gt=0),
+):
+    """
+    Live transcript ingestion for an existing session.
+
+    Send one JSON object per message ({"message", "sender", "sent_at"}) and
+    {"type": "end"} when the call is over. Messages are buffered and appended
+    to storage every `flush_messages` messages or `flush_seconds` seconds;
+    the full transcript is written to the session on {"type": "end"}. If the
+    connection drops first, reconnecting continues the same transcript.
+    """
+    supabase = get_supabase()
+    exists = await run_in_threadpool(
+        supabase.table("sessions").select("session_id").eq("session_id", str(session_id)).execute
+    )
+    if not exists.data:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+
+    max_seconds = flush_seconds or TRANSCRIPT_STREAMS.max_seconds
+    buffer = await run_in_threadpool(TRANSCRIPT_STREAMS.open, supabase, session_id)
+    ended = False
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_json(), buffer.seconds_until_due(max_seconds))
+            except asyncio.TimeoutError:
+                # Oldest pending message reached flush_seconds without new input
+                await run_in_threadpool(TRANSCRIPT_STREAMS.flush_due, supabase, session_id, flush_messages, flush_seconds)
+                continue
+            if data.get("type") == "end":
+                ended = True
+                break
+            flushed = await run_in_threadpool(
+                TRANSCRIPT_STREAMS.append, supabase, session_id, data, flush_messages, flush_seconds
+            )
+            snapshot = buffer.snapshot()
+            await websocket.send_json({"type": "ack", "lines": snapshot["lines"], "flushed_lines": snapshot["flushed_lines"], "flushed": flushed})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if not ended:
+            # Dropped mid-call: keep the chunks so a reconnect resumes the transcript
+            await run_in_threadpool(TRANSCRIPT_STREAMS.suspend, supabase, session_id)
+
+    if ended:
+        transcript = await run_in_threadpool(TRANSCRIPT_STREAMS.finalize, supabase, session_id)
+        await websocket.send_json({"type": "final", "lines": len((transcript or "").splitlines())})
+        await websocket.close()
+
+@app.websocket("/dashboard/stream")
+async def stream_dashboard_changes(websocket: WebSocket, patient_id: Optional[List[str]] = Query(None)):
+    """
+    Live changes for dashboards.
+
+    Pushes {"type": "change", "table", "op", "id", "patient_id", "updated_at"}
+    for every patient, session and memory row written (only rows of the given
+    `patient_id`s, if any). Messages carry keys only: refetch the row, with
+    If-None-Match, to redraw. {"type": "resync"} means changes were missed and
+    everything shown should be refetched.
+    """
+    await websocket.accept()
+    subscription = DASHBOARDS.connect(set(patient_id) if patient_id else None)
+
+    async def drain_client():
+        # Nothing is expected from the client; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    receiver = asyncio.create_task(drain_client())
+    try:
+        await websocket.send_json({"type": "subscribed", "patient_ids": patient_id})
+        while True:
+            next_message = asyncio.create_task(subscription.get())
+            done, _ = await asyncio.wait({next_message, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                next_message.cancel()
+                break
+            await websocket.send_json(next_message.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        DASHBOARDS.disconnect(subscription)
+
 @app.post("/sessions/analyze/{session_id}")
 def analyze_session(session_id: UUID, background_tasks: BackgroundTasks):
     supabase = get_supabase()
@@ -84,10 +366,13 @@ def analyze_session(session_id: UUID, background_tasks: BackgroundTasks):
 # Memories
 # ------------------------------
 @app.get("/memories", response_model=List[MemoryResponse])
-def list_memories():
+def list_memories(embedding_format: EmbeddingFormat = Query("base64"), if_none_match: Optional[str] = Header(default=None)):
     supabase = get_supabase()
-    result = supabase.table("memories").select("*").execute()
-    return result.data
+    etag = make_etag("memories", embedding_format, table_version(supabase, "memories"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    result = supabase.table("memories").select(memory_columns(embedding_format)).execute()
+    return with_etag(trusted_response(format_memory_rows(result.data, embedding_format), MemoryResponse), etag)
 
 @app.post("/memories", response_model=MemoryResponse)
 def create_memory(payload: MemoryCreate):
@@ -95,6 +380,29 @@ def create_memory(payload: MemoryCreate):
     result = supabase.table("memories").insert(payload.model_dump()).execute()
     return result.data[0]
 
+@app.post("/memories/search", response_model=List[MemorySearchResult])
+def search_memories(payload: MemorySearchRequest):
+    """
+    Hybrid memory search
+
+    Ranks by full-text match on title, tags and description and by embedding
+    similarity, fused with reciprocal rank fusion. Filter by patient,
+    emotional_tone and minimum significance_level.
+    """
+    if not payload.query and payload.query_embedding is None:
+        raise HTTPException(status_code=400, detail="Provide query, query_embedding, or both")
+    supabase = get_supabase()
+    results = hybrid_search_memories(
+        supabase,
+        query=payload.query,
+        query_embedding=payload.query_embedding,
+        patient_id=payload.patient_id,
+        emotional_tone=payload.emotional_tone,
+        min_significance=payload.min_significance,
+        limit=payload.limit,
+    )
+    return trusted_response(results, MemorySearchResult)
+
 
 # ----------------------
 # Doctors
@@ -103,7 +411,7 @@ def create_memory(payload: MemoryCreate):
 def list_doctors():
     supabase = get_supabase()
     result = supabase.table("doctors").select("*").execute()
-    return result.data
+    return trusted_response(result.data, DoctorResponse)
 
 @app.post("/doctors", response_model=DoctorResponse)
 def create_doctor(payload: DoctorCreate):
@@ -120,7 +428,7 @@ def create_doctor(payload: DoctorCreate):
 def get_patient_records(patient_id: UUID):
     supabase = get_supabase()
     result = supabase.table("doctor_records").select("*").eq("patient_id", str(patient_id)).execute()
-    return result.data
+    return trusted_response(result.data, DoctorRecordResponse)
 
 @app.post("/doctor-records", response_model=DoctorRecordResponse)
 def create_doctor_record(payload: DoctorRecordCreate):
@@ -141,6 +449,8 @@ class AudioUploadResponse(BaseModel):
     content_type: str
     session_id: Optional[UUID] = None
     message: str
+    normalization: Optional[str] = None
+    deduplicated: bool = False
 
 # ------------------------------
 # Audio Upload Helper Functions
@@ -148,6 +458,69 @@ class AudioUploadResponse(BaseModel):
 AUDIO_BUCKET_NAME = os.getenv("SUPABASE_AUDIO_BUCKET", "audio")
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.m4a', '.ogg', '.aac'}
+AUDIO_CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg',
+    '.aac': 'audio/aac'
+}
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def get_audio_public_url(path: str) -> str:
+    """Public URL of an object in the audio bucket"""
+    supabase = get_supabase()
+    url_response = supabase.storage.from_(AUDIO_BUCKET_NAME).get_public_url(path)
+    
+    # Extract public URL from response
+    if isinstance(url_response, dict):
+        return url_response.get('publicUrl', url_response.get('public_url', ''))
+    elif hasattr(url_response, 'publicUrl'):
+        return url_response.publicUrl
+    elif isinstance(url_response, str):
+        return url_response
+    
+    # Fallback: construct URL manually
+    supabase_url = os.getenv("SUPABASE_URL", "")
+    if supabase_url:
+        return f"{supabase_url}/storage/v1/object/public/{AUDIO_BUCKET_NAME}/{path}"
+    raise HTTPException(
+        status_code=500,
+        detail="Failed to construct public URL: SUPABASE_URL not configured"
+    )
+
+def find_stored_audio(file_path: str) -> Optional[dict]:
+    """
+    Look up a content-addressed upload and its compact rendition.
+
+    Returns dict with 'path' and 'compact_path' (or None) if the object
+    already exists, else None.
+    """
+    folder, _, name = file_path.rpartition("/")
+    digest = name.split(".", 1)[0]
+    supabase = get_supabase()
+    try:
+        entries = supabase.storage.from_(AUDIO_BUCKET_NAME).list(folder, {"search": digest})
+    except Exception as e:
+        print(f"⚠️  Audio lookup failed, uploading anyway: {e}")
+        return None
+    names = {entry.get("name") for entry in entries or [] if isinstance(entry, dict)}
+    if name not in names:
+        return None
+    compact = next((n for n in sorted(names) if n.startswith(f"{digest}.16k.")), None)
+    return {"path": file_path, "compact_path": f"{folder}/{compact}" if compact else None}
+
+def is_duplicate_upload(error) -> bool:
+    """Whether storage refused the upload because the object already exists (upsert off)"""
+    details = error.args[0] if isinstance(error, Exception) and error.args else error
+    if isinstance(details, dict):
+        if str(details.get("statusCode")) == "409" or details.get("error") == "Duplicate":
+            return True
+        details = details.get("message", "")
+    message = getattr(details, "message", details)
+    return isinstance(message, str) and "already exists" in message.lower()
 
 def upload_audio_to_supabase_storage(
     file_content: bytes,
@@ -158,9 +531,11 @@ def upload_audio_to_supabase_storage(
     Upload audio file to Supabase Storage.
     
     Returns:
-        dict with 'path' and 'public_url' keys
+        dict with 'path' and 'public_url' keys, and 'existing' True if an
+        identical (content-addressed) object was stored first by another upload
     """
     supabase = get_supabase()
+    already_stored = {"path": file_path, "public_url": get_audio_public_url(file_path), "existing": True}
     
     try:
         # Upload file to Supabase Storage
@@ -172,6 +547,8 @@ def upload_audio_to_supabase_storage(
         )
         
         if error:
+            if is_duplicate_upload(error):
+                return already_stored
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to upload audio to Supabase Storage: {error.message if hasattr(error, 'message') else str(error)}"
@@ -184,40 +561,60 @@ def upload_audio_to_supabase_storage(
         elif hasattr(data, 'path'):
             uploaded_path = data.path
         
-        # Get public URL
-        url_response = supabase.storage.from_(AUDIO_BUCKET_NAME).get_public_url(uploaded_path)
-        
-        # Extract public URL from response
-        public_url = ""
-        if isinstance(url_response, dict):
-            public_url = url_response.get('publicUrl', url_response.get('public_url', ''))
-        elif hasattr(url_response, 'publicUrl'):
-            public_url = url_response.publicUrl
-        elif isinstance(url_response, str):
-            public_url = url_response
-        else:
-            # Fallback: construct URL manually
-            supabase_url = os.getenv("SUPABASE_URL", "")
-            if supabase_url:
-                public_url = f"{supabase_url}/storage/v1/object/public/{AUDIO_BUCKET_NAME}/{uploaded_path}"
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to construct public URL: SUPABASE_URL not configured"
-                )
-        
         return {
             "path": uploaded_path,
-            "public_url": public_url
+            "public_url": get_audio_public_url(uploaded_path)
         }
     except HTTPException:
         raise
     except Exception as e:
+        if is_duplicate_upload(e):
+            return already_stored
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error uploading audio: {str(e)}"
         )
 
+def store_compact_rendition(
+    file_content: bytes,
+    original_path: str,
+    original_url: str,
+    file_extension: str,
+    session_id: Optional[UUID] = None
+) -> Optional[dict]:
+    """
+    Worker-pool job: store a mono 16 kHz rendition next to the original and
+    point the session's audio_url at it (keeping audio_original_url).
+    """
+    try:
+        compact = normalize_audio(file_content, file_extension)
+        if compact is None:
+            print(f"ℹ️  No compact rendition for {original_path} (no encoder for {file_extension} or no saving)")
+            return None
+
+        result = upload_audio_to_supabase_storage(
+            compact.content,
+            compact_path(original_path, compact.extension),
+            compact.content_type
+        )
+        print(
+            f"🎧 Compact audio for {original_path}: {compact.original_bytes:,} → {len(compact.content):,} bytes "
+            f"({compact.ratio:.1f}x smaller, {compact.saved_bytes:,} saved) in {compact.elapsed_seconds:.2f}s"
+        )
+
+        if session_id:
+            supabase = get_supabase()
+            supabase.table("sessions").update({
+                "audio_url": result["public_url"],
+                "audio_original_url": original_url
+            }).eq("session_id", str(session_id)).execute()
+            entity_cache.invalidate("sessions", session_id)
+        return result
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"⚠️  Audio normalization failed for {original_path}: {detail}")
+        return None
+
 # ------------------------------
 # Audio Upload Endpoint
 # ------------------------------
@@ -225,7 +622,8 @@ def upload_audio_to_supabase_storage(
 async def upload_audio(
     file: UploadFile = File(..., description="Audio file to upload"),
     patient_id: Optional[UUID] = Form(None, description="Patient ID for organizing files"),
-    session_id: Optional[UUID] = Form(None, description="Session ID to link audio to")
+    session_id: Optional[UUID] = Form(None, description="Session ID to link audio to"),
+    normalize: Optional[bool] = Form(None, description="Also store a compact mono 16 kHz rendition (default: AUDIO_NORMALIZATION)")
 ):
     """
     Upload an audio file to Supabase Storage.
@@ -233,6 +631,7 @@ async def upload_audio(
     - **file**: Audio file (MP3, WAV, FLAC, M4A, OGG, AAC)
     - **patient_id**: Optional patient ID for file organization
     - **session_id**: Optional session ID to update with audio_url
+    - **normalize**: Queue a compact rendition that replaces the session's audio_url once stored
     
     Returns the public URL and optionally updates the session.
     """
@@ -244,76 +643,82 @@ async def upload_audio(
             detail=f"Unsupported file type: {file_extension}. Allowed types: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
         )
     
-    # Read file content
-    file_content = await file.read()
+    # Read file content in chunks, hashing as it streams in and stopping
+    # as soon as the size limit is exceeded
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        digest.update(chunk)
+        if len(buffer) > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large: over {MAX_FILE_SIZE} bytes. Maximum size: {MAX_FILE_SIZE} bytes (50MB)"
+            )
+    file_content = bytes(buffer)
     file_size = len(file_content)
     
-    # Validate file size
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large: {file_size} bytes. Maximum size: {MAX_FILE_SIZE} bytes (50MB)"
-        )
-    
     # Validate patient_id exists if provided
     if patient_id:
-        supabase = get_supabase()
-        patient = supabase.table("patients").select("*").eq("patient_id", str(patient_id)).execute()
-        if not patient.data:
+        if entity_cache.cached_row(get_supabase(), "patients", patient_id) is None:
             raise HTTPException(status_code=404, detail=f"Patient not found: {patient_id}")
     
     # Validate session_id exists if provided
     if session_id:
-        supabase = get_supabase()
-        session = supabase.table("sessions").select("*").eq("session_id", str(session_id)).execute()
-        if not session.data:
+        if entity_cache.cached_row(get_supabase(), "sessions", session_id) is None:
             raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
     
-    # Generate file path
-    timestamp = int(datetime.utcnow().timestamp() * 1000)  # milliseconds
-    safe_filename = file.filename.replace(" ", "_")
+    # Content-addressed path: retries of the same audio map to the same object
+    content_name = f"{digest.hexdigest()}{file_extension}"
     
     if patient_id:
-        file_path = f"audio/{patient_id}/{timestamp}-{safe_filename}"
+        file_path = f"audio/{patient_id}/{content_name}"
     else:
-        file_path = f"audio/{timestamp}-{safe_filename}"
+        file_path = f"audio/{content_name}"
     
     # Determine content type
     content_type = file.content_type or "audio/wav"
     if not content_type.startswith("audio/"):
         # Map extension to content type
-        content_type_map = {
-            '.mp3': 'audio/mpeg',
-            '.wav': 'audio/wav',
-            '.flac': 'audio/flac',
-            '.m4a': 'audio/mp4',
-            '.ogg': 'audio/ogg',
-            '.aac': 'audio/aac'
-        }
-        content_type = content_type_map.get(file_extension, 'audio/wav')
+        content_type = AUDIO_CONTENT_TYPES.get(file_extension, 'audio/wav')
     
-    # Upload to Supabase Storage
-    try:
-        upload_result = upload_audio_to_supabase_storage(
-            file_content,
-            file_path,
-            content_type
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to upload audio: {str(e)}"
-        )
+    # Skip the storage write entirely if identical audio is already stored
+    existing = find_stored_audio(file_path)
+    session_audio = {}
+    if not existing:
+        # Upload to Supabase Storage
+        try:
+            upload_result = upload_audio_to_supabase_storage(
+                file_content,
+                file_path,
+                content_type
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to upload audio: {str(e)}"
+            )
+        if upload_result.get("existing"):
+            # A concurrent upload of the same content stored it between the check and the write
+            existing = find_stored_audio(file_path) or {"path": file_path, "compact_path": None}
+        else:
+            session_audio["audio_url"] = upload_result["public_url"]
+    if existing:
+        upload_result = {"path": existing["path"], "public_url": get_audio_public_url(existing["path"])}
+        session_audio["audio_url"] = upload_result["public_url"]
+        if existing["compact_path"]:
+            session_audio["audio_url"] = get_audio_public_url(existing["compact_path"])
+            session_audio["audio_original_url"] = upload_result["public_url"]
+        print(f"♻️  Audio already stored at {file_path}; skipped upload of {file_size:,} bytes")
     
     # Update session with audio_url if session_id provided
     updated_session_id = None
     if session_id:
         supabase = get_supabase()
-        update_result = supabase.table("sessions").update({
-            "audio_url": upload_result["public_url"]
-        }).eq("session_id", str(session_id)).execute()
+        update_result = supabase.table("sessions").update(session_audio).eq("session_id", str(session_id)).execute()
+        entity_cache.invalidate("sessions", session_id)
         
         if not update_result.data:
             # Log warning but don't fail the upload
@@ -321,6 +726,21 @@ async def upload_audio(
         else:
             updated_session_id = session_id
     
+    # Compact rendition is produced off the request path
+    normalization = None
+    if existing and existing["compact_path"]:
+        normalization = "existing"
+    elif AUDIO_NORMALIZE_DEFAULT if normalize is None else normalize:
+        AUDIO_POOL.submit(
+            store_compact_rendition,
+            file_content,
+            upload_result["path"],
+            upload_result["public_url"],
+            file_extension,
+            updated_session_id
+        )
+        normalization = "queued"
+    
     return AudioUploadResponse(
         success=True,
         file_path=upload_result["path"],
@@ -328,13 +748,97 @@ async def upload_audio(
         file_size=file_size,
         content_type=content_type,
         session_id=updated_session_id,
-        message="Audio uploaded successfully"
+        message="Audio already stored; reused existing file" if existing else "Audio uploaded successfully",
+        normalization=normalization,
+        deduplicated=bool(existing)
     )
 
-BEYOND_PRESENCE_BASE_URL = "https://api.beyondpresence.ai/v1"
+# ------------------------------
+# Audio Playback
+# ------------------------------
+@app.get("/audio/{path:path}")
+async def play_audio(path: str, range_header: Optional[str] = Header(default=None, alias="range")):
+    """
+    Stream a stored recording, honouring HTTP Range requests for seeking
+
+    Works with private buckets: bytes come from storage via a cached signed
+    URL, or from the local disk cache once a recording is hot.
+    """
+    if not path or ".." in path.split("/"):
+        raise HTTPException(status_code=400, detail="Invalid audio path")
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Uploads are content-addressed, so a path never changes content
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Type": AUDIO_CONTENT_TYPES.get(Path(path).suffix.lower(), "application/octet-stream"),
+    }
+    
+    cached = playback.AUDIO_DISK_CACHE.open(path)
+    if cached is not None:
+        handle, size = cached
+        try:
+            byte_range = playback.parse_range(range_header, size)
+        except playback.RangeNotSatisfiable:
+            handle.close()
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range or (0, size - 1)
+        headers["Content-Length"] = str(end - start + 1)
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return StreamingResponse(
+            playback.iter_file(handle, start, end),
+            status_code=206 if byte_range else 200,
+            headers=headers,
+        )
+    
+    supabase = get_supabase()
+    url = playback.SIGNED_URLS.peek(AUDIO_BUCKET_NAME, path)
+    try:
+        if url is None:
+            url = await run_in_threadpool(playback.SIGNED_URLS.get, supabase, AUDIO_BUCKET_NAME, path)
+        upstream = await playback.open_upstream(url, range_header)
+        if upstream.status_code in (400, 401, 403):
+            # Signature rejected (e.g. revoked key): sign again once
+            await upstream.aclose()
+            playback.SIGNED_URLS.invalidate(AUDIO_BUCKET_NAME, path)
+            url = await run_in_threadpool(playback.SIGNED_URLS.get, supabase, AUDIO_BUCKET_NAME, path)
+            upstream = await playback.open_upstream(url, range_header)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Audio storage unavailable: {e}")
+    except Exception as e:
+        # Storage client raises its own error type for unknown objects
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=404, detail="Audio not found")
+        raise HTTPException(status_code=502, detail=f"Failed to sign audio URL: {e}")
+    
+    if upstream.status_code >= 400 and upstream.status_code != 416:
+        await upstream.aclose()
+        if upstream.status_code in (400, 404):
+            raise HTTPException(status_code=404, detail="Audio not found")
+        raise HTTPException(status_code=502, detail=f"Audio storage returned {upstream.status_code}")
+    
+    for name in ("Content-Length", "Content-Range"):
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+    
+    tasks = BackgroundTasks()
+    if upstream.status_code != 416 and playback.AUDIO_DISK_CACHE.should_fill(path):
+        tasks.add_task(playback.AUDIO_DISK_CACHE.fill, url, path)
+    return StreamingResponse(
+        playback.iter_upstream(upstream),
+        status_code=upstream.status_code,
+        headers=headers,
+        background=tasks,
+    )
 
+# ------------------------------
+# Beyond Presence Calls
+# ------------------------------
 @app.get("/calls/{call_id}/messages")
-def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
+async def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
     """
     Retrieve all prior messages from a Beyond Presence call.
 
@@ -349,19 +853,38 @@ def get_call_messages(call_id: str, x_api_key: str = Header(default=None)):
     if not api_key:
         raise HTTPException(status_code=401, detail="Missing Beyond Presence API key.")
 
-    url = f"{BEYOND_PRESENCE_BASE_URL}/calls/{call_id}/messages"
-    headers = {
-        "x-api-key": api_key,
-        "Accept": "application/json"
-    }
-
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        messages = response.json()
-        return {"call_id": call_id, "messages": messages}
-
-    except requests.exceptions.HTTPError as e:
-        raise HTTPException(status_code=response.status_code, detail=str(e))
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Request failed: {e}")
+        messages = await beyond_presence.get_call_messages(call_id, api_key)
+    except beyond_presence.BeyondPresenceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"call_id": call_id, "messages": messages}
+
+@app.post("/calls/messages/batch", response_model=CallMessagesBatchResponse)
+async def get_many_call_messages(payload: CallMessagesBatchRequest, x_api_key: str = Header(default=None)):
+    """
+    Retrieve messages for many Beyond Presence calls concurrently.
+
+    Calls that fail are reported under `errors` instead of failing the batch.
+    """
+    api_key = x_api_key or os.getenv("BEY_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Missing Beyond Presence API key.")
+
+    calls, errors = await beyond_presence.fetch_many_call_messages(payload.call_ids, api_key)
+    return {"calls": calls, "errors": errors}
+
+@app.post("/calls/ingest", status_code=202)
+async def ingest_calls(payload: CallIngestRequest, background_tasks: BackgroundTasks, x_api_key: str = Header(default=None)):
+    """
+    Webhook: turn completed calls into sessions and analyze them.
+
+    Transcripts are fetched, sessions bulk-created and analyses run in the
+    background. Calls already ingested are skipped, so redelivery is safe.
+    """
+    api_key = x_api_key or os.getenv("BEY_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Missing Beyond Presence API key.")
+
+    pipeline = CallIngestionPipeline(get_supabase(), api_key, run_cognitive_analysis)
+    background_tasks.add_task(pipeline.ingest, [call.model_dump(mode="json") for call in payload.calls])
+    return {"status": "accepted", "calls": len(payload.calls)}
@@ -0,0 +1,125 @@
+"""
+Local stand-in for a Redis server, for developing the shared entity cache
+tier (services/entity_cache.py) across several workers without installing
+Redis.
+
+Speaks RESP2 and implements the commands the cache uses: GET, SET (with EX
+or PX), DEL, plus PING, EXISTS, FLUSHDB, and no-op CLIENT / SELECT for the
+client handshake. Single process, in memory, expiry checked on read.
+
+Usage:
+    python -m NewMindmate.redis_standin --port 6380
+    ENTITY_CACHE_URL=redis://localhost:6380/0 \\
+        uv run gunicorn NewMindmate.main:app -k uvicorn.workers.UvicornWorker -w 4
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+# key -> (value, expires at monotonic seconds or None)
+_data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+
+def _get(key: bytes) -> Optional[bytes]:
+    entry = _data.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del _data[key]
+        return None
+    return value
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def execute(args: List[bytes]) -> bytes:
+    """RESP reply for one command"""
+    command = args[0].upper()
+    if command == b"PING":
+        return _bulk(args[1]) if len(args) > 1 else b"+PONG\r\n"
+    if command == b"GET":
+        return _bulk(_get(args[1]))
+    if command == b"SET":
+        expires_at = None
+        options = [a.upper() for a in args[3:]]
+        for i, option in enumerate(options[:-1]):
+            if option == b"EX":
+                expires_at = time.monotonic() + float(args[3 + i + 1])
+            elif option == b"PX":
+                expires_at = time.monotonic() + float(args[3 + i + 1]) / 1000
+        _data[args[1]] = (args[2], expires_at)
+        return b"+OK\r\n"
+    if command == b"DEL":
+        removed = 0
+        for key in args[1:]:
+            if _get(key) is not None:
+                del _data[key]
+                removed += 1
+        return b":%d\r\n" % removed
+    if command == b"EXISTS":
+        return b":%d\r\n" % sum(1 for key in args[1:] if _get(key) is not None)
+    if command == b"FLUSHDB":
+        _data.clear()
+        return b"+OK\r\n"
+    if command in (b"CLIENT", b"SELECT"):
+        return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % command
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            args = await _read_command(reader)
+            if args is None:
+                break
+            if args:
+                writer.write(execute(args))
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6380) -> asyncio.AbstractServer:
+    return await asyncio.start_server(handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"✅ Redis stand-in listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
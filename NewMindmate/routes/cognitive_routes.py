@@ -2,13 +2,19 @@
 Cognitive API Integration Routes
 New endpoints that use the Cognitive API for real AI-powered analysis
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from uuid import UUID
 from datetime import datetime
-from typing import List
-from NewMindmate.db.supabase_client import get_supabase
+from typing import List, Optional
+from NewMindmate.db.supabase_client import LazySupabase
 from NewMindmate.db.vector_utils import store_memory_embedding
 from NewMindmate.schemas import PatientData
+from NewMindmate.services import tracing
+from NewMindmate.services.admission import ADMISSION, BULK, INTERACTIVE, doctor_key
+from NewMindmate.services import entity_cache
+from NewMindmate.services.analysis_cache import ANALYSIS_CACHE, analysis_key
+from NewMindmate.services.downsampling import downsample_points
 from NewMindmate.services.cognitive_api_client import (
     analyze_session_with_ai,
     get_patient_dashboard,
@@ -16,7 +22,10 @@ from NewMindmate.services.cognitive_api_client import (
 )
 
 router = APIRouter(prefix="/cognitive", tags=["cognitive"])
-supabase = get_supabase()
+supabase = LazySupabase()
+
+# Sessions with an analysis background task queued or running
+_analyzing_sessions = set()
 
 
 @router.get("/health")
@@ -26,54 +35,95 @@ async def check_cognitive_api_health():
     return health
 
 
-@router.post("/sessions/{session_id}/analyze")
-async def analyze_session_with_cognitive_api(session_id: UUID, background_tasks: BackgroundTasks):
-    """
-    Analyze session using Cognitive API (NEW - uses real AI)
-
-    This is the NEW endpoint that calls the deployed Cognitive API
-    """
-
+def _load_analysis_inputs(session_id: UUID):
+    """Session row, patient row and analysis content hash (404 if either row is missing)"""
     # Fetch session
     result = supabase.table("sessions").select("*").eq("session_id", str(session_id)).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Session not found")
 
     session = result.data[0]
-    patient_id = session["patient_id"]
 
     # Fetch patient
-    patient_result = supabase.table("patients").select("*").eq("patient_id", patient_id).execute()
+    patient_result = supabase.table("patients").select("*").eq("patient_id", session["patient_id"]).execute()
     if not patient_result.data:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     patient_data = patient_result.data[0]
+    return session, patient_data, analysis_key(session.get("transcript", ""), patient_data)
 
-    # Fetch previous sessions for context
-    prev_sessions = (
-        supabase.table("sessions")
-        .select("*")
-        .eq("patient_id", patient_id)
-        .order("session_date", desc=True)
-        .limit(5)
-        .execute()
-    )
 
-    async def run_analysis():
-        """Background task to run AI analysis"""
+def _store_memories(patient_id: str, memories: List[dict]) -> None:
+    """Store (or merge near-duplicates of) the memories extracted by an analysis"""
+    for memory in memories:
         try:
-            print(f"🧠 Starting Cognitive API analysis for session {session_id}")
+            store_memory_embedding(
+                supabase,
+                patient_id=patient_id,
+                title=memory.get("title", "Memory"),
+                description=memory.get("description", ""),
+                embedding=memory.get("embedding"),
+                dateapprox=memory.get("dateapprox"),
+                location=memory.get("location"),
+                emotional_tone=memory.get("emotional_tone"),
+                tags=memory.get("tags", []),
+                significance_level=memory.get("significance_level", 1)
+            )
+            print(f"📝 Stored memory: {memory.get('title')}")
+        except Exception as e:
+            print(f"⚠️  Failed to store memory: {e}")
+
+
+def _is_up_to_date(session: dict, content_hash: str) -> bool:
+    return (session.get("ai_extracted_data") or {}).get("content_hash") == content_hash
 
-            # CALL COGNITIVE API
-            analysis = await analyze_session_with_ai(
+
+async def run_session_analysis(
+    session_id: UUID,
+    session: dict,
+    patient_data: dict,
+    content_hash: str,
+    force: bool = False,
+    trace_parent=None
+) -> bool:
+    """
+    Analyze a session with the Cognitive API and store results and memories
+
+    Returns True on success; failures are recorded on the session row.
+    """
+    patient_id = session["patient_id"]
+    transcript = session.get("transcript", "")
+
+    async def analyze():
+        # Previous sessions are context for the Cognitive API; only needed on a cache miss
+        prev_sessions = (
+            supabase.table("sessions")
+            .select("*")
+            .eq("patient_id", patient_id)
+            .order("session_date", desc=True)
+            .limit(5)
+            .execute()
+        )
+        # Bulk work: waits behind interactive doctor queries for an upstream slot
+        async with ADMISSION.slot(BULK):
+            return await analyze_session_with_ai(
                 session_id=session_id,
                 patient_id=UUID(patient_id),
-                transcript=session.get("transcript", ""),
+                transcript=transcript,
                 patient_data=patient_data,
                 previous_sessions=prev_sessions.data
             )
 
+    with tracing.span("run_analysis", parent=trace_parent, session_id=session_id) as span:
+        try:
+            print(f"🧠 Starting Cognitive API analysis for session {session_id}")
+
+            # CALL COGNITIVE API (or reuse a cached / in-flight analysis of the same content)
+            analysis = await ANALYSIS_CACHE.get_or_compute(content_hash, analyze, supabase=supabase, force=force)
+            analysis = dict(analysis, content_hash=content_hash)
+
             print(f"✅ Analysis complete! Overall score: {analysis['overall_score']:.1%}")
+            span.set_attribute("memories", len(analysis.get("memories", [])))
 
             # Store results in Supabase
             supabase.table("sessions").update({
@@ -82,49 +132,108 @@ async def analyze_session_with_cognitive_api(session_id: UUID, background_tasks:
                 "overall_score": analysis.get("overall_score"),
                 "notable_events": analysis.get("notable_events", [])
             }).eq("session_id", str(session_id)).execute()
+            entity_cache.invalidate("sessions", session_id)
 
             print(f"💾 Stored analysis in Supabase")
 
-            # Store extracted memories in ChromaDB
-            for memory in analysis.get("memories", []):
-                try:
-                    store_memory_embedding(
-                        supabase,
-                        patient_id=patient_id,
-                        title=memory.get("title", "Memory"),
-                        description=memory.get("description", ""),
-                        embedding=memory.get("embedding"),
-                        dateapprox=memory.get("dateapprox"),
-                        location=memory.get("location"),
-                        emotional_tone=memory.get("emotional_tone"),
-                        tags=memory.get("tags", []),
-                        significance_level=memory.get("significance_level", 1)
-                    )
-                    print(f"📝 Stored memory: {memory.get('title')}")
-                except Exception as e:
-                    print(f"⚠️  Failed to store memory: {e}")
+            # Store extracted memories; dedupe may load the patient's whole memory index, so off the event loop
+            await run_in_threadpool(_store_memories, patient_id, analysis.get("memories", []))
 
             print(f"🎉 Analysis pipeline complete for session {session_id}")
+            return True
 
         except Exception as e:
             print(f"❌ Analysis failed: {e}")
+            span.record_error(e)
             # Store error in session
             supabase.table("sessions").update({
                 "ai_extracted_data": {"error": str(e)}
             }).eq("session_id", str(session_id)).execute()
+            entity_cache.invalidate("sessions", session_id)
+            return False
+        finally:
+            _analyzing_sessions.discard(str(session_id))
+
+
+async def analyze_session(session_id: UUID, force: bool = False) -> Optional[bool]:
+    """
+    Analyze a session and wait for the result (used by call ingestion)
+
+    Returns True once analyzed, False if the analysis failed, or None if
+    another analysis of the session is still running (outcome unknown).
+    """
+    session, patient_data, content_hash = await run_in_threadpool(_load_analysis_inputs, session_id)
+    if not force and _is_up_to_date(session, content_hash):
+        return True
+    if str(session_id) in _analyzing_sessions:
+        return None
+    _analyzing_sessions.add(str(session_id))
+    return await run_session_analysis(session_id, session, patient_data, content_hash, force)
+
+
+@router.post("/sessions/{session_id}/analyze")
+async def analyze_session_with_cognitive_api(
+    session_id: UUID,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    force: bool = Query(False, description="Re-run the analysis even if a cached result exists")
+):
+    """
+    Analyze session using Cognitive API (NEW - uses real AI)
+
+    This is the NEW endpoint that calls the deployed Cognitive API.
+    Results are cached by content hash (transcript + patient profile +
+    analysis version), so re-analyzing unchanged content is instant and
+    concurrent requests share one Cognitive API call. Pass force=true
+    to re-run anyway. New analyses are charged to the doctor's bulk
+    budget (429 with Retry-After when exhausted).
+    """
+    session, patient_data, content_hash = _load_analysis_inputs(session_id)
+
+    if not force and _is_up_to_date(session, content_hash):
+        return {
+            "status": "Analysis up to date",
+            "session_id": str(session_id),
+            "content_hash": content_hash,
+            "cached": True
+        }
+    if str(session_id) in _analyzing_sessions:
+        return {
+            "status": "Analysis already in progress",
+            "session_id": str(session_id),
+            "content_hash": content_hash,
+            "cached": False
+        }
+
+    ADMISSION.check(doctor_key(request), BULK)
+
+    # Background tasks run after the response is sent; parent them explicitly
+    trace_parent = tracing.current_span_context()
+    cached = not force and content_hash in ANALYSIS_CACHE
 
     # Run analysis in background
-    background_tasks.add_task(run_analysis)
+    _analyzing_sessions.add(str(session_id))
+    background_tasks.add_task(
+        run_session_analysis, session_id, session, patient_data, content_hash, force, trace_parent
+    )
 
     return {
         "status": "Analysis started in background",
         "session_id": str(session_id),
-        "message": "Check back in 60-120 seconds for results"
+        "content_hash": content_hash,
+        "cached": cached,
+        "message": "Cached analysis, results available momentarily" if cached else "Check back in 60-120 seconds for results"
     }
 
 
 @router.get("/patients/{patient_id}/analytics")
-async def get_patient_analytics_from_cognitive_api(patient_id: UUID):
+async def get_patient_analytics_from_cognitive_api(
+    patient_id: UUID,
+    request: Request,
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample each series to at most this many points (LTTB)"),
+    start: Optional[datetime] = Query(None, description="Only points at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only points at or before this time"),
+):
     """
     Get patient analytics using Cognitive API (NEW - returns REAL data)
 
@@ -151,31 +260,43 @@ async def get_patient_analytics_from_cognitive_api(patient_id: UUID):
     # Check for MRI data (optional)
     mri_path = f"data/mri_outputs/report_{patient_id}.csv"
 
-    try:
-        # Call Cognitive API for dashboard data
-        dashboard = await get_patient_dashboard(
-            patient_id=patient_id,
-            patient_name=patient["name"],
-            sessions=sessions_result.data,
-            mri_csv_path=mri_path
-        )
+    async with ADMISSION.admit(doctor_key(request), INTERACTIVE):
+        try:
+            # Call Cognitive API for dashboard data
+            dashboard = await get_patient_dashboard(
+                patient_id=patient_id,
+                patient_name=patient["name"],
+                sessions=sessions_result.data,
+                mri_csv_path=mri_path
+            )
 
-        return dashboard  # Already in PatientData format!
+            metrics = dashboard.get("memoryMetrics")
+            if metrics:
+                dashboard["memoryMetrics"] = {
+                    name: downsample_points(points, max_points, start, end) for name, points in metrics.items()
+                }
+            return dashboard  # Already in PatientData format!
 
-    except Exception as e:
-        print(f"❌ Cognitive API error: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate analytics: {str(e)}"
-        )
+        except Exception as e:
+            print(f"❌ Cognitive API error: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to generate analytics: {str(e)}"
+            )
 
 
 @router.get("/patients/{patient_id}/cognitive-data")
-async def get_patient_cognitive_data(patient_id: UUID):
+async def get_patient_cognitive_data(
+    patient_id: UUID,
+    request: Request,
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+):
     """
     Alias endpoint for frontend compatibility
 
     Frontend calls /cognitive-data but backend has /analytics
     This endpoint bridges the gap
     """
-    return await get_patient_analytics_from_cognitive_api(patient_id)
+    return await get_patient_analytics_from_cognitive_api(patient_id, request, max_points, start, end)
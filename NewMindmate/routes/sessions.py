@@ -1,19 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Header, Request
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 from pydantic import BaseModel
 
-from db.supabase_client import get_supabase
-from db.vector_utils import store_memory_embedding
+from db.supabase_client import LazySupabase
+from db.vector_utils import MEMORY_INDEX, store_memory_embedding, format_memory_embedding, format_memory_rows, memory_columns
 
 from schemas import (
     PatientCreate, PatientResponse,
     SessionCreate, SessionResponse,
-    MemoryCreate, MemoryResponse,
+    MemoryCreate, MemoryResponse, EmbeddingFormat,
     PatientData, BrainRegionScores, MemoryMetrics, RecentSession, TimeSeriesDataPoint
 )
 
+from services.serialization import FastJSONResponse, trusted_response
+from services.admission import ADMISSION, INTERACTIVE, doctor_key
+from services.entity_cache import cached_row, invalidate
+from services.conditional import etag_matches, make_etag, not_modified, table_version, with_etag
+from services.downsampling import SERIES_CACHE, SeriesPyramid, to_epoch
 from services.cognitive_api_client import (
     doctor_query,
     get_session_insights,
@@ -21,7 +26,7 @@ from services.cognitive_api_client import (
 )
 
 router = APIRouter()
-supabase = get_supabase()
+supabase = LazySupabase()
 
 
 # Request models for doctor query endpoints
@@ -42,7 +47,7 @@ class SessionInsightRequest(BaseModel):
 # ==============================
 
 @router.post("/doctor/query")
-async def natural_language_query(request: DoctorQueryRequest):
+async def natural_language_query(request: DoctorQueryRequest, http_request: Request):
     """
     Natural language query interface for doctors
 
@@ -59,11 +64,14 @@ async def natural_language_query(request: DoctorQueryRequest):
     - Sequential thinking for medical reasoning
     - Memory for follow-up queries
     - Predictive risk scoring
+
+    Rate limited per doctor (X-Doctor-Id); 429 with Retry-After when over budget.
     """
-    result = await doctor_query(
-        query=request.query,
-        context=request.context
-    )
+    async with ADMISSION.admit(doctor_key(http_request), INTERACTIVE):
+        result = await doctor_query(
+            query=request.query,
+            context=request.context
+        )
 
     return {
         "success": result.get("success", True),
@@ -76,7 +84,7 @@ async def natural_language_query(request: DoctorQueryRequest):
 
 
 @router.post("/sessions/{session_id}/insights")
-async def get_ai_session_insights(session_id: UUID, query: Optional[str] = None):
+async def get_ai_session_insights(session_id: UUID, request: Request, query: Optional[str] = None):
     """
     Get AI-powered insights about a specific session
 
@@ -93,17 +101,15 @@ async def get_ai_session_insights(session_id: UUID, query: Optional[str] = None)
     - "How does this session compare to previous ones?"
     """
     # Verify session exists
-    result = supabase.table("sessions").select("*").eq("session_id", str(session_id)).execute()
-
-    if not result.data:
+    session = cached_row(supabase, "sessions", session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session = result.data[0]
-
-    insights = await get_session_insights(
-        session_id=session_id,
-        query=query
-    )
+    async with ADMISSION.admit(doctor_key(request), INTERACTIVE):
+        insights = await get_session_insights(
+            session_id=session_id,
+            query=query
+        )
 
     return {
         "success": insights.get("success", True),
@@ -117,7 +123,7 @@ async def get_ai_session_insights(session_id: UUID, query: Optional[str] = None)
 
 
 @router.get("/patients/{patient_id}/risk-assessment")
-async def get_ai_risk_assessment(patient_id: UUID):
+async def get_ai_risk_assessment(patient_id: UUID, request: Request):
     """
     Get AI-powered risk assessment for a patient
 
@@ -128,14 +134,12 @@ async def get_ai_risk_assessment(patient_id: UUID):
     - Actionable recommendations
     """
     # Verify patient exists
-    result = supabase.table("patients").select("*").eq("patient_id", str(patient_id)).execute()
-
-    if not result.data:
+    patient = cached_row(supabase, "patients", patient_id)
+    if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    patient = result.data[0]
-
-    assessment = await get_patient_risk_assessment(patient_id)
+    async with ADMISSION.admit(doctor_key(request), INTERACTIVE):
+        assessment = await get_patient_risk_assessment(patient_id)
 
     return {
         "success": assessment.get("success", True),
@@ -190,10 +194,7 @@ def get_sessions(patient_id: UUID):
         .order("session_date", desc=True)
         .execute()
     )
-    if not result.data:
-        return []
-
-    return [SessionResponse(**row) for row in result.data]
+    return trusted_response(result.data or [], SessionResponse)
 
 # ------------------------------
 # Analyze session (Dedalus + vector embeddings)
@@ -246,14 +247,14 @@ def stats_overview():
 @router.get("/patients", response_model=List[PatientResponse])
 def list_patients():
     result = supabase.table("patients").select("*").order("created_at", desc=True).execute()
-    return result.data
+    return trusted_response(result.data, PatientResponse)
 
 @router.get("/patients/{patient_id}", response_model=PatientResponse)
 def get_patient(patient_id: UUID):
-    result = supabase.table("patients").select("*").eq("patient_id", str(patient_id)).execute()
-    if not result.data:
+    patient = cached_row(supabase, "patients", patient_id)
+    if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return result.data[0]
+    return patient
 
 @router.post("/patients", response_model=PatientResponse)
 def create_patient(payload: PatientCreate):
@@ -265,6 +266,7 @@ def create_patient(payload: PatientCreate):
 @router.put("/patients/{patient_id}", response_model=PatientResponse)
 def update_patient(patient_id: UUID, payload: PatientCreate):
     result = supabase.table("patients").update(payload.dict()).eq("patient_id", str(patient_id)).execute()
+    invalidate("patients", patient_id)
     if not result.data:
         raise HTTPException(status_code=404, detail="Patient not found")
     return result.data[0]
@@ -272,6 +274,8 @@ def update_patient(patient_id: UUID, payload: PatientCreate):
 @router.delete("/patients/{patient_id}")
 def delete_patient(patient_id: UUID):
     supabase.table("patients").delete().eq("patient_id", str(patient_id)).execute()
+    invalidate("patients", patient_id)
+    MEMORY_INDEX.invalidate(str(patient_id))
     return {"status": "deleted"}
 
 # ------------------------------
@@ -279,21 +283,27 @@ def delete_patient(patient_id: UUID):
 # ------------------------------
 
 @router.get("/sessions", response_model=List[SessionResponse])
-def list_sessions():
+def list_sessions(if_none_match: Optional[str] = Header(default=None)):
+    etag = make_etag("sessions", table_version(supabase, "sessions"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     result = supabase.table("sessions").select("*").order("created_at", desc=True).execute()
-    return result.data
+    return with_etag(trusted_response(result.data, SessionResponse), etag)
 
 @router.get("/sessions/{session_id}", response_model=SessionResponse)
 def get_session(session_id: UUID):
-    result = supabase.table("sessions").select("*").eq("session_id", str(session_id)).execute()
-    if not result.data:
+    session = cached_row(supabase, "sessions", session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return result.data[0]
+    return session
 
 @router.get("/patients/{patient_id}/sessions", response_model=List[SessionResponse])
-def list_sessions_for_patient(patient_id: UUID):
+def list_sessions_for_patient(patient_id: UUID, if_none_match: Optional[str] = Header(default=None)):
+    etag = make_etag("patient_sessions", patient_id, table_version(supabase, "sessions", {"patient_id": patient_id}))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     result = supabase.table("sessions").select("*").eq("patient_id", str(patient_id)).order("created_at", desc=True).execute()
-    return result.data
+    return with_etag(trusted_response(result.data, SessionResponse), etag)
 
 @router.post("/sessions", response_model=SessionResponse)
 def create_session(payload: SessionCreate):
@@ -308,6 +318,7 @@ def create_session(payload: SessionCreate):
 @router.put("/sessions/{session_id}", response_model=SessionResponse)
 def update_session(session_id: UUID, payload: SessionCreate):
     result = supabase.table("sessions").update(payload.dict()).eq("session_id", str(session_id)).execute()
+    invalidate("sessions", session_id)
     if not result.data:
         raise HTTPException(status_code=404, detail="Session not found")
     return result.data[0]
@@ -315,6 +326,7 @@ def update_session(session_id: UUID, payload: SessionCreate):
 @router.delete("/sessions/{session_id}")
 def delete_session(session_id: UUID):
     supabase.table("sessions").delete().eq("session_id", str(session_id)).execute()
+    invalidate("sessions", session_id)
     return {"status": "deleted"}
 
 # ------------------------------
@@ -322,21 +334,28 @@ def delete_session(session_id: UUID):
 # ------------------------------
 
 @router.get("/memories", response_model=List[MemoryResponse])
-def list_memories():
-    result = supabase.table("memories").select("*").order("created_at", desc=True).execute()
-    return result.data
+def list_memories(embedding_format: EmbeddingFormat = Query("base64"), if_none_match: Optional[str] = Header(default=None)):
+    etag = make_etag("memories", embedding_format, table_version(supabase, "memories"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    result = supabase.table("memories").select(memory_columns(embedding_format)).order("created_at", desc=True).execute()
+    return with_etag(trusted_response(format_memory_rows(result.data, embedding_format), MemoryResponse), etag)
 
 @router.get("/memories/{memory_id}", response_model=MemoryResponse)
-def get_memory(memory_id: UUID):
-    result = supabase.table("memories").select("*").eq("memory_id", str(memory_id)).execute()
-    if not result.data:
+def get_memory(memory_id: UUID, embedding_format: EmbeddingFormat = Query("base64")):
+    memory = cached_row(supabase, "memories", memory_id)
+    if memory is None:
         raise HTTPException(status_code=404, detail="Memory not found")
-    return result.data[0]
+    # Formatting rewrites the row in place; the cached row is shared
+    return format_memory_embedding(dict(memory), embedding_format)
 
 @router.get("/patients/{patient_id}/memories", response_model=List[MemoryResponse])
-def list_memories_for_patient(patient_id: UUID):
-    result = supabase.table("memories").select("*").eq("patient_id", str(patient_id)).order("created_at", desc=True).execute()
-    return result.data
+def list_memories_for_patient(patient_id: UUID, embedding_format: EmbeddingFormat = Query("base64"), if_none_match: Optional[str] = Header(default=None)):
+    etag = make_etag("patient_memories", patient_id, embedding_format, table_version(supabase, "memories", {"patient_id": patient_id}))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    result = supabase.table("memories").select(memory_columns(embedding_format)).eq("patient_id", str(patient_id)).order("created_at", desc=True).execute()
+    return with_etag(trusted_response(format_memory_rows(result.data, embedding_format), MemoryResponse), etag)
 
 @router.post("/memories", response_model=MemoryResponse)
 def create_memory(payload: MemoryCreate):
@@ -348,27 +367,78 @@ def create_memory(payload: MemoryCreate):
 @router.put("/memories/{memory_id}", response_model=MemoryResponse)
 def update_memory(memory_id: UUID, payload: MemoryCreate):
     result = supabase.table("memories").update(payload.dict()).eq("memory_id", str(memory_id)).execute()
+    invalidate("memories", memory_id)
     if not result.data:
         raise HTTPException(status_code=404, detail="Memory not found")
+    MEMORY_INDEX.invalidate(result.data[0].get("patient_id"))
     return result.data[0]
 
 @router.delete("/memories/{memory_id}")
 def delete_memory(memory_id: UUID):
     supabase.table("memories").delete().eq("memory_id", str(memory_id)).execute()
+    invalidate("memories", memory_id)
+    MEMORY_INDEX.remove(str(memory_id))
     return {"status": "deleted"}
 
 # ------------------------------
 # Analytics (Frontend)
 # ------------------------------
 
+ANALYTICS_SESSION_COLUMNS = "session_date,overall_score,exercise_type,notable_events,updated_at"
+
+
+def _session_series(patient_id: UUID) -> dict:
+    """Score history and summary of a patient's sessions (cached per version of those sessions)"""
+    sessions = (
+        supabase.table("sessions")
+        .select(ANALYTICS_SESSION_COLUMNS)
+        .eq("patient_id", str(patient_id))
+        .order("session_date", desc=True)
+        .execute()
+    ).data or []
+    scored = [s for s in sessions if s.get("overall_score") is not None]
+    versions = [s["updated_at"] for s in sessions if s.get("updated_at")]
+    return {
+        "recent": sessions[:5],
+        "overall": sum([s["overall_score"] or 0 for s in sessions]) / len(sessions or [1]),
+        "updated_at": max(versions) if versions else None,
+        "timestamps": [s["session_date"] for s in scored],
+        "scores": [s["overall_score"] for s in scored],
+        "pyramid": SeriesPyramid([to_epoch(s["session_date"]) for s in scored], [s["overall_score"] for s in scored]),
+    }
+
+
 @router.get("/patients/{patient_id}/analytics", response_model=PatientData)
-def get_patient_analytics(patient_id: UUID):
-    patient = supabase.table("patients").select("*").eq("patient_id", str(patient_id)).execute()
-    sessions = supabase.table("sessions").select("*").eq("patient_id", str(patient_id)).order("session_date", desc=True).execute()
+def get_patient_analytics(
+    patient_id: UUID,
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample each series to at most this many points (LTTB)"),
+    start: Optional[datetime] = Query(None, description="Only points at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only points at or before this time"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # Analytics are derived from the patient row and their sessions only
+    sessions_version = table_version(supabase, "sessions", {"patient_id": patient_id})
+    etag = make_etag(
+        "analytics", patient_id,
+        table_version(supabase, "patients", {"patient_id": patient_id}),
+        sessions_version,
+        max_points, start, end,
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
+    patient = supabase.table("patients").select("*").eq("patient_id", str(patient_id)).execute()
     if not patient.data:
         raise HTTPException(status_code=404, detail="Patient not found")
 
+    # Built once per version of the sessions, so the cost below does not grow with history
+    series = SERIES_CACHE.get_or_build(str(patient_id), sessions_version, lambda: _session_series(patient_id))
+    positions = series["pyramid"].query(
+        max_points,
+        to_epoch(start) if start is not None else None,
+        to_epoch(end) if end is not None else None,
+    )
+
     # Placeholder logic for now
     brain_regions = BrainRegionScores(
         hippocampus=82.5,
@@ -380,7 +450,10 @@ def get_patient_analytics(patient_id: UUID):
     )
 
     memory_metrics = MemoryMetrics(
-        shortTermRecall=[TimeSeriesDataPoint(timestamp=s["session_date"], score=s["overall_score"]) for s in sessions.data],
+        # Newest first
+        shortTermRecall=[
+            TimeSeriesDataPoint(timestamp=series["timestamps"][i], score=series["scores"][i]) for i in positions[::-1]
+        ],
         longTermRecall=[],
         semanticMemory=[],
         episodicMemory=[],
@@ -394,16 +467,20 @@ def get_patient_analytics(patient_id: UUID):
             exerciseType=s["exercise_type"],
             notableEvents=s.get("notable_events", [])
         )
-        for s in sessions.data[:5]
+        for s in series["recent"]
     ]
 
-    return PatientData(
+    # Newest row version rather than "now", so identical data gives an identical body for the ETag
+    versions = [v for v in (patient.data[0].get("updated_at"), series["updated_at"]) if v]
+
+    analytics = PatientData(
         patientId=patient_id,
         patientName=patient.data[0]["name"],
-        lastUpdated=datetime.utcnow(),
+        lastUpdated=max(versions) if versions else datetime.utcnow(),
         brainRegions=brain_regions,
         memoryMetrics=memory_metrics,
         recentSessions=recent_sessions,
-        overallCognitiveScore=sum([s["overall_score"] or 0 for s in sessions.data]) / len(sessions.data or [1]),
+        overallCognitiveScore=series["overall"],
         memoryRetentionRate=0.87
     )
+    return with_etag(FastJSONResponse(analytics.model_dump(mode="json")), etag)
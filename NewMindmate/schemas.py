@@ -1,8 +1,12 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 from datetime import datetime, date
 from uuid import UUID
 
+# How memory embeddings are returned: base64 little-endian float32/float16,
+# a JSON list of floats, or omitted entirely
+EmbeddingFormat = Literal["base64", "base64_f16", "json", "none"]
+
 # ------------------------------
 # Cognitive Test Result
 # ------------------------------
@@ -28,7 +32,33 @@ class MemoryResponse(MemoryCreate):
     memory_id: UUID
     patient_id: UUID
     created_at: datetime
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Union[str, List[float]]] = None
+    embedding_encoding: Optional[str] = None
+
+class MemorySearchRequest(BaseModel):
+    """Hybrid memory search: words, meaning (embedding), or both"""
+    query: Optional[str] = None
+    # base64 little-endian float32 or a list of floats
+    query_embedding: Optional[Union[str, List[float]]] = None
+    patient_id: Optional[UUID] = None
+    emotional_tone: Optional[str] = None
+    min_significance: Optional[int] = None
+    limit: int = Field(10, ge=1, le=100)
+
+class MemorySearchResult(BaseModel):
+    memory_id: UUID
+    patient_id: UUID
+    title: str
+    description: Optional[str] = None
+    dateapprox: Optional[date] = None
+    location: Optional[str] = None
+    emotional_tone: Optional[str] = None
+    tags: Optional[List[str]] = []
+    significance_level: Optional[int] = 1
+    created_at: Optional[datetime] = None
+    text_rank: Optional[int] = None
+    vector_rank: Optional[int] = None
+    score: float
 
 # ------------------------------
 # Session
@@ -128,3 +158,78 @@ class DoctorRecordCreate(BaseModel):
 class DoctorRecordResponse(DoctorRecordCreate):
     record_id: UUID
     created_at: datetime
+
+# ------------------------------
+# Patient Detail
+# ------------------------------
+class PatientSessionSummary(BaseModel):
+    """Session columns shown on the patient page (no transcript)"""
+    session_id: UUID
+    session_date: Optional[datetime] = None
+    exercise_type: Optional[str] = None
+    overall_score: Optional[float] = None
+    notable_events: Optional[List[str]] = []
+    created_at: Optional[datetime] = None
+
+class PatientMemorySummary(BaseModel):
+    """Memory columns shown on the patient page (no embedding)"""
+    memory_id: UUID
+    title: str
+    description: Optional[str] = None
+    dateapprox: Optional[date] = None
+    emotional_tone: Optional[str] = None
+    tags: Optional[List[str]] = []
+    significance_level: Optional[int] = 1
+    created_at: Optional[datetime] = None
+
+class PatientDetailResponse(PatientResponse):
+    recent_sessions: List[PatientSessionSummary] = []
+    top_memories: List[PatientMemorySummary] = []
+    doctor_records: List[DoctorRecordResponse] = []
+
+# ------------------------------
+# Batch Reads
+# ------------------------------
+class BatchGetRequest(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=500)
+
+class PatientBatchResponse(BaseModel):
+    """Found patients in request order, plus the IDs that do not exist"""
+    patients: List[PatientResponse]
+    missing: List[UUID] = []
+
+class SessionBatchResponse(BaseModel):
+    """Found sessions in request order, plus the IDs that do not exist"""
+    sessions: List[SessionResponse]
+    missing: List[UUID] = []
+
+class PatientSessionsBatchRequest(BaseModel):
+    patient_ids: List[UUID] = Field(..., min_length=1, max_length=200)
+    limit_per_patient: int = Field(20, ge=1, le=200)
+
+class PatientSessions(BaseModel):
+    patient_id: UUID
+    sessions: List[SessionResponse]
+
+class PatientSessionsBatchResponse(BaseModel):
+    """Most recent sessions per patient, in request order"""
+    results: List[PatientSessions]
+
+# ------------------------------
+# Beyond Presence Calls
+# ------------------------------
+class CallMessagesBatchRequest(BaseModel):
+    call_ids: List[str] = Field(..., min_length=1, max_length=200)
+
+class CallMessagesBatchResponse(BaseModel):
+    calls: Dict[str, List[Dict[str, Any]]]
+    errors: Dict[str, str] = {}
+
+class CallIngestItem(BaseModel):
+    call_id: str
+    patient_id: UUID
+    started_at: Optional[datetime] = None
+
+class CallIngestRequest(BaseModel):
+    """Completed calls to turn into analyzed sessions (webhook payload)"""
+    calls: List[CallIngestItem] = Field(..., min_length=1, max_length=500)
@@ -0,0 +1,247 @@
+"""
+Admission
+Per-doctor rate limits and priority scheduling for Cognitive API calls.
+
+Each doctor (X-Doctor-Id header, else the client address) gets a token
+bucket per priority class, so batch-clicking "analyze" spends the bulk
+budget without touching the budget for interactive queries. Over budget,
+the request is rejected with 429 and a Retry-After of when the next token
+arrives.
+
+Admitted calls then take one of ADMISSION_MAX_CONCURRENT upstream slots.
+Waiters are served in priority order, interactive first, and
+ADMISSION_RESERVED_INTERACTIVE slots are never given to bulk work, so a
+doctor's query does not sit behind a row of two-minute analyses. Running
+calls are never cancelled; pre-emption happens at the queue.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from NewMindmate.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS
+
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+DOCTOR_HEADER = "X-Doctor-Id"
+
+# (tokens per second, burst) per priority class
+BUDGETS = {
+    INTERACTIVE: (
+        float(os.getenv("ADMISSION_INTERACTIVE_RATE", "0.5")),
+        float(os.getenv("ADMISSION_INTERACTIVE_BURST", "10")),
+    ),
+    BULK: (
+        float(os.getenv("ADMISSION_BULK_RATE", "0.1")),
+        float(os.getenv("ADMISSION_BULK_BURST", "20")),
+    ),
+}
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_RESERVED_INTERACTIVE = int(os.getenv("ADMISSION_RESERVED_INTERACTIVE", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# Buckets kept before idle (full) ones are dropped
+MAX_TRACKED_BUCKETS = 10000
+
+
+class AdmissionRejected(HTTPException):
+    """429 (over budget) or 503 (upstream saturated) with a Retry-After header"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens if available
+
+        Returns:
+            0.0 if admitted, otherwise seconds until enough tokens accumulate
+        """
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class PriorityLimiter:
+    """Concurrency limit whose waiters are served lowest priority value first"""
+
+    def __init__(self, max_concurrent: int, reserved_interactive: int = 0):
+        self.max_concurrent = max_concurrent
+        self.reserved_interactive = min(reserved_interactive, max_concurrent - 1)
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def queue_depth(self, priority: int) -> int:
+        return self._depth.get(priority, 0)
+
+    def _has_room(self, priority: int) -> bool:
+        limit = self.max_concurrent if priority == INTERACTIVE else self.max_concurrent - self.reserved_interactive
+        return self.in_flight < limit
+
+    def _grant(self) -> None:
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    async def acquire(self, priority: int, timeout: Optional[float] = None) -> None:
+        """Wait for a slot; raises asyncio.TimeoutError after `timeout` seconds"""
+        ahead = self._waiters and self._waiters[0][0] <= priority
+        if not ahead and self._has_room(priority):
+            self._grant()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._set_depth(priority, 1)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: pass the slot on
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._set_depth(priority, -1)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._has_room(priority):
+                return
+            heapq.heappop(self._waiters)
+            self._grant()
+            future.set_result(None)
+
+    def _set_depth(self, priority: int, delta: int) -> None:
+        self._depth[priority] += delta
+        ADMISSION_QUEUE_DEPTH.set(self._depth[priority], PRIORITY_NAMES[priority])
+
+    @asynccontextmanager
+    async def slot(self, priority: int, timeout: Optional[float] = None):
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class AdmissionController:
+    """Per-doctor token buckets in front of a shared PriorityLimiter"""
+
+    def __init__(
+        self,
+        budgets: Dict[int, Tuple[float, float]] = BUDGETS,
+        limiter: Optional[PriorityLimiter] = None,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.budgets = budgets
+        self.limiter = limiter or PriorityLimiter(ADMISSION_MAX_CONCURRENT, ADMISSION_RESERVED_INTERACTIVE)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+
+    def _bucket(self, key: str, priority: int) -> TokenBucket:
+        bucket = self._buckets.get((key, priority))
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.full}
+            rate, burst = self.budgets[priority]
+            bucket = self._buckets[(key, priority)] = TokenBucket(rate, burst, self.clock)
+        return bucket
+
+    def check(self, key: str, priority: int, cost: float = 1.0) -> None:
+        """
+        Charge a doctor's budget, raising AdmissionRejected when it cannot be admitted
+
+        Args:
+            key: Doctor / tenant identifier (see doctor_key)
+            priority: INTERACTIVE or BULK
+            cost: Tokens to take
+        """
+        name = PRIORITY_NAMES[priority]
+        if self.limiter.queue_depth(priority) >= self.max_queue:
+            ADMISSION_REJECTIONS.inc(name, "queue_full")
+            raise AdmissionRejected(503, "Too many AI requests queued, try again shortly", 1)
+        wait = self._bucket(key, priority).take(cost)
+        if wait:
+            ADMISSION_REJECTIONS.inc(name, "rate_limited")
+            raise AdmissionRejected(429, f"Rate limit exceeded for {name} AI requests", wait)
+
+    def slot(self, priority: int):
+        """Upstream slot without charging a budget (work admitted earlier, e.g. background analyses)"""
+        return self.limiter.slot(priority)
+
+    @asynccontextmanager
+    async def admit(self, key: str, priority: int, cost: float = 1.0):
+        """Charge the budget, then hold an upstream slot for the body of the block"""
+        self.check(key, priority, cost)
+        try:
+            await self.limiter.acquire(priority, self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTIONS.inc(PRIORITY_NAMES[priority], "queue_timeout")
+            raise AdmissionRejected(503, "AI service busy, try again shortly", self.queue_timeout / 2)
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+
+def doctor_key(request: Request) -> str:
+    """Budget key for a request: the X-Doctor-Id header, else the client address"""
+    doctor_id = request.headers.get(DOCTOR_HEADER)
+    if doctor_id:
+        return f"doctor:{doctor_id}"
+    return f"client:{request.client.host if request.client else 'unknown'}"
+
+
+ADMISSION = AdmissionController()
@@ -0,0 +1,139 @@
+"""
+Analysis Cache
+Content-addressed, idempotent cache for Cognitive API session analyses.
+
+Results are keyed by a SHA-256 over the transcript, the patient profile fields
+the analysis depends on, and ANALYSIS_VERSION (bump it when the Cognitive API
+prompt or model changes). Lookups go to a bounded in-process LRU first, then to
+the analysis_cache table (db/migrations/003_analysis_cache.sql). Concurrent
+requests for the same key await a single in-flight analysis.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from NewMindmate.services.metrics import CACHE_REQUESTS
+
+
+ANALYSIS_VERSION = os.getenv("ANALYSIS_VERSION", "1")
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "256"))
+
+# Patient fields that feed the analysis prompt (see analyze_session_with_ai)
+PROFILE_FIELDS = ("name", "dob", "diagnosis", "interests")
+
+
+def analysis_key(transcript: Optional[str], patient_data: Dict, version: str = ANALYSIS_VERSION) -> str:
+    """Stable content hash for an analysis request"""
+    material = {
+        "transcript": transcript or "",
+        "profile": {field: patient_data.get(field) for field in PROFILE_FIELDS},
+        "version": version,
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """LRU of analysis results backed by an optional Supabase table, with in-flight coalescing"""
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES, table: Optional[str] = "analysis_cache"):
+        self.max_entries = max_entries
+        self.table = table
+        self._results: "OrderedDict[str, Dict]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._results
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._in_flight
+
+    def _remember(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def get(self, key: str, supabase=None) -> Optional[Dict]:
+        """Cached result from memory, falling back to the persistent table"""
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+        if supabase is None or self.table is None:
+            return None
+        try:
+            rows = supabase.table(self.table).select("result").eq("content_hash", key).execute().data
+        except Exception as e:
+            print(f"⚠️  Analysis cache lookup failed: {e}")
+            return None
+        if rows and isinstance(rows, list) and rows[0].get("result") is not None:
+            self._remember(key, rows[0]["result"])
+            return rows[0]["result"]
+        return None
+
+    def put(self, key: str, result: Dict, supabase=None) -> None:
+        self._remember(key, result)
+        if supabase is None or self.table is None:
+            return
+        try:
+            supabase.table(self.table).upsert({
+                "content_hash": key,
+                "analysis_version": ANALYSIS_VERSION,
+                "result": result,
+            }).execute()
+        except Exception as e:
+            print(f"⚠️  Failed to persist analysis cache entry: {e}")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict]],
+        supabase=None,
+        force: bool = False,
+    ) -> Dict:
+        """
+        Return the cached result for key, or run compute() once for all concurrent callers
+
+        Args:
+            key: Content hash from analysis_key()
+            compute: Coroutine factory performing the analysis
+            supabase: Client for the persistent table (optional)
+            force: Skip cached results and re-run (still joins an in-flight run)
+
+        Returns:
+            The analysis result
+        """
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            CACHE_REQUESTS.inc("analysis", "coalesced")
+            return await asyncio.shield(pending)
+
+        if not force:
+            cached = self.get(key, supabase)
+            if cached is not None:
+                CACHE_REQUESTS.inc("analysis", "hit")
+                return cached
+
+        CACHE_REQUESTS.inc("analysis", "miss")
+
+        async def run() -> Dict:
+            result = await compute()
+            self.put(key, result, supabase)
+            return result
+
+        # A task, so waiters still get the result if the first caller is cancelled
+        task = asyncio.ensure_future(run())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._in_flight.pop(key, None) if self._in_flight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+
+ANALYSIS_CACHE = AnalysisCache()
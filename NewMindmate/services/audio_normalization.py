@@ -0,0 +1,171 @@
+"""
+Audio Normalization
+Compact speech renditions of uploaded audio.
+
+Session audio is speech, so a mono 16 kHz rendition carries everything
+playback and transcription need. With ffmpeg on PATH any supported upload is
+downmixed, resampled and encoded as Opus (~24 kbit/s); without it, WAV
+uploads are downmixed and resampled with NumPy and written as 16-bit PCM WAV.
+Other formats are left alone when no encoder is available.
+
+Work runs on a small thread pool (AUDIO_NORMALIZE_WORKERS) after the original
+upload has been stored, so uploads never wait for it.
+"""
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import subprocess
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Optional
+
+from NewMindmate.services.metrics import AUDIO_NORMALIZE_DURATION, AUDIO_NORMALIZED_BYTES
+from NewMindmate.services.startup import lazy_import
+
+np = lazy_import("numpy")
+
+
+TARGET_SAMPLE_RATE = 16000
+OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+AUDIO_NORMALIZE_WORKERS = int(os.getenv("AUDIO_NORMALIZE_WORKERS", "2"))
+AUDIO_NORMALIZE_DEFAULT = os.getenv("AUDIO_NORMALIZATION", "off").lower() in ("1", "on", "true")
+
+FFMPEG = shutil.which("ffmpeg")
+
+AUDIO_POOL = ThreadPoolExecutor(max_workers=AUDIO_NORMALIZE_WORKERS, thread_name_prefix="audio-normalize")
+
+
+@dataclass
+class NormalizedAudio:
+    content: bytes
+    extension: str
+    content_type: str
+    original_bytes: int
+    duration_seconds: Optional[float]
+    elapsed_seconds: float
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - len(self.content)
+
+    @property
+    def ratio(self) -> float:
+        return self.original_bytes / max(len(self.content), 1)
+
+
+def compact_path(original_path: str, extension: str) -> str:
+    """Storage path of the compact rendition next to the original"""
+    path = PurePosixPath(original_path)
+    return str(path.with_name(f"{path.stem}.16k{extension}"))
+
+
+# ------------------------------
+# ffmpeg path
+# ------------------------------
+def _encode_with_ffmpeg(content: bytes) -> bytes:
+    result = subprocess.run(
+        [
+            FFMPEG, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+            "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+            "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip",
+            "-f", "ogg", "pipe:1",
+        ],
+        input=content,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+# ------------------------------
+# PCM WAV fallback
+# ------------------------------
+def _read_wav(content: bytes):
+    """(float32 samples shaped (frames, channels) in [-1, 1], sample rate)"""
+    with wave.open(io.BytesIO(content)) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        bytes3 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = bytes3[:, 0] | (bytes3[:, 1] << 8) | (bytes3[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / (1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def _lowpass_taps(cutoff: float, taps: int = 63) -> np.ndarray:
+    """Hamming-windowed sinc low-pass; cutoff as a fraction of the input sample rate"""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+def resample(mono: np.ndarray, rate: int, target: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Band-limit then linearly interpolate a mono signal to the target rate"""
+    if rate == target or mono.size == 0:
+        return mono
+    if target < rate:
+        # Keep content below ~90% of the new Nyquist frequency
+        mono = np.convolve(mono, _lowpass_taps(0.45 * target / rate), mode="same")
+    positions = np.arange(int(mono.size * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(mono.size), mono).astype(np.float32)
+
+
+def normalize_wav(content: bytes, target: int = TARGET_SAMPLE_RATE) -> bytes:
+    """Mono, target-rate, 16-bit PCM WAV from any PCM WAV"""
+    samples, rate = _read_wav(content)
+    mono = resample(samples.mean(axis=1), rate, target)
+    pcm = np.clip(np.round(mono * 32767), -32768, 32767).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(target)
+        wav.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def normalize_audio(content: bytes, extension: str) -> Optional[NormalizedAudio]:
+    """
+    Compact rendition of an audio file, or None if it cannot be produced
+    (no encoder for this format) or would not be smaller
+
+    Args:
+        content: Original file bytes
+        extension: Original extension, e.g. ".wav"
+
+    Returns:
+        NormalizedAudio with the encoded bytes and size/time figures
+    """
+    start = time.perf_counter()
+    if FFMPEG:
+        encoded, out_ext, out_type = _encode_with_ffmpeg(content), ".ogg", "audio/ogg"
+    elif extension == ".wav":
+        encoded, out_ext, out_type = normalize_wav(content), ".wav", "audio/wav"
+    else:
+        return None
+    elapsed = time.perf_counter() - start
+    AUDIO_NORMALIZE_DURATION.observe(elapsed, "ffmpeg" if FFMPEG else "numpy")
+
+    if len(encoded) >= len(content):
+        return None
+    AUDIO_NORMALIZED_BYTES.inc("original", amount=len(content))
+    AUDIO_NORMALIZED_BYTES.inc("compact", amount=len(encoded))
+    duration = None
+    if out_ext == ".wav":
+        with wave.open(io.BytesIO(encoded)) as wav:
+            duration = wav.getnframes() / wav.getframerate()
+    return NormalizedAudio(encoded, out_ext, out_type, len(content), duration, elapsed)
@@ -0,0 +1,312 @@
+"""
+Audio Playback
+Range-aware streaming of session recordings from storage.
+
+Recordings are read through short-lived signed URLs, so the audio bucket can
+be private. Signed URLs are cached until AUDIO_SIGNED_URL_MARGIN seconds
+before they expire. Range requests are forwarded to storage and the bytes are
+streamed through in STREAM_CHUNK_SIZE pieces, never buffered whole.
+
+Recordings requested AUDIO_CACHE_MIN_REQUESTS times (scrubbing issues many
+range requests) are downloaded once, after the response, into a bounded LRU
+on local disk (AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES); later seeks are served
+from that file without a round trip to storage.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from NewMindmate.services.metrics import AUDIO_PLAYBACK_BYTES, CACHE_REQUESTS, track_upstream
+
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mindmate-audio"))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 512MB
+AUDIO_CACHE_MIN_REQUESTS = int(os.getenv("AUDIO_CACHE_MIN_REQUESTS", "2"))
+AUDIO_SIGNED_URL_TTL = int(os.getenv("AUDIO_SIGNED_URL_TTL", "3600"))
+AUDIO_SIGNED_URL_MARGIN = int(os.getenv("AUDIO_SIGNED_URL_MARGIN", "60"))
+AUDIO_STORAGE_TIMEOUT = httpx.Timeout(float(os.getenv("AUDIO_STORAGE_TIMEOUT", "30")), connect=5.0)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class RangeNotSatisfiable(Exception):
+    """Range header that lies entirely outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) byte range for a single-range Range header
+
+    Returns None when the whole file should be sent (no header, or a form we
+    do not serve, such as multiple ranges). Raises RangeNotSatisfiable when
+    the range starts past the end of the file.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, end
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled client for storage downloads (created on first use, per event loop)"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client_loop = loop
+        _client = httpx.AsyncClient(timeout=AUDIO_STORAGE_TIMEOUT, follow_redirects=True)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ------------------------------
+# Signed URLs
+# ------------------------------
+class SignedUrlCache:
+    """Signed download URLs, reused until shortly before they expire"""
+
+    def __init__(
+        self,
+        ttl: int = AUDIO_SIGNED_URL_TTL,
+        margin: int = AUDIO_SIGNED_URL_MARGIN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.margin = margin
+        self.clock = clock
+        self._urls: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, bucket: str, path: str) -> Optional[str]:
+        with self._lock:
+            entry = self._urls.get((bucket, path))
+            if entry is None:
+                return None
+            url, refresh_at = entry
+            if self.clock() >= refresh_at:
+                del self._urls[(bucket, path)]
+                return None
+            return url
+
+    def get(self, supabase, bucket: str, path: str) -> str:
+        """
+        Signed URL for an object, signing a new one when none is cached
+
+        Args:
+            supabase: Supabase client
+            bucket: Storage bucket name
+            path: Object path inside the bucket
+
+        Returns:
+            Absolute signed URL
+        """
+        url = self.peek(bucket, path)
+        if url is not None:
+            CACHE_REQUESTS.inc("audio_signed_url", "hit")
+            return url
+        CACHE_REQUESTS.inc("audio_signed_url", "miss")
+        signed_at = self.clock()
+        result = supabase.storage.from_(bucket).create_signed_url(path, self.ttl)
+        url = (result.get("signedURL") or result.get("signedUrl")) if isinstance(result, dict) else None
+        if not url:
+            raise FileNotFoundError(path)
+        if url.startswith("/"):
+            url = f"{os.getenv('SUPABASE_URL', '').rstrip('/')}/storage/v1{url}"
+        with self._lock:
+            self._urls[(bucket, path)] = (url, signed_at + self.ttl - self.margin)
+        return url
+
+    def invalidate(self, bucket: str, path: str) -> None:
+        with self._lock:
+            self._urls.pop((bucket, path), None)
+
+
+# ------------------------------
+# Local disk cache
+# ------------------------------
+class AudioDiskCache:
+    """Bounded LRU of whole recordings on local disk"""
+
+    def __init__(
+        self,
+        directory: str = AUDIO_CACHE_DIR,
+        max_bytes: int = AUDIO_CACHE_MAX_BYTES,
+        min_requests: int = AUDIO_CACHE_MIN_REQUESTS,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # One recording may take at most a quarter of the cache
+        self.max_file_bytes = max_bytes // 4
+        self.min_requests = min_requests
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._requests: "OrderedDict[str, int]" = OrderedDict()
+        self._filling = set()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    def _file(self, key: str) -> Path:
+        return self.directory / hashlib.sha256(key.encode()).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def open(self, key: str) -> Optional[Tuple[BinaryIO, int]]:
+        """Open handle and size of a cached recording, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                count = self._requests.pop(key, 0) + 1
+                self._requests[key] = count
+                while len(self._requests) > 4096:
+                    self._requests.popitem(last=False)
+                CACHE_REQUESTS.inc("audio_disk", "miss")
+                return None
+            self._entries.move_to_end(key)
+            size = self._entries[key]
+        try:
+            # An open handle stays readable even if the file is evicted meanwhile
+            handle = open(self._file(key), "rb")
+        except FileNotFoundError:
+            self._forget(key)
+            CACHE_REQUESTS.inc("audio_disk", "miss")
+            return None
+        CACHE_REQUESTS.inc("audio_disk", "hit")
+        return handle, size
+
+    def should_fill(self, key: str) -> bool:
+        """Whether a recording is hot enough to download and not already on its way"""
+        with self._lock:
+            if key in self._entries or key in self._filling:
+                return False
+            if self._requests.get(key, 0) < self.min_requests:
+                return False
+            self._filling.add(key)
+            return True
+
+    async def fill(self, url: str, key: str) -> bool:
+        """Download a whole recording into the cache; returns True if admitted"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f".{hashlib.sha256(key.encode()).hexdigest()}.{os.getpid()}.part"
+        size = 0
+        try:
+            async with get_client().stream("GET", url) as response:
+                if response.status_code != 200:
+                    return False
+                declared = int(response.headers.get("content-length") or 0)
+                if declared > self.max_file_bytes:
+                    return False
+                with open(tmp, "wb") as out:
+                    async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_file_bytes:
+                            return False
+                        out.write(chunk)
+            self._admit(key, tmp, size)
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            print(f"⚠️  Audio cache fill failed for {key}: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._filling.discard(key)
+            tmp.unlink(missing_ok=True)
+
+    def _admit(self, key: str, tmp: Path, size: int) -> None:
+        os.replace(tmp, self._file(key))
+        evicted = []
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._requests.pop(key, None)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._file(old_key).unlink(missing_ok=True)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._requests.clear()
+            self.total_bytes = 0
+        for key in keys:
+            self._file(key).unlink(missing_ok=True)
+
+
+def iter_file(handle: BinaryIO, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Bytes start..end (inclusive) of an open file, in chunks; closes the handle"""
+    try:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            AUDIO_PLAYBACK_BYTES.inc("disk", amount=len(chunk))
+            yield chunk
+    finally:
+        handle.close()
+
+
+async def iter_upstream(response: httpx.Response) -> AsyncIterator[bytes]:
+    """Stream a storage response through in chunks; closes it when done"""
+    try:
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            AUDIO_PLAYBACK_BYTES.inc("storage", amount=len(chunk))
+            yield chunk
+    finally:
+        await response.aclose()
+
+
+async def open_upstream(url: str, range_header: Optional[str]) -> httpx.Response:
+    """Start a (ranged) download from storage; the caller must close the response"""
+    client = get_client()
+    headers = {"Range": range_header} if range_header else {}
+    with track_upstream("supabase_storage", "/object/download") as call:
+        response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+        if response.status_code >= 400 and response.status_code != 416:
+            call.failed = True
+    return response
+
+
+SIGNED_URLS = SignedUrlCache()
+AUDIO_DISK_CACHE = AudioDiskCache()
@@ -0,0 +1,242 @@
+"""
+Beyond Presence Client
+Async, pooled access to Beyond Presence call messages.
+
+One shared httpx.AsyncClient keeps connections to the API alive with explicit
+timeouts. Message listings are followed page by page (iter_call_message_pages)
+and, once a call has ended, its transcript is immutable and kept in a bounded
+in-process LRU. fetch_many_call_messages fans out over many call IDs with
+bounded parallelism. Every request is a GET, so all of them use adaptive
+timeouts and are hedged (services/upstream.py).
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from NewMindmate.services import upstream
+from NewMindmate.services.metrics import CACHE_REQUESTS
+
+
+# Point BEY_BASE_URL at the local stand-in (beyond_presence_standin.py) for development
+BEYOND_PRESENCE_BASE_URL = os.getenv("BEY_BASE_URL", "https://api.beyondpresence.ai/v1")
+
+BEY_TIMEOUT = httpx.Timeout(float(os.getenv("BEY_TIMEOUT", "15")), connect=5.0)
+BEY_MAX_CONNECTIONS = int(os.getenv("BEY_MAX_CONNECTIONS", "20"))
+BEY_BATCH_CONCURRENCY = int(os.getenv("BEY_BATCH_CONCURRENCY", "8"))
+BEY_MESSAGE_CACHE_SIZE = int(os.getenv("BEY_MESSAGE_CACHE_SIZE", "1024"))
+MAX_PAGES = 100
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class BeyondPresenceError(Exception):
+    """Upstream failure with the HTTP status the API should answer with"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled client (created on first use, per event loop)"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            base_url=BEYOND_PRESENCE_BASE_URL,
+            timeout=BEY_TIMEOUT,
+            limits=httpx.Limits(max_connections=BEY_MAX_CONNECTIONS, max_keepalive_connections=BEY_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class _MessageCache:
+    """LRU of transcripts for calls that have ended, keyed by (api key, call id)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[Dict]]:
+        with self._lock:
+            messages = self._entries.get(key)
+            if messages is not None:
+                self._entries.move_to_end(key)
+            return messages
+
+    def put(self, key: Tuple[str, str], messages: List[Dict]) -> None:
+        with self._lock:
+            self._entries[key] = messages
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+MESSAGE_CACHE = _MessageCache(BEY_MESSAGE_CACHE_SIZE)
+
+
+def _headers(api_key: str, extra: Dict[str, str]) -> Dict[str, str]:
+    return {"x-api-key": api_key, "Accept": "application/json", **extra}
+
+
+async def _get(path: str, endpoint: str, api_key: str, params: Optional[Dict] = None):
+    policy = upstream.adaptive_timeout(
+        "beyond_presence", endpoint, default=BEY_TIMEOUT.read, floor=1.0, ceiling=2 * BEY_TIMEOUT.read
+    )
+    client = get_client()
+
+    def send(timeout: float, headers: Dict[str, str]):
+        return client.get(
+            path,
+            headers=_headers(api_key, headers),
+            params=params,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, BEY_TIMEOUT.connect)),
+        )
+
+    try:
+        response = await upstream.request(policy, send, hedge=True)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        raise BeyondPresenceError(e.response.status_code, str(e))
+    except httpx.TimeoutException as e:
+        raise BeyondPresenceError(504, f"Beyond Presence timeout: {e!r}")
+    except httpx.RequestError as e:
+        raise BeyondPresenceError(500, f"Request failed: {e}")
+
+
+def _split_page(body) -> Tuple[List[Dict], Optional[str]]:
+    """Messages and next cursor from a plain list or a {data, next_cursor} page"""
+    if isinstance(body, list):
+        return body, None
+    items = body.get("data", body.get("messages", []))
+    return items, body.get("next_cursor")
+
+
+async def iter_call_message_pages(call_id: str, api_key: str) -> AsyncIterator[List[Dict]]:
+    """Yield a call's messages one upstream page at a time"""
+    cursor = None
+    for _ in range(MAX_PAGES):
+        params = {"cursor": cursor} if cursor else None
+        body = await _get(f"/calls/{call_id}/messages", "/calls/{call_id}/messages", api_key, params)
+        items, cursor = _split_page(body)
+        yield items
+        if not cursor:
+            return
+
+
+def is_call_ended(call: Dict) -> bool:
+    return bool(call.get("ended_at")) or call.get("status") in ("ended", "completed")
+
+
+async def call_has_ended(call_id: str, api_key: str) -> bool:
+    """Whether a call is over, i.e. its messages can no longer change"""
+    try:
+        call = await _get(f"/calls/{call_id}", "/calls/{call_id}", api_key)
+    except BeyondPresenceError:
+        return False
+    return is_call_ended(call)
+
+
+def _started_before(call: Dict, started_after: Optional[str]) -> bool:
+    return bool(started_after and call.get("started_at") and call["started_at"] < started_after)
+
+
+async def list_calls(api_key: str, started_after: Optional[str] = None) -> List[Dict]:
+    """
+    Calls newest first, following list pagination
+
+    Args:
+        api_key: Beyond Presence API key
+        started_after: Only calls started at or after this ISO timestamp.
+            Calls are listed newest first, so paging stops at the first page
+            that reaches older calls.
+    """
+    calls, cursor = [], None
+    for _ in range(MAX_PAGES):
+        params = {"cursor": cursor} if cursor else None
+        items, cursor = _split_page(await _get("/calls", "/calls", api_key, params))
+        newer = [call for call in items if not _started_before(call, started_after)]
+        calls.extend(newer)
+        if not cursor or len(newer) < len(items):
+            break
+    return calls
+
+
+async def list_completed_calls(api_key: str, started_after: Optional[str] = None) -> List[Dict]:
+    """Calls that have ended (see list_calls)"""
+    return [call for call in await list_calls(api_key, started_after) if is_call_ended(call)]
+
+
+async def get_call_messages(call_id: str, api_key: str) -> List[Dict]:
+    """
+    All messages of a call, served from cache once the call has ended
+
+    Args:
+        call_id: Beyond Presence call ID
+        api_key: Beyond Presence API key
+
+    Returns:
+        List of messages with fields: message, sent_at, sender
+    """
+    # Keyed by API key too, so one tenant never reads another's cached call
+    cache_key = (api_key, call_id)
+    cached = MESSAGE_CACHE.get(cache_key)
+    if cached is not None:
+        CACHE_REQUESTS.inc("call_messages", "hit")
+        return cached
+    CACHE_REQUESTS.inc("call_messages", "miss")
+
+    # Status before pages: a call that ends while its pages are read must not
+    # have that partial read cached as its final transcript
+    ended = await call_has_ended(call_id, api_key)
+    messages = []
+    async for page in iter_call_message_pages(call_id, api_key):
+        messages.extend(page)
+    if ended:
+        MESSAGE_CACHE.put(cache_key, messages)
+    return messages
+
+
+async def fetch_many_call_messages(
+    call_ids: Sequence[str],
+    api_key: str,
+    concurrency: int = BEY_BATCH_CONCURRENCY,
+) -> Tuple[Dict[str, List[Dict]], Dict[str, str]]:
+    """
+    Fetch messages for many calls with at most `concurrency` in flight
+
+    Returns:
+        (messages by call_id, error detail by call_id)
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    results: Dict[str, List[Dict]] = {}
+    errors: Dict[str, str] = {}
+
+    async def fetch(call_id: str) -> None:
+        async with semaphore:
+            try:
+                results[call_id] = await get_call_messages(call_id, api_key)
+            except BeyondPresenceError as e:
+                errors[call_id] = str(e)
+
+    await asyncio.gather(*(fetch(call_id) for call_id in dict.fromkeys(call_ids)))
+    return results, errors
@@ -0,0 +1,309 @@
+"""
+Call Ingestion
+Turns completed Beyond Presence calls into analyzed sessions.
+
+For a batch of (call_id, patient_id) pairs the pipeline fetches transcripts
+concurrently, bulk-inserts one session per call and runs the Cognitive API
+analysis with bounded concurrency. Progress is checkpointed per call in the
+call_ingestions table (db/migrations/004_call_ingestions.sql):
+
+    pending          session_id reserved, session not yet confirmed
+    session_created  session row exists, analysis not yet successful
+    analyzed         done; never reprocessed
+    failed           analysis failed; retried with backoff
+
+Session IDs are generated before the insert and checkpointed first, so a
+restart between the two steps finds the session instead of creating a copy.
+A call seen for the first time is claimed with an insert that keeps any
+existing checkpoint; when the webhook and the poller race for a call, only
+the run whose session_id was stored processes it.
+
+A failed transcript fetch (pending) or analysis (failed) is retried after
+INGEST_RETRY_BASE_SECONDS, doubling per attempt, and given up after
+INGEST_MAX_ATTEMPTS (db/migrations/009_call_ingestion_retries.sql), so a
+call that always fails does not cost a Cognitive API call on every poll.
+The poller only lists new calls, so each poll also re-ingests up to
+INGEST_RETRY_BATCH checkpoints that are due (due_calls). An analysis already
+running elsewhere leaves its checkpoint at session_created for a later poll.
+
+Supabase calls are synchronous and run on the threadpool.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Sequence
+from uuid import UUID, uuid4
+
+from fastapi.concurrency import run_in_threadpool
+
+from NewMindmate.services import beyond_presence_client as beyond_presence
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+INGEST_ANALYSIS_CONCURRENCY = int(os.getenv("INGEST_ANALYSIS_CONCURRENCY", "4"))
+CALL_INGEST_POLL_SECONDS = float(os.getenv("CALL_INGEST_POLL_SECONDS", "0"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "60"))
+INGEST_RETRY_BATCH = int(os.getenv("INGEST_RETRY_BATCH", "100"))
+
+CHECKPOINT_TABLE = "call_ingestions"
+SENDER_LABELS = {"user": "Patient", "ai": "Assistant"}
+RETRYABLE_STATUSES = ("pending", "session_created", "failed")
+
+
+def format_message(message: Dict) -> Optional[str]:
+    """One 'Speaker: text' transcript line, or None for an empty message"""
+    text = (message.get("message") or "").strip()
+    if not text:
+        return None
+    sender = message.get("sender") or "unknown"
+    return f"{SENDER_LABELS.get(sender, sender.title())}: {text}"
+
+
+def assemble_transcript(messages: Sequence[Dict]) -> str:
+    """Render call messages as a 'Speaker: text' transcript in send order"""
+    ordered = sorted(messages, key=lambda m: m.get("sent_at") or "")
+    return "\n".join(line for line in map(format_message, ordered) if line)
+
+
+def call_patient_id(call: Dict) -> Optional[str]:
+    """Patient a polled call belongs to, from its metadata"""
+    return (call.get("metadata") or {}).get("patient_id") or call.get("patient_id")
+
+
+def with_failure(row: Dict, error: str, now: Optional[datetime] = None) -> Dict:
+    """Checkpoint after one more failed attempt: next retry doubles the wait, none past the cap"""
+    attempts = (row.get("attempts") or 0) + 1
+    retry_at = None
+    if attempts < INGEST_MAX_ATTEMPTS:
+        delay = timedelta(seconds=INGEST_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        retry_at = ((now or datetime.now(timezone.utc)) + delay).isoformat()
+    return dict(row, error=error, attempts=attempts, next_retry_at=retry_at)
+
+
+def is_due(row: Dict, now: Optional[datetime] = None) -> bool:
+    """Whether a failed checkpoint may be retried now"""
+    if (row.get("attempts") or 0) >= INGEST_MAX_ATTEMPTS:
+        return False
+    retry_at = row.get("next_retry_at")
+    if not retry_at:
+        return True
+    return datetime.fromisoformat(retry_at.replace("Z", "+00:00")) <= (now or datetime.now(timezone.utc))
+
+
+class CallIngestionPipeline:
+    """
+    Fetch -> bulk-create sessions -> analyze, resumable via per-call checkpoints
+
+    `analyze` returns True when the session is analyzed, False when the
+    analysis failed and None when another analysis of it is still running.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        api_key: str,
+        analyze: Callable[[UUID], Awaitable[Optional[bool]]],
+        concurrency: int = INGEST_ANALYSIS_CONCURRENCY,
+    ):
+        self.supabase = supabase
+        self.api_key = api_key
+        self.analyze = analyze
+        self.concurrency = max(concurrency, 1)
+
+    # ------------------------------
+    # Checkpoints
+    # ------------------------------
+    def _load_checkpoints(self, call_ids: List[str]) -> Dict[str, Dict]:
+        if not call_ids:
+            return {}
+        result = self.supabase.table(CHECKPOINT_TABLE).select("*").in_("call_id", call_ids).execute()
+        return {row["call_id"]: row for row in (result.data or [])}
+
+    def _claim_checkpoints(self, rows: List[Dict]) -> List[Dict]:
+        """Insert checkpoints for new calls; returns those this run owns"""
+        if not rows:
+            return []
+        now = datetime.now(timezone.utc).isoformat()
+        self.supabase.table(CHECKPOINT_TABLE).upsert(
+            [dict(row, updated_at=now) for row in rows], on_conflict="call_id", ignore_duplicates=True
+        ).execute()
+        # A concurrent run may have claimed a call first with its own session_id
+        stored = self._load_checkpoints([row["call_id"] for row in rows])
+        return [row for row in rows if str(stored.get(row["call_id"], row)["session_id"]) == row["session_id"]]
+
+    def _save_checkpoints(self, rows: List[Dict]) -> None:
+        if not rows:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        self.supabase.table(CHECKPOINT_TABLE).upsert([dict(row, updated_at=now) for row in rows]).execute()
+
+    def _load_due_checkpoints(self, limit: int) -> List[Dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        result = (
+            self.supabase.table(CHECKPOINT_TABLE)
+            .select("*")
+            .in_("status", list(RETRYABLE_STATUSES))
+            .lt("attempts", INGEST_MAX_ATTEMPTS)
+            .or_(f"next_retry_at.is.null,next_retry_at.lte.{now}")
+            .order("updated_at")
+            .limit(limit)
+            .execute()
+        )
+        return result.data or []
+
+    async def due_calls(self, limit: int = INGEST_RETRY_BATCH) -> List[Dict]:
+        """Calls with an unfinished checkpoint that may be retried now, oldest first"""
+        rows = await run_in_threadpool(self._load_due_checkpoints, limit)
+        return [{"call_id": row["call_id"], "patient_id": row["patient_id"]} for row in rows]
+
+    def _existing_session_ids(self, session_ids: List[str]) -> set:
+        existing = self.supabase.table("sessions").select("session_id").in_("session_id", session_ids).execute()
+        return {str(row["session_id"]) for row in (existing.data or [])}
+
+    def _insert_sessions(self, sessions: List[Dict]) -> None:
+        # Idempotent: a concurrent run resuming the same pending checkpoint inserts the same session_id
+        self.supabase.table("sessions").upsert(sessions, on_conflict="session_id", ignore_duplicates=True).execute()
+
+    # ------------------------------
+    # Stages
+    # ------------------------------
+    async def _create_sessions(self, pending: List[Dict], calls: Dict[str, Dict]) -> List[Dict]:
+        """Insert sessions for pending checkpoints; returns checkpoints now at session_created"""
+        existing_ids = await run_in_threadpool(self._existing_session_ids, [row["session_id"] for row in pending])
+
+        to_fetch = [row["call_id"] for row in pending if str(row["session_id"]) not in existing_ids]
+        messages, errors = await beyond_presence.fetch_many_call_messages(to_fetch, self.api_key)
+
+        sessions, created, failed = [], [], []
+        for row in pending:
+            call_id = row["call_id"]
+            if str(row["session_id"]) in existing_ids:
+                created.append(dict(row, status="session_created", error=None, attempts=0, next_retry_at=None))
+            elif call_id in messages:
+                call = calls.get(call_id, {})
+                sessions.append({
+                    "session_id": str(row["session_id"]),
+                    "patient_id": str(row["patient_id"]),
+                    "session_date": call.get("started_at") or datetime.now(timezone.utc).isoformat(),
+                    "exercise_type": "memory_recall",
+                    "transcript": assemble_transcript(messages[call_id]),
+                })
+                created.append(dict(row, status="session_created", error=None, attempts=0, next_retry_at=None))
+            else:
+                failed.append(with_failure(row, errors.get(call_id, "Transcript unavailable")))
+
+        if sessions:
+            await run_in_threadpool(self._insert_sessions, sessions)
+            print(f"📥 Created {len(sessions)} session(s) from calls")
+        await run_in_threadpool(self._save_checkpoints, created + failed)
+        return created
+
+    async def _analyze_all(self, rows: List[Dict]) -> Dict[str, int]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = {"analyzed": 0, "failed": 0, "in_progress": 0}
+
+        async def run(row: Dict) -> None:
+            async with semaphore:
+                try:
+                    ok = await self.analyze(UUID(str(row["session_id"])))
+                    error = None if ok else "Analysis failed"
+                except Exception as e:
+                    ok, error = False, str(e)
+            if ok is None:
+                # Analysis running elsewhere: stays session_created, picked up again by due_calls
+                counts["in_progress"] += 1
+                return
+            if ok:
+                checkpoint = dict(row, status="analyzed", error=None, attempts=0, next_retry_at=None)
+            else:
+                checkpoint = with_failure(dict(row, status="failed"), error)
+            counts[checkpoint["status"]] += 1
+            await run_in_threadpool(self._save_checkpoints, [checkpoint])
+
+        await asyncio.gather(*(run(row) for row in rows))
+        return counts
+
+    async def ingest(self, calls: Sequence[Dict]) -> Dict[str, int]:
+        """
+        Ingest completed calls; safe to re-run with overlapping call IDs
+
+        Args:
+            calls: Dicts with call_id, patient_id and optionally started_at
+
+        Returns:
+            Counts of skipped, created, analyzed and failed calls, and deferred
+            calls (failed before and not due for a retry, given up, or with an
+            analysis still in progress)
+        """
+        by_id = {str(call["call_id"]): call for call in calls if call.get("patient_id")}
+        checkpoints = await run_in_threadpool(self._load_checkpoints, list(by_id))
+
+        new = [
+            {"call_id": call_id, "patient_id": str(call["patient_id"]), "session_id": str(uuid4()), "status": "pending"}
+            for call_id, call in by_id.items()
+            if call_id not in checkpoints
+        ]
+        claimed = await run_in_threadpool(self._claim_checkpoints, new)
+
+        now = datetime.now(timezone.utc)
+        waiting = [row for row in checkpoints.values() if row["status"] in ("pending", "failed") and not is_due(row, now)]
+        pending = claimed + [row for row in checkpoints.values() if row["status"] == "pending" and is_due(row, now)]
+        created = await self._create_sessions(pending, by_id) if pending else []
+        retry = [
+            row for row in checkpoints.values()
+            if row["status"] == "session_created" or (row["status"] == "failed" and is_due(row, now))
+        ]
+        counts = await self._analyze_all(created + retry)
+
+        summary = {
+            # Calls another run claimed first count as skipped
+            "skipped": sum(1 for row in checkpoints.values() if row["status"] == "analyzed") + len(new) - len(claimed),
+            "created": len(created),
+            "analyzed": counts["analyzed"],
+            "failed": counts["failed"],
+            "deferred": len(waiting) + counts["in_progress"],
+        }
+        print(f"✅ Call ingestion: {summary}")
+        return summary
+
+
+def next_high_water_mark(calls: Sequence[Dict], previous: Optional[str] = None) -> Optional[str]:
+    """Where the next poll starts listing: the oldest call still running, else the newest call seen"""
+    running = [call["started_at"] for call in calls if call.get("started_at") and not beyond_presence.is_call_ended(call)]
+    if running:
+        return min(running)
+    started = [call["started_at"] for call in calls if call.get("started_at")]
+    return max(started + ([previous] if previous else []), default=None)
+
+
+async def poll_once(pipeline: CallIngestionPipeline, started_after: Optional[str] = None) -> Optional[str]:
+    """
+    One poll: ingest calls that ended since the mark plus checkpoints due for a retry
+
+    Returns the mark for the next poll.
+    """
+    calls = await beyond_presence.list_calls(pipeline.api_key, started_after)
+    # Listed calls come last so their started_at wins for calls also due for a retry
+    await pipeline.ingest(await pipeline.due_calls() + [
+        {"call_id": call["id"], "patient_id": call_patient_id(call), "started_at": call.get("started_at")}
+        for call in calls
+        if call.get("id") and call_patient_id(call) and beyond_presence.is_call_ended(call)
+    ])
+    return next_high_water_mark(calls, started_after)
+
+
+async def poll_completed_calls(pipeline: CallIngestionPipeline, interval: float = CALL_INGEST_POLL_SECONDS) -> None:
+    """Scheduler loop: ingest ended calls with a patient_id, every `interval` seconds"""
+    # Only calls started since the mark are listed, so each poll's work stays bounded
+    started_after = None
+    while True:
+        try:
+            started_after = await poll_once(pipeline, started_after)
+        except Exception as e:
+            print(f"⚠️  Call polling failed: {e}")
+        await asyncio.sleep(interval)
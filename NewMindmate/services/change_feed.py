@@ -0,0 +1,347 @@
+"""
+Change Feed
+Row changes to patients, sessions and memories, from whoever wrote them.
+
+Sources:
+  - listen_postgres(): LISTEN on the mindmate_changes channel that the
+    triggers of db/migrations/008_change_feed.sql notify (CHANGE_FEED_DSN,
+    a direct Postgres connection string, needs psycopg2).
+  - poll_changes(): local stand-in for when there is no direct database
+    connection. Polls each table's updated_at through the Supabase client
+    every CHANGE_FEED_POLL_SECONDS. It cannot tell inserts from updates, and
+    it only sees deletes as a drop in row count, reported table-wide.
+
+Every change goes through CHANGE_FEED to its listeners: invalidate_caches()
+drops the row from the entity cache and applies it to a loaded memory search
+index (one row reload, skipped for this process's own inserts), and
+DASHBOARDS pushes it to subscribed dashboard WebSockets. A change with no id
+is table-wide (TRUNCATE, unknown deletes, or changes missed while the
+listener was reconnecting); caches drop the whole table and dashboards are
+told to resync.
+"""
+import asyncio
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from NewMindmate.db.memory_index import MEMORY_INDEX
+from NewMindmate.db import supabase_client
+from NewMindmate.services import entity_cache
+from NewMindmate.services.downsampling import SERIES_CACHE
+from NewMindmate.services.conditional import VERSION_COLUMN, table_version
+from NewMindmate.services.metrics import CHANGE_FEED_EVENTS, DASHBOARD_RESYNCS, DASHBOARD_SUBSCRIBERS
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - only needed with CHANGE_FEED_DSN
+    psycopg2 = None
+
+
+CHANGE_FEED_CHANNEL = "mindmate_changes"
+CHANGE_FEED_DSN = os.getenv("CHANGE_FEED_DSN")
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0"))
+CHANGE_FEED_RECONNECT_SECONDS = 5.0
+DASHBOARD_QUEUE_SIZE = int(os.getenv("DASHBOARD_QUEUE_SIZE", "256"))
+
+# Tables with change notifications -> primary key column
+CHANGE_TABLES = dict(entity_cache.ENTITY_KEYS)
+
+POLL_BATCH = 500
+
+
+@dataclass
+class RowChange:
+    """One changed row (or, with id None, an unknown set of rows of a table)"""
+    table: str
+    op: str
+    id: Optional[str] = None
+    patient_id: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_payload(cls, payload: str) -> Optional["RowChange"]:
+        """Parse a NOTIFY payload; None if it is not a change to a watched table"""
+        try:
+            data = json.loads(payload)
+            change = cls(table=data["table"], op=data["op"], id=data.get("id"),
+                         patient_id=data.get("patient_id"), updated_at=data.get("updated_at"))
+        except (ValueError, KeyError, TypeError):
+            return None
+        if change.table not in CHANGE_TABLES:
+            return None
+        if change.table == "patients" and change.patient_id is None:
+            change.patient_id = change.id
+        return change
+
+    def message(self) -> Dict:
+        return {"type": "change", **asdict(self)}
+
+
+class ChangeFeed:
+    """Fans each change out to every listener; a failing listener does not stop the others"""
+
+    def __init__(self):
+        self._listeners: List[Callable[[RowChange], None]] = []
+
+    def subscribe(self, listener: Callable[[RowChange], None]) -> None:
+        self._listeners.append(listener)
+
+    def publish(self, change: RowChange) -> None:
+        CHANGE_FEED_EVENTS.inc(change.table, change.op)
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception as e:
+                print(f"⚠️  Change listener failed for {change.table} {change.op}: {e}")
+
+    def resync(self, reason: str) -> None:
+        """Publish a table-wide change for every table (changes may have been missed)"""
+        for table in CHANGE_TABLES:
+            self.publish(RowChange(table=table, op=reason))
+
+
+# ------------------------------
+# Listeners
+# ------------------------------
+def invalidate_caches(change: RowChange) -> None:
+    """Drop what the change made stale from the entity cache, memory search index and score series"""
+    if change.id is None:
+        entity_cache.ENTITY_CACHE.invalidate_table(change.table)
+        if change.table in ("memories", "patients"):
+            MEMORY_INDEX.invalidate()
+        if change.table in ("sessions", "patients"):
+            SERIES_CACHE.invalidate()
+        return
+
+    entity_cache.invalidate(change.table, change.id)
+    if change.table == "sessions" and change.patient_id is not None:
+        # Rebuilt on the next read anyway (keyed by version); this only frees the memory early
+        SERIES_CACHE.invalidate(change.patient_id)
+    if change.table == "memories":
+        if change.op == "DELETE":
+            MEMORY_INDEX.remove(change.id, change.patient_id)
+        elif change.patient_id is not None:
+            index = MEMORY_INDEX.get(change.patient_id)
+            # Inserts made by store_memory_embedding in this process are already in the index
+            if index is not None and not (change.op == "INSERT" and change.id in index):
+                MEMORY_INDEX.refresh(supabase_client.get_supabase(), change.patient_id, change.id)
+    elif change.table == "patients" and change.op == "DELETE":
+        MEMORY_INDEX.invalidate(change.id)
+
+
+class DashboardSubscription:
+    """Queue of change messages for one dashboard WebSocket"""
+
+    def __init__(self, patient_ids: Optional[Set[str]], queue_size: int):
+        self.patient_ids = patient_ids
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def wants(self, change: RowChange) -> bool:
+        return self.patient_ids is None or change.id is None or change.patient_id in self.patient_ids
+
+    def offer(self, message: Dict) -> None:
+        """Enqueue on the subscription's loop; a client too far behind gets one resync instead"""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            DASHBOARD_RESYNCS.inc()
+            message = {"type": "resync", "table": None}
+        self.queue.put_nowait(message)
+
+    async def get(self) -> Dict:
+        return await self.queue.get()
+
+
+class DashboardHub:
+    """Routes changes to the dashboard WebSockets subscribed to the patient they belong to"""
+
+    def __init__(self, queue_size: int = DASHBOARD_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions: Set[DashboardSubscription] = set()
+        self._lock = threading.Lock()
+
+    def connect(self, patient_ids: Optional[Set[str]] = None) -> DashboardSubscription:
+        subscription = DashboardSubscription(patient_ids, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            DASHBOARD_SUBSCRIBERS.set(len(self._subscriptions))
+        return subscription
+
+    def disconnect(self, subscription: DashboardSubscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            DASHBOARD_SUBSCRIBERS.set(len(self._subscriptions))
+
+    def publish(self, change: RowChange) -> None:
+        """Safe to call from any thread"""
+        message = change.message() if change.id is not None else {"type": "resync", "table": change.table}
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.wants(change)]
+        for subscription in subscriptions:
+            if subscription.loop.is_closed():
+                continue
+            subscription.loop.call_soon_threadsafe(subscription.offer, message)
+
+
+# ------------------------------
+# Sources
+# ------------------------------
+def _connect_listener(dsn: str, channel: str):
+    connection = psycopg2.connect(dsn)
+    connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {channel};")
+    return connection
+
+
+async def listen_postgres(feed: ChangeFeed, dsn: str, channel: str = CHANGE_FEED_CHANNEL) -> None:
+    """LISTEN for change notifications, reconnecting (and resyncing) when the connection drops"""
+    if psycopg2 is None:
+        raise RuntimeError("CHANGE_FEED_DSN is set but psycopg2 is not installed")
+    loop = asyncio.get_running_loop()
+    connected_before = False
+    while True:
+        try:
+            connection = await run_in_threadpool(_connect_listener, dsn, channel)
+        except Exception as e:
+            print(f"⚠️  Change feed connection failed: {e}")
+            await asyncio.sleep(CHANGE_FEED_RECONNECT_SECONDS)
+            continue
+
+        print(f"✅ Listening for row changes on '{channel}'")
+        if connected_before:
+            # Notifications sent while disconnected are lost
+            feed.resync("RESYNC")
+        connected_before = True
+
+        readable = asyncio.Event()
+        loop.add_reader(connection.fileno(), readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                connection.poll()
+                while connection.notifies:
+                    change = RowChange.from_payload(connection.notifies.pop(0).payload)
+                    if change is not None:
+                        # Listeners may query the database (memory index refresh)
+                        await run_in_threadpool(feed.publish, change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Change feed connection lost: {e}")
+        finally:
+            loop.remove_reader(connection.fileno())
+            connection.close()
+        await asyncio.sleep(CHANGE_FEED_RECONNECT_SECONDS)
+
+
+class _TableCursor:
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.count = 0
+        # Last row seen, in (updated_at, primary key) order
+        self.latest: Optional[str] = None
+        self.last_id: Optional[str] = None
+
+
+def _next_page(supabase, table: str, columns: str, cursor: _TableCursor) -> List[Dict]:
+    """Up to POLL_BATCH rows after the cursor, in (updated_at, primary key) order"""
+    key = CHANGE_TABLES[table]
+    if cursor.latest is not None:
+        # The rest of the rows sharing the cursor's updated_at come first
+        same_time = (
+            supabase.table(table).select(columns)
+            .eq(VERSION_COLUMN, cursor.latest).gt(key, cursor.last_id)
+            .order(key).limit(POLL_BATCH).execute()
+        ).data or []
+        if same_time:
+            return same_time
+    query = supabase.table(table).select(columns)
+    if cursor.latest is not None:
+        query = query.gt(VERSION_COLUMN, cursor.latest)
+    return query.order(VERSION_COLUMN).order(key).limit(POLL_BATCH).execute().data or []
+
+
+def poll_table(supabase, table: str, cursor: _TableCursor) -> List[RowChange]:
+    """
+    Changes to one table since the last poll (stand-in for LISTEN)
+
+    Args:
+        supabase: Supabase client
+        table: One of CHANGE_TABLES
+        cursor: Position of the previous poll, advanced in place
+
+    Returns:
+        One UPDATE per row whose updated_at moved, plus a table-wide DELETE if
+        the row count dropped. The first poll only records the position.
+    """
+    version = table_version(supabase, table)
+    if version == cursor.version:
+        return []
+    count = int(version.partition(":")[0] or 0)
+    first_poll = cursor.version is None
+    cursor.version = version
+    key = CHANGE_TABLES[table]
+    changes: List[RowChange] = []
+
+    if first_poll:
+        newest = (
+            supabase.table(table).select(f"{key},{VERSION_COLUMN}")
+            .order(VERSION_COLUMN, desc=True).order(key, desc=True).limit(1).execute()
+        ).data
+        if newest:
+            cursor.latest, cursor.last_id = newest[0][VERSION_COLUMN], str(newest[0][key])
+        cursor.count = count
+        return changes
+    if count < cursor.count:
+        changes.append(RowChange(table=table, op="DELETE"))
+    cursor.count = count
+
+    # Keyset pages: rows sharing a timestamp are never skipped at a page boundary
+    columns = f"{key},{VERSION_COLUMN}" + (",patient_id" if table != "patients" else "")
+    while True:
+        rows = _next_page(supabase, table, columns, cursor)
+        if not rows:
+            return changes
+        for row in rows:
+            row_id, updated_at = str(row[key]), row[VERSION_COLUMN]
+            cursor.latest, cursor.last_id = updated_at, row_id
+            patient_id = row_id if table == "patients" else row.get("patient_id")
+            changes.append(RowChange(table=table, op="UPDATE", id=row_id, patient_id=patient_id, updated_at=updated_at))
+
+
+async def poll_changes(feed: ChangeFeed, get_supabase: Callable, interval: float = CHANGE_FEED_POLL_SECONDS) -> None:
+    """Publish the changes poll_table finds in every watched table, every `interval` seconds"""
+    cursors = {table: _TableCursor() for table in CHANGE_TABLES}
+    print(f"🔁 Polling {', '.join(CHANGE_TABLES)} for changes every {interval:g}s")
+    while True:
+        for table, cursor in cursors.items():
+            try:
+                changes = await run_in_threadpool(poll_table, get_supabase(), table, cursor)
+            except Exception as e:
+                print(f"⚠️  Change poll of {table} failed: {e}")
+                continue
+            for change in changes:
+                await run_in_threadpool(feed.publish, change)
+        await asyncio.sleep(interval)
+
+
+def start_change_feed(feed: ChangeFeed, get_supabase: Callable) -> Optional[asyncio.Task]:
+    """Start the configured source: LISTEN with CHANGE_FEED_DSN, else polling if CHANGE_FEED_POLL_SECONDS > 0"""
+    if CHANGE_FEED_DSN:
+        return asyncio.create_task(listen_postgres(feed, CHANGE_FEED_DSN))
+    if CHANGE_FEED_POLL_SECONDS > 0:
+        return asyncio.create_task(poll_changes(feed, get_supabase, CHANGE_FEED_POLL_SECONDS))
+    return None
+
+
+CHANGE_FEED = ChangeFeed()
+DASHBOARDS = DashboardHub()
+CHANGE_FEED.subscribe(invalidate_caches)
+CHANGE_FEED.subscribe(DASHBOARDS.publish)
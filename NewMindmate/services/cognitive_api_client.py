@@ -7,11 +7,19 @@ from uuid import UUID
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from NewMindmate.services import upstream
+
 
 # Your deployed Cognitive API (use local for testing if Render is sleeping)
 # COGNITIVE_API_URL = "http://localhost:8000"  # Local for testing
 COGNITIVE_API_URL = "https://mindmate-cognitive-api.onrender.com"  # Production
 
+# Adaptive timeouts (services/upstream.py): default until enough calls were seen, then clamped
+ANALYZE_TIMEOUT = upstream.adaptive_timeout("cognitive_api", "/analyze/session", default=120.0, floor=30.0, ceiling=300.0)
+DASHBOARD_TIMEOUT = upstream.adaptive_timeout("cognitive_api", "/patient/dashboard", default=60.0, floor=5.0, ceiling=120.0)
+HEALTH_TIMEOUT = upstream.adaptive_timeout("cognitive_api", "/health", default=10.0, floor=1.0, ceiling=10.0)
+QUERY_TIMEOUT = upstream.adaptive_timeout("cognitive_api", "/doctor/query", default=30.0, floor=5.0, ceiling=60.0)
+
 
 async def analyze_session_with_ai(
     session_id: UUID,
@@ -58,10 +66,15 @@ async def analyze_session_with_ai(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{COGNITIVE_API_URL}/analyze/session",
-                json=payload
+        async with httpx.AsyncClient() as client:
+            response = await upstream.request(
+                ANALYZE_TIMEOUT,
+                lambda timeout, headers: client.post(
+                    f"{COGNITIVE_API_URL}/analyze/session",
+                    json=payload,
+                    headers=headers,
+                    timeout=timeout
+                )
             )
 
             if response.status_code != 200:
@@ -104,10 +117,17 @@ async def get_patient_dashboard(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{COGNITIVE_API_URL}/patient/dashboard",
-                json=payload
+        async with httpx.AsyncClient() as client:
+            # A read despite the POST, so safe to hedge
+            response = await upstream.request(
+                DASHBOARD_TIMEOUT,
+                lambda timeout, headers: client.post(
+                    f"{COGNITIVE_API_URL}/patient/dashboard",
+                    json=payload,
+                    headers=headers,
+                    timeout=timeout
+                ),
+                hedge=True
             )
 
             if response.status_code != 200:
@@ -125,8 +145,12 @@ async def get_patient_dashboard(
 async def health_check() -> Dict:
     """Check if Cognitive API is healthy"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{COGNITIVE_API_URL}/health")
+        async with httpx.AsyncClient() as client:
+            response = await upstream.request(
+                HEALTH_TIMEOUT,
+                lambda timeout, headers: client.get(f"{COGNITIVE_API_URL}/health", headers=headers, timeout=timeout),
+                hedge=True
+            )
             return response.json()
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
@@ -163,10 +187,16 @@ async def doctor_query(query: str, context: Optional[Dict] = None) -> Dict:
             "context": context or {}
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{COGNITIVE_API_URL}/doctor/query",
-                json=payload
+        async with httpx.AsyncClient() as client:
+            # Not hedged: the agent keeps conversation memory per query
+            response = await upstream.request(
+                QUERY_TIMEOUT,
+                lambda timeout, headers: client.post(
+                    f"{COGNITIVE_API_URL}/doctor/query",
+                    json=payload,
+                    headers=headers,
+                    timeout=timeout
+                )
             )
 
             if response.status_code != 200:
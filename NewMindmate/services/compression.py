@@ -0,0 +1,198 @@
+"""
+Compression
+Negotiated response compression.
+
+Responses of at least COMPRESSION_MIN_BYTES are compressed with the best
+coding the client accepts: zstd (if the zstandard package is installed),
+then br (if brotli is installed), then gzip. Levels favour speed: the
+payloads are repetitive JSON, so fast levels already get most of the ratio
+(see benchmarks/bench_compression.py). Bodies over COMPRESSION_THREADPOOL_BYTES
+are compressed on the threadpool so the event loop keeps serving.
+
+Only complete, single-message bodies are compressed. Streamed responses
+(audio playback, transcripts over WebSocket), partial content and bodies
+that are already encoded or not compressible (audio) pass through untouched.
+A strong ETag gets a "-<coding>" suffix so each encoding has its own tag;
+services/conditional.py ignores that suffix when matching If-None-Match, and
+a 304 gets the suffix the 200 for the same request would have carried.
+"""
+import gzip
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from NewMindmate.services.metrics import RESPONSE_COMPRESSION_BYTES
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_THREADPOOL_BYTES = int(os.getenv("COMPRESSION_THREADPOOL_BYTES", str(256 * 1024)))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/")
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def available_encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    """Content codings this process can produce, in server preference order"""
+    encoders = {}
+    if zstandard is not None:
+        # Compressor objects are not safe to share between threads
+        encoders["zstd"] = lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    encoders["gzip"] = _gzip
+    return encoders
+
+
+ENCODERS = available_encoders()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Coding -> q-value from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: Optional[str], encoders: Dict[str, Callable] = ENCODERS) -> Optional[str]:
+    """Best coding both sides support: highest client q-value, ties broken by server preference"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in encoders:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _tag_etag(headers: List[Tuple[bytes, bytes]], coding: str) -> None:
+    for i, (name, value) in enumerate(headers):
+        if name == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+            headers[i] = (name, value[:-1] + f'-{coding}"'.encode())
+
+
+def _tag_not_modified(headers: List[Tuple[bytes, bytes]], coding: str, if_none_match: bytes) -> None:
+    """
+    Give a 304 the ETag of the representation the client holds: the
+    "-<coding>" tag, unless it revalidates the untagged one (a body under
+    min_bytes is sent uncompressed)
+    """
+    etag = dict(headers).get(b"etag")
+    if etag is None:
+        return
+    held = {tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")}
+    if etag in held and etag[:-1] + f'-{coding}"'.encode() not in held:
+        return
+    _tag_etag(headers, coding)
+
+
+def _add_vary(headers: List[Tuple[bytes, bytes]]) -> None:
+    """Add Accept-Encoding to the Vary header, merging with one already set"""
+    for i, (name, value) in enumerate(headers):
+        if name == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[i] = (name, value + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing complete response bodies
+
+    Every response whose type it can compress, and every 304, carries
+    Vary: Accept-Encoding whether or not this one was compressed, so shared
+    caches never hand a stored encoding to a client that sent a different
+    Accept-Encoding.
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESSION_MIN_BYTES, encoders: Optional[Dict[str, Callable]] = None):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.encoders = ENCODERS if encoders is None else encoders
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope.get("headers") or [])
+        coding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"), self.encoders)
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                header_map = dict(headers)
+                content_type = header_map.get(b"content-type", b"").decode("latin-1")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES) and b"content-encoding" not in header_map
+                if message["status"] == 304 or compressible:
+                    _add_vary(headers)
+                if message["status"] == 304 and coding is not None:
+                    _tag_not_modified(headers, coding, request_headers.get(b"if-none-match", b""))
+                start_message = message = dict(message, headers=headers)
+                passthrough = coding is None or message["status"] in (204, 206, 304) or not compressible
+                if passthrough:
+                    await send(message)
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.min_bytes:
+                # Streamed or small: send as is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_THREADPOOL_BYTES:
+                encoded = await run_in_threadpool(self.encoders[coding], body)
+            else:
+                encoded = self.encoders[coding](body)
+            RESPONSE_COMPRESSION_BYTES.inc(coding, "original", amount=len(body))
+            RESPONSE_COMPRESSION_BYTES.inc(coding, "encoded", amount=len(encoded))
+            headers = [(k, v) for k, v in start_message.get("headers", []) if k != b"content-length"]
+            headers.append((b"content-encoding", coding.encode()))
+            headers.append((b"content-length", str(len(encoded)).encode()))
+            _tag_etag(headers, coding)
+            await send(dict(start_message, headers=headers))
+            await send({"type": "http.response.body", "body": encoded})
+
+        await self.app(scope, receive, send_wrapper)
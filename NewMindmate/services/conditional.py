@@ -0,0 +1,76 @@
+"""
+Conditional GET
+Strong ETags from row versions and If-None-Match handling.
+
+A collection's version is its row count plus its newest updated_at, read
+with one query that returns a single timestamp (table_version). Inserts and
+updates move updated_at (db/migrations/007_updated_at.sql), deletes change
+the count, so an unchanged version means unchanged rows. When the client's
+If-None-Match matches, the endpoint answers 304 before fetching or
+serializing the full rows. The negotiated media type is part of every tag,
+so JSON and MessagePack bodies of the same rows never share one.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from fastapi.responses import Response
+
+from NewMindmate.services.serialization import negotiated_media_type
+
+
+VERSION_COLUMN = "updated_at"
+
+# Revalidate on every use; the ETag makes that cheap
+CACHE_CONTROL = "private, no-cache"
+
+
+def table_version(supabase, table: str, filters: Optional[Dict[str, str]] = None) -> str:
+    """
+    Version of the rows of a table matching equality filters
+
+    Args:
+        supabase: Supabase client
+        table: Table name
+        filters: column -> value equality filters, e.g. {"patient_id": "..."}
+
+    Returns:
+        "<row count>:<newest updated_at>"
+    """
+    query = supabase.table(table).select(VERSION_COLUMN, count="exact")
+    for column, value in (filters or {}).items():
+        query = query.eq(column, str(value))
+    result = query.order(VERSION_COLUMN, desc=True).limit(1).execute()
+    latest = result.data[0][VERSION_COLUMN] if result.data else ""
+    return f"{result.count or 0}:{latest}"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the versions and parameters that determine a representation, and its media type"""
+    digest = hashlib.sha256("|".join(str(p) for p in (negotiated_media_type(), *parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 specifies for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return any(tag == etag or _without_coding(tag) == etag for tag in candidates)
+
+
+def _without_coding(tag: str) -> str:
+    """Drop the "-gzip"/"-br"/"-zstd" suffix CompressionMiddleware adds to compressed representations"""
+    head, sep, _ = tag.rpartition("-")
+    return f'{head}"' if sep and tag.endswith('"') else tag
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,204 @@
+"""
+Time series downsampling
+Largest-Triangle-Three-Buckets (LTTB) for the analytics score charts.
+
+A chart a few hundred pixels wide gains nothing from thousands of points, but
+plain decimation drops exactly the dips and spikes a clinician looks for. LTTB
+splits the series into max_points - 2 buckets and keeps, per bucket, the point
+forming the largest triangle with the point kept before it and the average of
+the next bucket, so peaks and troughs survive.
+
+Each patient's series is kept as a SeriesPyramid: the full series plus LTTB
+levels of 1/4, 1/16, ... of the points. A query starts from the coarsest level
+that still has max_points points in the requested time range, so it touches at
+most a few times max_points points however long the history is. Pyramids are
+built once per version of the patient's sessions (SERIES_CACHE) and evicted
+least-recently-used beyond SERIES_CACHE_MAX_PATIENTS.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from NewMindmate.services.metrics import CACHE_REQUESTS
+from NewMindmate.services.startup import lazy_import
+
+np = lazy_import("numpy")
+
+
+SERIES_CACHE_MAX_PATIENTS = int(os.getenv("SERIES_CACHE_MAX_PATIENTS", "512"))
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_POINTS = 64
+
+
+def to_epoch(value: Union[str, datetime]) -> float:
+    """Seconds since the epoch of an ISO timestamp or datetime (naive means UTC)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# ------------------------------
+# LTTB
+# ------------------------------
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points LTTB keeps
+
+    Bucket averages and the per-bucket triangle areas are computed with NumPy;
+    only the walk from bucket to bucket is a Python loop, since each choice
+    depends on the point kept in the bucket before.
+
+    Args:
+        x: Ascending x values (e.g. epoch seconds)
+        y: Values at x
+        n_out: Points to keep; the first and last point are always kept
+
+    Returns:
+        Ascending int array of n_out indices (all indices if n_out >= len(x))
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB always keeps the first and last point; n_out must be at least 3")
+
+    # n - 2 inner points into n_out - 2 buckets; bucket i is edges[i]:edges[i + 1]
+    edges = (np.arange(n_out - 1) * (n - 2) // (n_out - 2) + 1).astype(np.int64)
+    inner_x, inner_y = x[1:n - 1], y[1:n - 1]
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(inner_x, edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(inner_y, edges[:-1] - 1) / counts
+    # Third corner of each bucket's triangles: the next bucket's average (the last point for the last bucket)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# ------------------------------
+# Multi-resolution series
+# ------------------------------
+class SeriesPyramid:
+    """One series at decreasing resolutions, each level an index array into the full series"""
+
+    def __init__(self, x: Sequence[float], y: Sequence[float], factor: int = PYRAMID_FACTOR, min_points: int = PYRAMID_MIN_POINTS):
+        order = np.argsort(np.asarray(x, dtype=np.float64), kind="stable")
+        self.order = order  # position in the input of each sorted point
+        self.x = np.asarray(x, dtype=np.float64)[order]
+        self.y = np.asarray(y, dtype=np.float64)[order]
+        self.levels: List[np.ndarray] = [np.arange(len(self.x))]
+        while len(self.levels[-1]) // factor >= min_points:
+            finer = self.levels[-1]
+            self.levels.append(finer[lttb(self.x[finer], self.y[finer], len(finer) // factor)])
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def query(self, max_points: Optional[int] = None, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """
+        Input positions of the points to show, in ascending x
+
+        Args:
+            max_points: At most this many points (None: every point in range)
+            start: Smallest x to include
+            end: Largest x to include
+
+        Returns:
+            Int array of positions in the x / y the pyramid was built from
+        """
+        levels = self.levels if max_points is not None else self.levels[:1]
+        for level in reversed(levels):
+            level_x = self.x[level]
+            lo = int(np.searchsorted(level_x, start, side="left")) if start is not None else 0
+            hi = int(np.searchsorted(level_x, end, side="right")) if end is not None else len(level)
+            if max_points is None or hi - lo >= max_points or level is levels[0]:
+                break
+        points = level[lo:hi]
+        if max_points is not None and len(points) > max_points:
+            points = points[lttb(self.x[points], self.y[points], max_points)]
+        return self.order[points]
+
+
+def downsample_points(
+    points: List[Dict],
+    max_points: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    x_key: str = "timestamp",
+    y_key: str = "score",
+) -> List[Dict]:
+    """
+    Filter a list of {"timestamp", "score"} points to a time range and LTTB them to max_points
+
+    For one-off series (e.g. from the Cognitive API); keeps the input order.
+    """
+    if not points or (max_points is None and start is None and end is None):
+        return points
+    pyramid = SeriesPyramid([to_epoch(p[x_key]) for p in points], [p[y_key] or 0 for p in points], min_points=len(points) + 1)
+    keep = pyramid.query(
+        max_points,
+        to_epoch(start) if start is not None else None,
+        to_epoch(end) if end is not None else None,
+    )
+    return [points[i] for i in np.sort(keep)]
+
+
+# ------------------------------
+# Per-patient cache
+# ------------------------------
+class SeriesCache:
+    """Values built per key and data version (e.g. a patient and their sessions' table_version), LRU-bounded"""
+
+    def __init__(self, max_entries: int = SERIES_CACHE_MAX_PATIENTS, name: str = "series"):
+        self.max_entries = max_entries
+        self.name = name
+        self._entries: "OrderedDict[str, Tuple[str, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get_or_build(self, key: str, version: str, build: Callable[[], object]):
+        """Cached value for key if it was built at this version, else build() and keep it"""
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(self.name, "hit")
+                return entry[1]
+        CACHE_REQUESTS.inc(self.name, "miss")
+        value = build()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one key, or everything"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(key), None)
+
+
+SERIES_CACHE = SeriesCache()
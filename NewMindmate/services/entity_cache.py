@@ -0,0 +1,207 @@
+"""
+Entity Cache
+Read-through cache for single patient, session and memory rows.
+
+Lookups by primary key go to a bounded in-process LRU with a TTL, then to an
+optional shared Redis backend (ENTITY_CACHE_URL), then to Supabase. Handlers
+that write a row call invalidate() afterwards; a load that overlaps an
+invalidation in the same process is not cached, so a slow read cannot put
+back the old row (across workers, ENTITY_CACHE_TTL bounds that race).
+
+With a shared backend every gunicorn worker sees an invalidation on its next
+read of the backend; the local tier then only keeps rows for
+ENTITY_CACHE_LOCAL_TTL seconds, which bounds how long another worker can
+serve a row that changed. Misses are never cached (a row created right after
+a 404 must be visible). Hit ratio: mindmate_cache_requests_total with
+cache="entity_<table>" and result hit / shared_hit / miss.
+
+For local development, redis_standin.py speaks enough of the Redis protocol
+to act as the shared backend.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from NewMindmate.services.metrics import CACHE_REQUESTS
+from NewMindmate.services.serialization import dumps
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+
+ENTITY_CACHE_MAX_ENTRIES = int(os.getenv("ENTITY_CACHE_MAX_ENTRIES", "2048"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "60"))
+ENTITY_CACHE_LOCAL_TTL = float(os.getenv("ENTITY_CACHE_LOCAL_TTL", "2"))
+ENTITY_CACHE_URL = os.getenv("ENTITY_CACHE_URL")
+
+# Primary key column per cached table
+ENTITY_KEYS = {
+    "patients": "patient_id",
+    "sessions": "session_id",
+    "memories": "memory_id",
+}
+
+
+class RedisBackend:
+    """Shared tier on a Redis-compatible server; errors degrade to cache misses"""
+
+    def __init__(self, url: str, prefix: str = "mindmate:entity:"):
+        if redis is None:
+            raise RuntimeError("ENTITY_CACHE_URL is set but the redis package is not installed")
+        self.prefix = prefix
+        # RESP2 works with every server, including redis_standin.py
+        self.client = redis.Redis.from_url(url, protocol=2, socket_timeout=0.25, socket_connect_timeout=0.25)
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            print(f"⚠️  Entity cache backend read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, row: Dict, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, dumps(row), px=int(ttl * 1000))
+        except redis.RedisError as e:
+            print(f"⚠️  Entity cache backend write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except redis.RedisError as e:
+            print(f"⚠️  Entity cache backend delete failed: {e}")
+
+
+class EntityCache:
+    """LRU + TTL of rows keyed by (table, primary key), with an optional shared backend"""
+
+    def __init__(
+        self,
+        max_entries: int = ENTITY_CACHE_MAX_ENTRIES,
+        ttl: float = ENTITY_CACHE_TTL,
+        backend=None,
+        local_ttl: float = ENTITY_CACHE_LOCAL_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.local_ttl = min(ttl, local_ttl) if backend is not None else ttl
+        self.clock = clock
+        self._rows: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(table: str, entity_id) -> str:
+        return f"{table}:{entity_id}"
+
+    def __contains__(self, item: Tuple[str, object]) -> bool:
+        key = self._key(*item)
+        entry = self._rows.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def _remember(self, key: str, row: Dict) -> None:
+        with self._lock:
+            self._rows[key] = (self.clock() + self.local_ttl, row)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+
+    def get_or_load(self, table: str, entity_id, load: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Cached row, loading and caching it on a miss
+
+        Args:
+            table: Table name (labels the metrics)
+            entity_id: Primary key value
+            load: Returns the row from the database, or None if it does not exist
+
+        Returns:
+            The row (shared with other callers, do not mutate) or None
+        """
+        key = self._key(table, entity_id)
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._rows.move_to_end(key)
+                    CACHE_REQUESTS.inc(f"entity_{table}", "hit")
+                    return entry[1]
+                del self._rows[key]
+            generation = self._invalidations
+
+        if self.backend is not None:
+            row = self.backend.get(key)
+            if row is not None:
+                CACHE_REQUESTS.inc(f"entity_{table}", "shared_hit")
+                self._remember(key, row)
+                return row
+
+        CACHE_REQUESTS.inc(f"entity_{table}", "miss")
+        row = load()
+        if row is not None and generation == self._invalidations:
+            self._remember(key, row)
+            if self.backend is not None:
+                self.backend.set(key, row, self.ttl)
+        return row
+
+    def invalidate(self, table: str, entity_id) -> None:
+        """Drop a row after it was written or deleted"""
+        key = self._key(table, entity_id)
+        with self._lock:
+            self._invalidations += 1
+            self._rows.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def invalidate_table(self, table: str) -> None:
+        """
+        Drop every locally cached row of a table (changes whose rows are unknown)
+
+        Shared backend entries cannot be enumerated and expire with ENTITY_CACHE_TTL.
+        """
+        prefix = f"{table}:"
+        with self._lock:
+            self._invalidations += 1
+            for key in [k for k in self._rows if k.startswith(prefix)]:
+                del self._rows[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            self._rows.clear()
+
+
+def cached_row(supabase, table: str, entity_id) -> Optional[Dict]:
+    """
+    Row of patients / sessions / memories by primary key, through ENTITY_CACHE
+
+    Args:
+        supabase: Supabase client used on a miss
+        table: One of ENTITY_KEYS
+        entity_id: Primary key value
+
+    Returns:
+        The full row (select *) or None if it does not exist
+    """
+    def load() -> Optional[Dict]:
+        result = supabase.table(table).select("*").eq(ENTITY_KEYS[table], str(entity_id)).execute()
+        return result.data[0] if result.data else None
+
+    return ENTITY_CACHE.get_or_load(table, str(entity_id), load)
+
+
+def invalidate(table: str, entity_id) -> None:
+    """Invalidate a row in ENTITY_CACHE (no-op for None ids)"""
+    if entity_id is not None:
+        ENTITY_CACHE.invalidate(table, str(entity_id))
+
+
+ENTITY_CACHE = EntityCache(backend=RedisBackend(ENTITY_CACHE_URL) if ENTITY_CACHE_URL else None)
@@ -0,0 +1,550 @@
+"""
+Metrics
+Lightweight in-process metrics registry rendered in the Prometheus text format.
+
+Counters and histograms are keyed by a tuple of label values and guarded by a
+per-metric lock, so recording a sample is a dict lookup plus a bisect.
+"""
+import asyncio
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from NewMindmate.services import tracing
+
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in items
+        ]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[labels] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def sum(self, *labels: str) -> float:
+        entry = self._values.get(labels)
+        return entry[1] if entry else 0.0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items()]
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render_latest() -> str:
+    """Render every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+# ------------------------------
+# HTTP metrics
+# ------------------------------
+HTTP_REQUEST_DURATION = Histogram(
+    "mindmate_http_request_duration_seconds",
+    "Latency of HTTP requests by route template",
+    ("method", "route", "status"),
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "mindmate_http_response_bytes",
+    "Size of HTTP response bodies by route template",
+    ("method", "route"),
+    buckets=BYTES_BUCKETS,
+)
+HTTP_REQUEST_ERRORS = Counter(
+    "mindmate_http_request_errors_total",
+    "HTTP requests that raised or returned a 5xx status",
+    ("method", "route"),
+)
+RESPONSE_COMPRESSION_BYTES = Counter(
+    "mindmate_response_compression_bytes_total",
+    "Compressed response bodies by content coding and stage (original, encoded)",
+    ("encoding", "stage"),
+)
+
+# ------------------------------
+# Supabase metrics
+# ------------------------------
+SUPABASE_QUERY_DURATION = Histogram(
+    "mindmate_supabase_query_duration_seconds",
+    "Latency of Supabase .execute() calls by table and operation",
+    ("table", "operation"),
+)
+SUPABASE_QUERY_ROWS = Histogram(
+    "mindmate_supabase_query_rows",
+    "Rows returned by Supabase .execute() calls",
+    ("table", "operation"),
+    buckets=ROWS_BUCKETS,
+)
+SUPABASE_PAYLOAD_BYTES = Histogram(
+    "mindmate_supabase_payload_bytes",
+    "Bytes sent to and received from PostgREST by table",
+    ("table", "direction"),
+    buckets=BYTES_BUCKETS,
+)
+SUPABASE_QUERY_ERRORS = Counter(
+    "mindmate_supabase_query_errors_total",
+    "Supabase .execute() calls that raised",
+    ("table", "operation"),
+)
+
+# ------------------------------
+# Upstream service metrics (Cognitive API, Beyond Presence)
+# ------------------------------
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "mindmate_upstream_request_duration_seconds",
+    "Latency of outbound calls to upstream services",
+    ("service", "endpoint"),
+)
+UPSTREAM_RESPONSE_BYTES = Histogram(
+    "mindmate_upstream_response_bytes",
+    "Size of upstream response bodies",
+    ("service", "endpoint"),
+    buckets=BYTES_BUCKETS,
+)
+UPSTREAM_REQUEST_ERRORS = Counter(
+    "mindmate_upstream_request_errors_total",
+    "Upstream calls that raised or returned an error status",
+    ("service", "endpoint"),
+)
+UPSTREAM_TIMEOUT_SECONDS = Gauge(
+    "mindmate_upstream_timeout_seconds",
+    "Current adaptive timeout of upstream calls",
+    ("service", "endpoint"),
+)
+UPSTREAM_HEDGES = Counter(
+    "mindmate_upstream_hedges_total",
+    "Hedged second attempts sent after the first attempt passed the p95",
+    ("service", "endpoint"),
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "mindmate_upstream_hedge_wins_total",
+    "Hedged attempts that answered before the first attempt",
+    ("service", "endpoint"),
+)
+
+# ------------------------------
+# Cache metrics
+# ------------------------------
+CACHE_REQUESTS = Counter(
+    "mindmate_cache_requests_total",
+    "Cache lookups by cache and result (hit, miss, coalesced)",
+    ("cache", "result"),
+)
+
+# ------------------------------
+# Admission metrics
+# ------------------------------
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "mindmate_admission_queue_depth",
+    "AI requests waiting for an upstream slot, by priority (interactive, bulk)",
+    ("priority",),
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "mindmate_admission_in_flight",
+    "AI requests holding an upstream slot",
+)
+ADMISSION_REJECTIONS = Counter(
+    "mindmate_admission_rejections_total",
+    "AI requests turned away, by priority and reason (rate_limited, queue_full, queue_timeout)",
+    ("priority", "reason"),
+)
+
+# ------------------------------
+# Change feed metrics
+# ------------------------------
+CHANGE_FEED_EVENTS = Counter(
+    "mindmate_change_feed_events_total",
+    "Row changes received, by table and operation (INSERT, UPDATE, DELETE, TRUNCATE, RESYNC)",
+    ("table", "op"),
+)
+DASHBOARD_SUBSCRIBERS = Gauge(
+    "mindmate_dashboard_subscribers",
+    "Open dashboard change streams",
+)
+DASHBOARD_RESYNCS = Counter(
+    "mindmate_dashboard_resyncs_total",
+    "Dashboard streams that fell too far behind and were told to refetch",
+)
+
+# ------------------------------
+# Audio metrics
+# ------------------------------
+AUDIO_NORMALIZED_BYTES = Counter(
+    "mindmate_audio_normalized_bytes_total",
+    "Bytes of audio before and after normalization, by rendition (original, compact)",
+    ("rendition",),
+)
+AUDIO_PLAYBACK_BYTES = Counter(
+    "mindmate_audio_playback_bytes_total",
+    "Audio bytes streamed to clients, by source (disk, storage)",
+    ("source",),
+)
+AUDIO_NORMALIZE_DURATION = Histogram(
+    "mindmate_audio_normalize_duration_seconds",
+    "Time to downmix, resample and encode one upload",
+    ("encoder",),
+)
+
+
+class _UpstreamCall:
+    """Handle yielded by track_upstream() so callers can attach the response"""
+    __slots__ = ("service", "endpoint", "failed", "span")
+
+    def __init__(self, service: str, endpoint: str, span):
+        self.service = service
+        self.endpoint = endpoint
+        self.failed = False
+        self.span = span
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Outbound headers propagating the trace context of this call"""
+        return tracing.inject_headers()
+
+    def response(self, response) -> None:
+        """Record body size and error status from an httpx/requests response"""
+        try:
+            UPSTREAM_RESPONSE_BYTES.observe(len(response.content), self.service, self.endpoint)
+        except Exception:
+            pass
+        status = getattr(response, "status_code", 200)
+        if isinstance(status, int):
+            self.span.set_attribute("http.status_code", status)
+            if status >= 400:
+                self.failed = True
+
+
+@contextmanager
+def track_upstream(service: str, endpoint: str):
+    """
+    Time an outbound call to an upstream service
+
+    Usage:
+        with track_upstream("cognitive_api", "/health") as call:
+            response = await client.get(..., headers=call.headers)
+            call.response(response)
+    """
+    with tracing.span(f"{service} {endpoint}", kind="client", service=service) as span:
+        call = _UpstreamCall(service, endpoint, span)
+        start = time.perf_counter()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # Abandoned (client gone, or a hedge that lost), not an upstream failure
+            raise
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - start, service, endpoint)
+            if call.failed:
+                UPSTREAM_REQUEST_ERRORS.inc(service, endpoint)
+
+
+# ------------------------------
+# Supabase instrumentation
+# ------------------------------
+_BUILDER_METHODS = {"select", "insert", "update", "upsert", "delete"}
+
+
+class _InstrumentedQuery:
+    """
+    Proxy around a postgrest request builder.
+
+    Every chained call returns another proxy so the table and operation labels
+    survive until .execute(), which is timed and counted.
+    """
+    __slots__ = ("_builder", "_table", "_operation")
+
+    def __init__(self, builder, table: str, operation: str):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        operation = name if name in _BUILDER_METHODS else self._operation
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _InstrumentedQuery(result, self._table, operation)
+            return result
+
+        return chained
+
+    def _execute(self):
+        with tracing.span(f"supabase {self._operation} {self._table}", kind="client",
+                          table=self._table, operation=self._operation) as span:
+            start = time.perf_counter()
+            try:
+                result = self._builder.execute()
+            except Exception:
+                SUPABASE_QUERY_ERRORS.inc(self._table, self._operation)
+                raise
+            finally:
+                SUPABASE_QUERY_DURATION.observe(time.perf_counter() - start, self._table, self._operation)
+            data = getattr(result, "data", None)
+            rows = len(data) if isinstance(data, list) else (1 if data else 0)
+            SUPABASE_QUERY_ROWS.observe(rows, self._table, self._operation)
+            span.set_attribute("rows", rows)
+            return result
+
+
+def _table_from_url(path: str) -> str:
+    # /rest/v1/<table> or /rest/v1/rpc/<function>
+    parts = [p for p in path.split("/") if p]
+    if "rpc" in parts:
+        idx = parts.index("rpc")
+        return f"rpc:{parts[idx + 1]}" if idx + 1 < len(parts) else "rpc"
+    return parts[-1] if parts else "unknown"
+
+
+def _on_postgrest_request(request) -> None:
+    try:
+        size = len(request.content)
+    except Exception:
+        return
+    if size:
+        SUPABASE_PAYLOAD_BYTES.observe(size, _table_from_url(request.url.path), "sent")
+
+
+def _on_postgrest_response(response) -> None:
+    length = response.headers.get("content-length")
+    if length is not None:
+        SUPABASE_PAYLOAD_BYTES.observe(int(length), _table_from_url(response.request.url.path), "received")
+
+
+class InstrumentedClient:
+    """Supabase client wrapper that records metrics for table() and rpc() queries"""
+
+    def __init__(self, client):
+        self._client = client
+        try:
+            hooks = client.postgrest.session.event_hooks
+            hooks.setdefault("request", []).append(_on_postgrest_request)
+            hooks.setdefault("response", []).append(_on_postgrest_response)
+        except Exception:
+            # Payload byte metrics are best-effort; latency/rows still recorded
+            pass
+
+    def table(self, table_name: str):
+        return _InstrumentedQuery(self._client.table(table_name), table_name, "query")
+
+    def from_(self, table_name: str):
+        return self.table(table_name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs):
+        return _InstrumentedQuery(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc:{fn}", "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_supabase(client):
+    """Wrap a Supabase client so every .execute() is measured"""
+    return InstrumentedClient(client)
+
+
+# ------------------------------
+# ASGI middleware
+# ------------------------------
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, response size and errors per route.
+
+    The route label is the matched path template (e.g. /patients/{patient_id})
+    so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        body_bytes = 0
+        recorded = False
+
+        def record() -> None:
+            # Recorded when the last body chunk goes out, so background tasks
+            # that run after the response do not inflate request latency.
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method, route_label, str(status))
+            HTTP_RESPONSE_BYTES.observe(body_bytes, method, route_label)
+            if status >= 500:
+                HTTP_REQUEST_ERRORS.inc(method, route_label)
+
+        async def send_wrapper(message):
+            nonlocal status, body_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await send(message)
+                    record()
+                    return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            record()
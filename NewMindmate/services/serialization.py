@@ -0,0 +1,143 @@
+"""
+Serialization
+Fast JSON responses and a trusted-row path for data read from our own database.
+
+Rows coming back from Supabase already match our schemas, so list endpoints can
+skip the Pydantic round trip (construct model -> validate against
+response_model -> jsonable_encoder -> json.dumps) and serialize the projected
+dicts directly with orjson.
+
+Clients sending `Accept: application/msgpack` get the same content as
+MessagePack when the msgpack package is installed (ContentNegotiationMiddleware).
+"""
+import json
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Tuple, Type
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_ACCEPT = (b"application/msgpack", b"application/x-msgpack")
+
+# Set per request by ContentNegotiationMiddleware
+_wants_msgpack: ContextVar[bool] = ContextVar("wants_msgpack", default=False)
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if hasattr(obj, "tolist"):  # numpy arrays / scalars
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def packb(content: Any) -> bytes:
+    """Serialize to MessagePack with the same type conversions as dumps"""
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def negotiated_media_type() -> str:
+    """Media type FastJSONResponse renders for the current request"""
+    return MSGPACK_MEDIA_TYPE if msgpack is not None and _wants_msgpack.get() else "application/json"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (falls back to the stdlib encoder), or MessagePack if negotiated"""
+
+    def render(self, content: Any) -> bytes:
+        if negotiated_media_type() == MSGPACK_MEDIA_TYPE:
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return packb(content)
+        return dumps(content)
+
+
+class ContentNegotiationMiddleware:
+    """Pure ASGI middleware selecting MessagePack for clients that accept it"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+        accept = dict(scope.get("headers") or []).get(b"accept", b"")
+        if not any(media_type in accept for media_type in _MSGPACK_ACCEPT):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"vary", b"Accept")])
+            await send(message)
+
+        token = _wants_msgpack.set(True)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _wants_msgpack.reset(token)
+
+
+_FIELD_CACHE: Dict[type, Tuple[Tuple[str, Any], ...]] = {}
+
+
+def _model_fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    fields = _FIELD_CACHE.get(model)
+    if fields is None:
+        fields = tuple(
+            (name, None if info.is_required() else info.get_default(call_default_factory=True))
+            for name, info in model.model_fields.items()
+        )
+        _FIELD_CACHE[model] = fields
+    return fields
+
+
+def project_row(row: Dict, model: Type[BaseModel]) -> Dict:
+    """Keep only the fields declared on model, filling defaults for missing keys"""
+    return {name: row.get(name, default) for name, default in _model_fields(model)}
+
+
+def trusted_rows(rows: Iterable[Dict], model: Type[BaseModel]) -> List[Dict]:
+    """
+    Project database rows onto a response model without validating them
+
+    Only use for rows read from our own tables; anything user-supplied must
+    still go through the model.
+    """
+    fields = _model_fields(model)
+    return [{name: row.get(name, default) for name, default in fields} for row in rows]
+
+
+def trusted_response(rows: Iterable[Dict], model: Type[BaseModel], status_code: int = 200) -> FastJSONResponse:
+    """Serialize trusted rows straight to a response, bypassing response_model validation"""
+    return FastJSONResponse(trusted_rows(rows, model), status_code=status_code)
+
+
+def construct_trusted(model: Type[BaseModel], row: Dict) -> BaseModel:
+    """Build a model instance from a trusted row without running validators"""
+    return model.model_construct(**project_row(row, model))
@@ -0,0 +1,94 @@
+"""
+Startup
+Deferred construction of heavy dependencies and readiness reporting.
+
+Importing the app stays cheap: the Supabase client is built on first use,
+and NumPy-backed modules hold a lazy module (lazy_import) that only executes
+on first attribute access. The FastAPI lifespan starts warm_up() in the
+background, which pays those costs off the request path; /ready answers 503
+until every warm-up step has finished, so the load balancer only routes
+traffic to a warm instance while /health (liveness) answers immediately.
+"""
+import asyncio
+import importlib
+import sys
+import threading
+import time
+import types
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+
+_lazy_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Placeholder that imports the real module on first attribute access"""
+
+    def __getattr__(self, attr: str):
+        # Only reached for attributes not copied over yet, i.e. before loading
+        with _lazy_lock:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+_lazy_modules: Dict[str, types.ModuleType] = {}
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Module whose import is deferred until first attribute access
+
+    Once loaded, attribute lookups hit the copied module dict directly.
+    Modules using this must not touch the module at import time (use
+    `from __future__ import annotations` for type hints).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return _lazy_modules.setdefault(name, _LazyModule(name))
+
+
+class Readiness:
+    """Progress of the warm-up steps of this process"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def report(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "steps": {name: round(seconds, 4) for name, seconds in self.steps.items()},
+            "error": self.error,
+        }
+
+
+async def warm_up(readiness: Readiness, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+    """Run blocking warm-up steps on the threadpool, recording how long each took"""
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            await run_in_threadpool(step)
+        except Exception as e:
+            readiness.error = f"{name}: {e}"
+            print(f"❌ Warm-up step '{name}' failed: {e}")
+            return
+        readiness.steps[name] = time.perf_counter() - start
+    readiness.ready = True
+    print(f"✅ Warm in {time.monotonic() - readiness.started_at:.2f}s")
+
+
+def start_warm_up(readiness: Readiness, steps: List[Tuple[str, Callable[[], object]]]) -> asyncio.Task:
+    readiness.started_at = time.monotonic()
+    readiness.ready = False
+    readiness.steps.clear()
+    readiness.error = None
+    return asyncio.create_task(warm_up(readiness, steps))
+
+
+READINESS = Readiness()
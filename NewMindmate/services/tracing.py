@@ -0,0 +1,360 @@
+"""
+Tracing
+Minimal distributed tracing with W3C trace context propagation.
+
+Spans are tracked in a ContextVar so they follow a request through sync
+handlers (threadpool), async handlers, background tasks and outbound calls.
+Finished spans are exported in Zipkin v2 JSON, either appended to a local file
+(TRACE_EXPORT_FILE) or POSTed to a collector (TRACE_EXPORT_URL, e.g. Jaeger or
+an OpenTelemetry collector with the zipkin receiver on :9411/api/v2/spans).
+Tracing is a no-op when neither is configured.
+"""
+import os
+import json
+import time
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "mindmate-backend")
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("mindmate_current_span", default=None)
+
+
+class SpanContext:
+    """Identifiers needed to parent a span (possibly from another process)"""
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool = True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+class Span:
+    """A timed operation within a trace"""
+    __slots__ = ("name", "kind", "context", "parent_id", "start_us", "end_us", "attributes", "error")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str], kind: str):
+        self.name = name
+        self.kind = kind
+        self.context = context
+        self.parent_id = parent_id
+        self.start_us = time.time_ns() // 1000
+        self.end_us: Optional[int] = None
+        self.attributes: Dict[str, str] = {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = str(value)
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_us is not None:
+            return
+        self.end_us = time.time_ns() // 1000
+        if self.context.sampled and _exporter is not None:
+            _exporter.submit(self.to_zipkin())
+
+    def to_zipkin(self) -> Dict:
+        tags = dict(self.attributes)
+        if self.error:
+            tags["error"] = self.error
+        span = {
+            "traceId": self.context.trace_id,
+            "id": self.context.span_id,
+            "name": self.name,
+            "timestamp": self.start_us,
+            "duration": max((self.end_us or self.start_us) - self.start_us, 1),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": tags,
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        if self.kind in ("server", "client"):
+            span["kind"] = self.kind.upper()
+        return span
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled so call sites never branch"""
+    context = None
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# ------------------------------
+# Exporters
+# ------------------------------
+class _BatchExporter:
+    """Buffers finished spans and flushes them from a daemon thread"""
+
+    def __init__(self, sink: Callable[[List[Dict]], None], max_batch: int = 128, interval: float = 1.0):
+        self._sink = sink
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=10000)
+        self._max_batch = max_batch
+        self._interval = interval
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Dict) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # drop rather than block request handling
+
+    def _drain(self, block: bool) -> List[Dict]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self._interval) if block else self._queue.get_nowait())
+            while len(batch) < self._max_batch:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _export(self, batch: List[Dict]) -> None:
+        try:
+            self._sink(batch)
+        except Exception as e:
+            print(f"⚠️  Trace export failed: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain(block=True)
+            if batch:
+                self._export(batch)
+
+    def flush(self) -> None:
+        """Export anything still queued and wait for in-flight batches"""
+        batch = self._drain(block=False)
+        while batch:
+            self._export(batch)
+            batch = self._drain(block=False)
+        self._queue.join()
+
+
+def _file_sink(path: str) -> Callable[[List[Dict]], None]:
+    lock = threading.Lock()
+
+    def sink(spans: List[Dict]) -> None:
+        lines = "".join(json.dumps(s) + "\n" for s in spans)
+        with lock, open(path, "a") as fh:
+            fh.write(lines)
+
+    return sink
+
+
+def _http_sink(url: str) -> Callable[[List[Dict]], None]:
+    client = httpx.Client(timeout=5.0)
+
+    def sink(spans: List[Dict]) -> None:
+        client.post(url, json=spans)
+
+    return sink
+
+
+_exporter: Optional[_BatchExporter] = None
+
+
+def configure(
+    file_path: Optional[str] = None,
+    url: Optional[str] = None,
+    sink: Optional[Callable[[List[Dict]], None]] = None,
+) -> None:
+    """
+    Configure where finished spans go
+
+    Args:
+        file_path: Append Zipkin JSON spans, one per line, to this file
+        url: POST batches of spans to a Zipkin-compatible collector
+        sink: Custom callable receiving batches of span dicts (tests, debugging)
+
+    Passing nothing disables tracing.
+    """
+    global _exporter
+    if sink is None:
+        if url:
+            sink = _http_sink(url)
+        elif file_path:
+            sink = _file_sink(file_path)
+    _exporter = _BatchExporter(sink) if sink is not None else None
+
+
+def flush() -> None:
+    """Export queued spans immediately (e.g. at shutdown)"""
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+configure(file_path=TRACE_EXPORT_FILE, url=TRACE_EXPORT_URL)
+
+
+# ------------------------------
+# Span API
+# ------------------------------
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """Parse a W3C traceparent header ("00-<trace>-<span>-<flags>")"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], sampled)
+
+
+def current_span_context() -> Optional[SpanContext]:
+    """Context of the active span, to hand to work that runs later"""
+    span = _current_span.get()
+    return span.context if span is not None else None
+
+
+def start_span(name: str, kind: str = "internal", parent: Optional[SpanContext] = None) -> Optional[Span]:
+    """
+    Start a span without activating it; the caller must call span.end()
+
+    Returns None when tracing is disabled.
+    """
+    if _exporter is None:
+        return None
+    if parent is None:
+        parent = current_span_context()
+    if parent is not None:
+        context = SpanContext(parent.trace_id, _new_id(64), parent.sampled)
+        parent_id = parent.span_id
+    else:
+        context = SpanContext(_new_id(128), _new_id(64), random.random() < TRACE_SAMPLE_RATE)
+        parent_id = None
+    return Span(name, context, parent_id, kind)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", parent: Optional[SpanContext] = None, **attributes):
+    """
+    Run a block inside a child span of the active (or given) parent
+
+    Usage:
+        with tracing.span("run_analysis", session_id=session_id) as s:
+            s.set_attribute("memories", len(memories))
+    """
+    current = start_span(name, kind, parent)
+    if current is None:
+        yield _NOOP_SPAN
+        return
+    for key, value in attributes.items():
+        current.set_attribute(key, value)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Return outbound headers carrying the active trace context"""
+    headers = dict(headers or {})
+    context = current_span_context()
+    if context is not None:
+        headers["traceparent"] = context.traceparent()
+    return headers
+
+
+# ------------------------------
+# ASGI middleware
+# ------------------------------
+class TracingMiddleware:
+    """
+    Starts a server span per HTTP request, continuing an incoming traceparent.
+
+    The span ends when the last body chunk is sent, so background tasks that
+    run afterwards appear as children that outlive their parent request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+
+        request_span = start_span(f"{scope.get('method', 'GET')} {scope.get('path', '')}", "server", incoming)
+        request_span.set_attribute("http.method", scope.get("method", "GET"))
+        request_span.set_attribute("http.target", scope.get("path", ""))
+        token = _current_span.set(request_span)
+
+        def finish(status: int) -> None:
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                request_span.name = f"{scope.get('method', 'GET')} {route.path}"
+                request_span.set_attribute("http.route", route.path)
+            request_span.set_attribute("http.status_code", status)
+            request_span.end()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"traceparent", request_span.context.traceparent().encode("latin-1"))
+                ]
+                request_span.set_attribute("http.status_code", message["status"])
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await send(message)
+                finish(int(request_span.attributes.get("http.status_code", 200)))
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            request_span.record_error(e)
+            finish(500)
+            raise
+        finally:
+            _current_span.reset(token)
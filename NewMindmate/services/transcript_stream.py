@@ -0,0 +1,219 @@
+"""
+Transcript Stream
+Live, incremental transcript ingestion with batched writes.
+
+Messages streamed during a call are appended to a per-session in-memory
+buffer. Pending lines are flushed as one appended row of the
+transcript_chunks table (db/migrations/005_transcript_chunks.sql) every
+TRANSCRIPT_FLUSH_MESSAGES messages or TRANSCRIPT_FLUSH_SECONDS seconds,
+so each flush writes only the new lines instead of the whole transcript.
+Lower values make a partial transcript visible sooner at the cost of more
+writes. When the client ends the stream, the full transcript is written
+to sessions.transcript once and the chunks are deleted, so readers on other
+instances go back to the session row. A dropped connection only flushes:
+the chunks stay, and a reconnect resumes after them.
+
+Readers get a snapshot taken under the buffer lock: flushed lines plus
+pending lines, never half a flush.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from NewMindmate.services import entity_cache
+from NewMindmate.services.call_ingestion import format_message
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+TRANSCRIPT_FLUSH_MESSAGES = int(os.getenv("TRANSCRIPT_FLUSH_MESSAGES", "20"))
+TRANSCRIPT_FLUSH_SECONDS = float(os.getenv("TRANSCRIPT_FLUSH_SECONDS", "5"))
+
+CHUNK_TABLE = "transcript_chunks"
+
+
+class TranscriptBuffer:
+    """Flushed and pending transcript lines for one session"""
+
+    def __init__(self, session_id: str, committed: Optional[List[str]] = None, next_seq: int = 0):
+        self.session_id = session_id
+        self.committed: List[str] = list(committed or [])
+        self.pending: List[str] = []
+        self.next_seq = next_seq
+        self.oldest_pending_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def append(self, line: str) -> int:
+        """Buffer a line; returns how many lines are pending"""
+        with self._lock:
+            if not self.pending:
+                self.oldest_pending_at = time.monotonic()
+            self.pending.append(line)
+            return len(self.pending)
+
+    def due(self, max_messages: int, max_seconds: float) -> bool:
+        with self._lock:
+            if not self.pending:
+                return False
+            return len(self.pending) >= max_messages or time.monotonic() - self.oldest_pending_at >= max_seconds
+
+    def seconds_until_due(self, max_seconds: float) -> Optional[float]:
+        """Time left before the oldest pending line must be flushed (None if nothing pending)"""
+        with self._lock:
+            if not self.pending:
+                return None
+            return max(0.0, max_seconds - (time.monotonic() - self.oldest_pending_at))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lines = self.committed + self.pending
+            return {
+                "session_id": self.session_id,
+                "transcript": "\n".join(lines),
+                "lines": len(lines),
+                "flushed_lines": len(self.committed),
+            }
+
+    def flush(self, supabase: Client) -> int:
+        """Append pending lines as one chunk row; returns lines written"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self.pending)
+                seq = self.next_seq
+            if not batch:
+                return 0
+            supabase.table(CHUNK_TABLE).insert({
+                "session_id": self.session_id,
+                "seq": seq,
+                "content": "\n".join(batch),
+                "line_count": len(batch),
+            }).execute()
+            # Move the batch to committed in one step so readers never see it twice or not at all
+            with self._lock:
+                del self.pending[:len(batch)]
+                self.committed.extend(batch)
+                self.next_seq = seq + 1
+                self.oldest_pending_at = time.monotonic() if self.pending else None
+            return len(batch)
+
+
+def load_chunks(supabase: Client, session_id: str) -> List[Dict]:
+    result = (
+        supabase.table(CHUNK_TABLE)
+        .select("seq,content")
+        .eq("session_id", session_id)
+        .order("seq")
+        .execute()
+    )
+    return result.data or []
+
+
+class TranscriptStreamManager:
+    """Live buffers for sessions currently streaming on this instance"""
+
+    def __init__(self, max_messages: int = TRANSCRIPT_FLUSH_MESSAGES, max_seconds: float = TRANSCRIPT_FLUSH_SECONDS):
+        self.max_messages = max_messages
+        self.max_seconds = max_seconds
+        self._buffers: Dict[str, TranscriptBuffer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[TranscriptBuffer]:
+        return self._buffers.get(str(session_id))
+
+    def open(self, supabase: Client, session_id: str) -> TranscriptBuffer:
+        """Buffer for a session, resuming after chunks already stored (e.g. after a restart)"""
+        session_id = str(session_id)
+        buffer = self.get(session_id)
+        if buffer is not None:
+            return buffer
+        chunks = load_chunks(supabase, session_id)
+        committed = [line for chunk in chunks for line in chunk["content"].split("\n")]
+        next_seq = chunks[-1]["seq"] + 1 if chunks else 0
+        with self._lock:
+            return self._buffers.setdefault(session_id, TranscriptBuffer(session_id, committed, next_seq))
+
+    def append(
+        self,
+        supabase: Client,
+        session_id: str,
+        message: Dict,
+        max_messages: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+    ) -> int:
+        """
+        Buffer one message and flush if the batch is due
+
+        max_messages / max_seconds override the manager defaults for this stream.
+        Returns the number of lines written to storage.
+        """
+        buffer = self.open(supabase, session_id)
+        line = format_message(message)
+        if line is None:
+            return 0
+        buffer.append(line)
+        return self.flush_due(supabase, session_id, max_messages, max_seconds)
+
+    def flush_due(
+        self,
+        supabase: Client,
+        session_id: str,
+        max_messages: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+    ) -> int:
+        buffer = self.get(session_id)
+        if buffer is None or not buffer.due(max_messages or self.max_messages, max_seconds or self.max_seconds):
+            return 0
+        return buffer.flush(supabase)
+
+    def finalize(self, supabase: Client, session_id: str) -> Optional[str]:
+        """Flush, write the full transcript to the session, delete its chunks and drop the buffer"""
+        buffer = self.get(session_id)
+        if buffer is None:
+            return None
+        buffer.flush(supabase)
+        transcript = buffer.snapshot()["transcript"]
+        supabase.table("sessions").update({"transcript": transcript}).eq("session_id", str(session_id)).execute()
+        entity_cache.invalidate("sessions", session_id)
+        # sessions.transcript is now the source of truth; stale chunks would shadow later edits to it
+        supabase.table(CHUNK_TABLE).delete().eq("session_id", str(session_id)).execute()
+        with self._lock:
+            self._buffers.pop(str(session_id), None)
+        return transcript
+
+    def suspend(self, supabase: Client, session_id: str) -> None:
+        """Flush and drop the buffer, keeping the chunks for a reconnect to resume from"""
+        buffer = self.get(session_id)
+        if buffer is None:
+            return
+        buffer.flush(supabase)
+        with self._lock:
+            self._buffers.pop(str(session_id), None)
+
+    def read(self, supabase: Client, session_id: str) -> Optional[Dict]:
+        """
+        Current transcript of a session: the live buffer if streaming here,
+        else the stored chunks (streaming elsewhere), else None (not streaming,
+        the session row holds the transcript)
+        """
+        buffer = self.get(session_id)
+        if buffer is not None:
+            return dict(buffer.snapshot(), live=True)
+        chunks = load_chunks(supabase, str(session_id))
+        if not chunks:
+            return None
+        lines = [line for chunk in chunks for line in chunk["content"].split("\n")]
+        return {
+            "session_id": str(session_id),
+            "transcript": "\n".join(lines),
+            "lines": len(lines),
+            "flushed_lines": len(lines),
+            "live": False,
+        }
+
+
+TRANSCRIPT_STREAMS = TranscriptStreamManager()
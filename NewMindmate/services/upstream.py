@@ -0,0 +1,172 @@
+"""
+Upstream
+Adaptive timeouts and hedged requests for calls to upstream services.
+
+Each (service, endpoint) keeps a sliding window of the latencies of answered
+calls. Its timeout is UPSTREAM_TIMEOUT_MULTIPLIER x the p99 of that window,
+clamped to [floor, ceiling], and stays at the configured default until the
+window holds UPSTREAM_MIN_SAMPLES calls. Timeouts are not latencies (they
+would pin the p99 to the timeout itself once more than 1% of calls hang);
+instead each consecutive timeout doubles the next one, so an upstream that
+has slowed down as a whole is given room again and refills the window.
+
+Idempotent reads can be hedged: when the first attempt has not answered
+within the endpoint's p95, a second identical attempt is sent on a fresh
+connection and whichever finishes first wins. By construction that adds a
+second request for about 5% of calls while cutting off the stuck-connection
+tail. Hedges fired and won are counted per endpoint (win rate = won / fired).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from NewMindmate.services.metrics import (
+    UPSTREAM_HEDGE_WINS,
+    UPSTREAM_HEDGES,
+    UPSTREAM_TIMEOUT_SECONDS,
+    track_upstream,
+)
+
+
+UPSTREAM_TIMEOUT_MULTIPLIER = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", "3"))
+UPSTREAM_MIN_SAMPLES = int(os.getenv("UPSTREAM_MIN_SAMPLES", "20"))
+UPSTREAM_WINDOW = int(os.getenv("UPSTREAM_WINDOW", "200"))
+# Hedging sooner than this only duplicates load
+UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+MAX_BACKOFF = 64.0
+
+# send(timeout seconds, trace headers) -> response
+Send = Callable[[float, Dict[str, str]], Awaitable[httpx.Response]]
+
+
+class AdaptiveTimeout:
+    """Latency window and derived timeout / hedge delay for one upstream endpoint"""
+
+    def __init__(
+        self,
+        service: str,
+        endpoint: str,
+        default: float,
+        floor: float,
+        ceiling: float,
+        window: int = UPSTREAM_WINDOW,
+        min_samples: int = UPSTREAM_MIN_SAMPLES,
+    ):
+        self.service = service
+        self.endpoint = endpoint
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._backoff = 1.0
+        self._lock = threading.Lock()
+        UPSTREAM_TIMEOUT_SECONDS.set(default, service, endpoint)
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of an answered call"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._backoff = 1.0
+        UPSTREAM_TIMEOUT_SECONDS.set(self.timeout(), self.service, self.endpoint)
+
+    def timed_out(self) -> None:
+        """Record a call that hit its timeout"""
+        with self._lock:
+            self._backoff = min(self._backoff * 2, MAX_BACKOFF)
+        UPSTREAM_TIMEOUT_SECONDS.set(self.timeout(), self.service, self.endpoint)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-quantile of the window, or None until min_samples calls were seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return self.default
+        return min(self.ceiling, max(self.floor, p99 * UPSTREAM_TIMEOUT_MULTIPLIER) * self._backoff)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Time to wait before hedging (the p95), or None while there is too little data"""
+        p95 = self.percentile(0.95)
+        if p95 is None:
+            return None
+        return max(UPSTREAM_HEDGE_MIN_DELAY, p95)
+
+
+_policies: Dict[Tuple[str, str], AdaptiveTimeout] = {}
+_policies_lock = threading.Lock()
+
+
+def adaptive_timeout(service: str, endpoint: str, default: float, floor: float, ceiling: float) -> AdaptiveTimeout:
+    """Shared AdaptiveTimeout for an endpoint (created on first use)"""
+    with _policies_lock:
+        policy = _policies.get((service, endpoint))
+        if policy is None:
+            policy = _policies[(service, endpoint)] = AdaptiveTimeout(service, endpoint, default, floor, ceiling)
+        return policy
+
+
+async def _attempt(policy: AdaptiveTimeout, send: Send) -> httpx.Response:
+    timeout = policy.timeout()
+    with track_upstream(policy.service, policy.endpoint) as call:
+        start = time.perf_counter()
+        try:
+            response = await send(timeout, call.headers)
+        except httpx.TimeoutException:
+            policy.timed_out()
+            raise
+        call.response(response)
+    # Fast failures would drag the timeout down, so only answers count
+    if response.status_code < 500:
+        policy.observe(time.perf_counter() - start)
+    return response
+
+
+async def request(policy: AdaptiveTimeout, send: Send, hedge: bool = False) -> httpx.Response:
+    """
+    Send an upstream request with the endpoint's adaptive timeout
+
+    Args:
+        policy: AdaptiveTimeout of the endpoint
+        send: Coroutine function issuing the request with the given timeout and headers
+        hedge: Send a second attempt after the p95 (idempotent requests only)
+
+    Returns:
+        The first response to arrive
+    """
+    delay = policy.hedge_delay() if hedge else None
+    if delay is None:
+        return await _attempt(policy, send)
+
+    pending = {asyncio.ensure_future(_attempt(policy, send))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return done.pop().result()
+
+        UPSTREAM_HEDGES.inc(policy.service, policy.endpoint)
+        (primary,) = pending
+        pending.add(asyncio.ensure_future(_attempt(policy, send)))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        UPSTREAM_HEDGE_WINS.inc(policy.service, policy.endpoint)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,146 @@
+# test_admission.py
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services import metrics
+from NewMindmate.services.admission import (
+    BULK,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionRejected,
+    PriorityLimiter,
+    TokenBucket,
+)
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# -----------------------------
+# Test: token bucket
+# -----------------------------
+def test_token_bucket_burst_then_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, burst=2, clock=clock)
+
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(2.0)
+
+    clock.now = 2.0
+    assert bucket.take() == 0.0
+    clock.now = 100.0
+    assert bucket.full and bucket.tokens == 2
+
+
+def test_budgets_are_per_doctor_and_per_priority():
+    clock = FakeClock()
+    controller = AdmissionController(budgets={INTERACTIVE: (1, 1), BULK: (0.1, 1)}, clock=clock)
+    before = metrics.ADMISSION_REJECTIONS.value("bulk", "rate_limited")
+
+    controller.check("doctor:a", BULK)
+    with pytest.raises(AdmissionRejected) as exc:
+        controller.check("doctor:a", BULK)
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "10"
+    assert metrics.ADMISSION_REJECTIONS.value("bulk", "rate_limited") == before + 1
+
+    # Other doctors and the interactive budget are unaffected
+    controller.check("doctor:b", BULK)
+    controller.check("doctor:a", INTERACTIVE)
+
+
+# -----------------------------
+# Test: priority scheduling
+# -----------------------------
+@pytest.mark.asyncio
+async def test_interactive_waiters_go_before_bulk():
+    limiter = PriorityLimiter(max_concurrent=1)
+    order = []
+
+    async def run(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await limiter.acquire(BULK)
+    tasks = [asyncio.create_task(run(f"bulk-{i}", BULK)) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(run("query", INTERACTIVE)))
+    await asyncio.sleep(0)
+    assert limiter.queue_depth(BULK) == 3 and limiter.queue_depth(INTERACTIVE) == 1
+    assert metrics.ADMISSION_QUEUE_DEPTH.value("bulk") == 3
+
+    limiter.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["query", "bulk-0", "bulk-1", "bulk-2"]
+    assert limiter.in_flight == 0 and limiter.queue_depth(BULK) == 0
+
+
+@pytest.mark.asyncio
+async def test_reserved_slots_stay_free_for_interactive():
+    limiter = PriorityLimiter(max_concurrent=2, reserved_interactive=1)
+
+    await limiter.acquire(BULK)
+    with pytest.raises(asyncio.TimeoutError):
+        await limiter.acquire(BULK, timeout=0.01)
+    assert limiter.queue_depth(BULK) == 0
+
+    await asyncio.wait_for(limiter.acquire(INTERACTIVE), 0.1)
+    assert limiter.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_is_503():
+    controller = AdmissionController(
+        budgets={INTERACTIVE: (1, 5), BULK: (1, 5)},
+        limiter=PriorityLimiter(max_concurrent=1),
+        queue_timeout=0.01,
+    )
+    await controller.limiter.acquire(INTERACTIVE)
+
+    with pytest.raises(AdmissionRejected) as exc:
+        async with controller.admit("doctor:a", INTERACTIVE):
+            pass
+    assert exc.value.status_code == 503 and "Retry-After" in exc.value.headers
+
+    controller.limiter.release()
+    async with controller.admit("doctor:a", INTERACTIVE):
+        assert controller.limiter.in_flight == 1
+    assert controller.limiter.in_flight == 0
+
+
+# -----------------------------
+# Test: AI routes
+# -----------------------------
+def test_analytics_route_returns_429_with_retry_after():
+    patient_id = str(uuid4())
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"patient_id": patient_id, "name": "Ann"}
+    ]
+    controller = AdmissionController(budgets={INTERACTIVE: (0.5, 1), BULK: (0.1, 1)})
+
+    with patch("NewMindmate.routes.cognitive_routes.supabase", supabase), \
+         patch("NewMindmate.routes.cognitive_routes.ADMISSION", controller), \
+         patch("NewMindmate.routes.cognitive_routes.get_patient_dashboard", AsyncMock(return_value={"patientId": patient_id})):
+        first = client.get(f"/cognitive/patients/{patient_id}/analytics", headers={"X-Doctor-Id": "d1"})
+        second = client.get(f"/cognitive/patients/{patient_id}/analytics", headers={"X-Doctor-Id": "d1"})
+        other = client.get(f"/cognitive/patients/{patient_id}/analytics", headers={"X-Doctor-Id": "d2"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "2"
+    assert other.status_code == 200
@@ -0,0 +1,81 @@
+# test_analysis_cache.py
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from NewMindmate.services.analysis_cache import AnalysisCache, analysis_key
+
+
+PATIENT = {"name": "Ada", "dob": "1940-01-01", "diagnosis": "MCI", "interests": ["gardening"], "created_at": "x"}
+
+
+# -----------------------------
+# Test: content hash
+# -----------------------------
+def test_analysis_key_depends_on_relevant_fields_only():
+    key = analysis_key("Hello", PATIENT)
+
+    assert key == analysis_key("Hello", dict(PATIENT, created_at="y"))
+    assert key != analysis_key("Hello!", PATIENT)
+    assert key != analysis_key("Hello", dict(PATIENT, diagnosis="AD"))
+    assert key != analysis_key("Hello", PATIENT, version="2")
+
+
+# -----------------------------
+# Test: caching and in-flight coalescing
+# -----------------------------
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_analysis():
+    cache = AnalysisCache(table=None)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"overall_score": 0.8}
+
+    results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(r == {"overall_score": 0.8} for r in results)
+    assert not cache.in_flight("k")
+
+    assert await cache.get_or_compute("k", compute) == {"overall_score": 0.8}
+    assert len(calls) == 1
+
+    await cache.get_or_compute("k", compute, force=True)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    cache = AnalysisCache(table=None)
+
+    async def fail():
+        raise RuntimeError("Cognitive API timeout")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("k", fail)
+    assert "k" not in cache and not cache.in_flight("k")
+
+
+@pytest.mark.asyncio
+async def test_persistent_table_lookup_and_write():
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"result": {"overall_score": 0.5}}
+    ]
+    cache = AnalysisCache()
+
+    async def compute():
+        raise AssertionError("should be served from the table")
+
+    assert await cache.get_or_compute("k", compute, supabase=supabase) == {"overall_score": 0.5}
+    assert "k" in cache
+
+    async def fresh():
+        return {"overall_score": 0.9}
+
+    await cache.get_or_compute("other", fresh, supabase=supabase, force=True)
+    row = supabase.table.return_value.upsert.call_args[0][0]
+    assert row["content_hash"] == "other" and row["result"] == {"overall_score": 0.9}
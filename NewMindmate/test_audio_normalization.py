@@ -0,0 +1,91 @@
+# test_audio_normalization.py
+import io
+import wave
+import numpy as np
+import pytest
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate import main
+from NewMindmate.services import audio_normalization
+from NewMindmate.services.audio_normalization import compact_path, normalize_audio, resample
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def make_wav(seconds=1.0, rate=44100, channels=2, width=2, freq=440.0):
+    t = np.arange(int(seconds * rate)) / rate
+    signal = 0.5 * np.sin(2 * np.pi * freq * t)
+    frames = np.repeat(signal[:, None], channels, axis=1)
+    if width == 2:
+        raw = (frames * 32767).astype("<i2").tobytes()
+    else:
+        raw = (frames * (2 ** 31 - 1)).astype("<i4").tobytes()
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(raw)
+    return out.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def no_ffmpeg(monkeypatch):
+    """Exercise the NumPy WAV fallback regardless of the host"""
+    monkeypatch.setattr(audio_normalization, "FFMPEG", None)
+
+
+# -----------------------------
+# Test: WAV fallback
+# -----------------------------
+@pytest.mark.parametrize("width", [2, 4])
+def test_wav_is_downmixed_and_resampled(width):
+    original = make_wav(width=width)
+    compact = normalize_audio(original, ".wav")
+
+    with wave.open(io.BytesIO(compact.content)) as wav:
+        assert wav.getnchannels() == 1 and wav.getframerate() == 16000 and wav.getsampwidth() == 2
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2") / 32768
+
+    assert compact.duration_seconds == pytest.approx(1.0, abs=1e-3)
+    assert compact.ratio > 5
+    # The 440 Hz tone survives resampling at about the same amplitude
+    assert np.abs(samples[1000:-1000]).max() == pytest.approx(0.5, abs=0.02)
+
+
+def test_resample_suppresses_content_above_new_nyquist():
+    rate = 44100
+    t = np.arange(rate) / rate
+    tone = np.sin(2 * np.pi * 12000 * t).astype(np.float32)  # above 8 kHz
+
+    assert np.abs(resample(tone, rate)[500:-500]).max() < 0.05
+
+
+def test_non_wav_without_encoder_is_skipped():
+    assert normalize_audio(b"ID3" + b"\x00" * 100, ".mp3") is None
+
+
+def test_compact_path_sits_next_to_original():
+    assert compact_path("audio/p1/123-visit.wav", ".ogg") == "audio/p1/123-visit.16k.ogg"
+
+
+# -----------------------------
+# Test: worker job updates the session
+# -----------------------------
+def test_store_compact_rendition_points_session_at_compact():
+    session_id = uuid4()
+    supabase = MagicMock()
+    supabase.storage.from_.return_value.upload.return_value = ({"path": "audio/x.16k.wav"}, None)
+    supabase.storage.from_.return_value.get_public_url.return_value = "https://cdn/audio/x.16k.wav"
+
+    with patch("NewMindmate.main.get_supabase", return_value=supabase):
+        result = main.store_compact_rendition(make_wav(), "audio/x.wav", "https://cdn/audio/x.wav", ".wav", session_id)
+
+    assert result["public_url"] == "https://cdn/audio/x.16k.wav"
+    assert supabase.storage.from_.return_value.upload.call_args.kwargs["path"] == "audio/x.16k.wav"
+    supabase.table.return_value.update.assert_called_once_with({
+        "audio_url": "https://cdn/audio/x.16k.wav",
+        "audio_original_url": "https://cdn/audio/x.wav",
+    })
@@ -0,0 +1,144 @@
+# test_audio_playback.py
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+
+from NewMindmate.main import app
+from NewMindmate.services import audio_playback as playback
+from NewMindmate.services.audio_playback import AudioDiskCache, RangeNotSatisfiable, SignedUrlCache, parse_range
+
+client = TestClient(app)
+
+AUDIO = bytes(range(256)) * 1024  # 256KB
+PATH = "audio/p1/abc123.wav"
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def mock_supabase():
+    supabase = MagicMock()
+    supabase.storage.from_.return_value.create_signed_url.return_value = {
+        "signedURL": "https://storage.test/object/sign/audio/audio/p1/abc123.wav?token=t"
+    }
+    with patch("NewMindmate.main.get_supabase", return_value=supabase):
+        yield supabase
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    """Serve AUDIO from a fake storage host honouring Range; records Range headers"""
+    requests = []
+
+    def handle(request):
+        requests.append(request.headers.get("range"))
+        byte_range = parse_range(request.headers.get("range"), len(AUDIO))
+        if byte_range is None:
+            return httpx.Response(200, content=AUDIO, headers={"content-length": str(len(AUDIO))})
+        start, end = byte_range
+        return httpx.Response(206, content=AUDIO[start:end + 1], headers={
+            "content-range": f"bytes {start}-{end}/{len(AUDIO)}",
+            "content-length": str(end - start + 1),
+        })
+
+    monkeypatch.setattr(playback, "get_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(playback, "SIGNED_URLS", SignedUrlCache())
+    monkeypatch.setattr(playback, "AUDIO_DISK_CACHE", AudioDiskCache(str(tmp_path), max_bytes=4 * len(AUDIO), min_requests=2))
+    return requests
+
+
+# -----------------------------
+# Test: Range parsing
+# -----------------------------
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-10", (990, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-1,5-6", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_parse_range_past_end():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+
+
+# -----------------------------
+# Test: Signed URL cache
+# -----------------------------
+def test_signed_url_reused_until_margin():
+    now = [0.0]
+    cache = SignedUrlCache(ttl=3600, margin=60, clock=lambda: now[0])
+    supabase = MagicMock()
+    supabase.storage.from_.return_value.create_signed_url.return_value = {"signedURL": "https://s/x?token=1"}
+
+    cache.get(supabase, "audio", "x")
+    now[0] = 3539
+    cache.get(supabase, "audio", "x")
+    assert supabase.storage.from_.return_value.create_signed_url.call_count == 1
+
+    now[0] = 3540
+    cache.get(supabase, "audio", "x")
+    assert supabase.storage.from_.return_value.create_signed_url.call_count == 2
+
+
+# -----------------------------
+# Test: Playback endpoint
+# -----------------------------
+def test_range_request_streams_from_storage(mock_supabase, storage):
+    response = client.get(f"/audio/{PATH}", headers={"Range": "bytes=1000-1999"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[1000:2000]
+    assert response.headers["content-range"] == f"bytes 1000-1999/{len(AUDIO)}"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "audio/wav"
+    assert storage == ["bytes=1000-1999"]
+
+
+def test_hot_recording_is_served_from_disk(mock_supabase, storage):
+    client.get(f"/audio/{PATH}", headers={"Range": "bytes=0-99"})
+    # Second request makes the recording hot: downloaded whole after the response
+    client.get(f"/audio/{PATH}", headers={"Range": "bytes=100-199"})
+    assert PATH in playback.AUDIO_DISK_CACHE
+    storage.clear()
+
+    response = client.get(f"/audio/{PATH}", headers={"Range": "bytes=-16"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[-16:]
+    assert response.headers["content-range"] == f"bytes {len(AUDIO) - 16}-{len(AUDIO) - 1}/{len(AUDIO)}"
+    assert storage == []
+    # Signed once for all three requests
+    assert mock_supabase.storage.from_.return_value.create_signed_url.call_count == 1
+
+
+def test_disk_range_not_satisfiable(mock_supabase, storage):
+    for _ in range(2):
+        client.get(f"/audio/{PATH}")
+
+    response = client.get(f"/audio/{PATH}", headers={"Range": f"bytes={len(AUDIO)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+
+def test_disk_cache_evicts_least_recently_used(storage, tmp_path):
+    cache = playback.AUDIO_DISK_CACHE
+    for i in range(5):
+        tmp = tmp_path / f"part{i}"
+        tmp.write_bytes(AUDIO)
+        cache._admit(f"audio/{i}.wav", tmp, len(AUDIO))
+
+    assert cache.total_bytes == 4 * len(AUDIO)
+    assert "audio/0.wav" not in cache and "audio/4.wav" in cache
+
+
+def test_rejects_path_traversal(mock_supabase, storage):
+    assert client.get("/audio/a/%2E%2E/b.wav").status_code == 400
@@ -371,3 +371,78 @@ def test_upload_audio_public_url_generation(mock_supabase, sample_audio_file):
     assert data["public_url"].startswith(supabase_url)
     assert "storage/v1/object/public/audio" in data["public_url"]
 
+
+
+# -----------------------------
+# Test: Content-addressed dedupe
+# -----------------------------
+def test_upload_audio_path_is_content_hash(mock_supabase, sample_audio_file):
+    """Test the storage path is the SHA-256 of the uploaded bytes"""
+    import hashlib
+    expected = hashlib.sha256(sample_audio_file.getvalue()).hexdigest()
+    mock_supabase.storage.from_.return_value.list.return_value = []
+    mock_supabase.storage.from_.return_value.upload.return_value = ({"path": f"audio/{expected}.wav"}, None)
+    mock_supabase.storage.from_.return_value.get_public_url.return_value = f"https://cdn/audio/{expected}.wav"
+
+    response = client.post("/audio/upload", files={"file": ("visit 1.wav", sample_audio_file, "audio/wav")})
+
+    assert response.status_code == 200
+    assert response.json()["deduplicated"] is False
+    assert mock_supabase.storage.from_.return_value.upload.call_args.kwargs["path"] == f"audio/{expected}.wav"
+
+
+def test_upload_audio_duplicate_skips_storage_write(mock_supabase, sample_audio_file):
+    """Test re-uploading identical audio reuses the stored object and links it to the session"""
+    import hashlib
+    digest = hashlib.sha256(sample_audio_file.getvalue()).hexdigest()
+    patient_id, session_id = uuid4(), uuid4()
+    bucket = mock_supabase.storage.from_.return_value
+    bucket.list.return_value = [{"name": f"{digest}.wav"}, {"name": f"{digest}.16k.wav"}]
+    bucket.get_public_url.side_effect = lambda path: f"https://cdn/{path}"
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"patient_id": str(patient_id), "session_id": str(session_id)}
+    ]
+    mock_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value.data = [
+        {"session_id": str(session_id)}
+    ]
+
+    response = client.post(
+        "/audio/upload",
+        files={"file": ("test.wav", sample_audio_file, "audio/wav")},
+        data={"patient_id": str(patient_id), "session_id": str(session_id)},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["deduplicated"] is True
+    assert data["file_path"] == f"audio/{patient_id}/{digest}.wav"
+    assert data["normalization"] == "existing"
+    bucket.upload.assert_not_called()
+    bucket.list.assert_called_once_with(f"audio/{patient_id}", {"search": digest})
+    mock_supabase.table.return_value.update.assert_called_once_with({
+        "audio_url": f"https://cdn/audio/{patient_id}/{digest}.16k.wav",
+        "audio_original_url": f"https://cdn/audio/{patient_id}/{digest}.wav",
+    })
+
+
+def test_upload_audio_concurrent_duplicate_reuses_stored_object(mock_supabase, sample_audio_file):
+    """Test an upload that loses the race to identical audio returns the stored object instead of a 500"""
+    import hashlib
+    digest = hashlib.sha256(sample_audio_file.getvalue()).hexdigest()
+    bucket = mock_supabase.storage.from_.return_value
+    # Not stored at check time; stored by a concurrent upload before the write
+    bucket.list.side_effect = [[], [{"name": f"{digest}.wav"}]]
+    bucket.upload.side_effect = Exception({"statusCode": 409, "error": "Duplicate", "message": "The resource already exists"})
+    bucket.get_public_url.side_effect = lambda path: f"https://cdn/{path}"
+
+    response = client.post(
+        "/audio/upload",
+        files={"file": ("test.wav", sample_audio_file, "audio/wav")},
+        data={"normalize": "false"},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["deduplicated"] is True
+    assert data["file_path"] == f"audio/{digest}.wav"
+    assert data["public_url"] == f"https://cdn/audio/{digest}.wav"
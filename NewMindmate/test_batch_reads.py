@@ -0,0 +1,135 @@
+# test_batch_reads.py
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate.main import app
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def mock_supabase():
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        supabase = MagicMock()
+        mock_get.return_value = supabase
+        yield supabase
+
+
+def patient(patient_id, name):
+    return {"patient_id": str(patient_id), "name": name, "dob": None, "gender": None, "created_at": "2025-01-01T00:00:00"}
+
+
+def session(session_id, patient_id, day):
+    return {
+        "session_id": str(session_id),
+        "patient_id": str(patient_id),
+        "session_date": f"2025-01-{day:02d}T10:00:00",
+        "created_at": f"2025-01-{day:02d}T10:00:00",
+    }
+
+
+# -----------------------------
+# Test: patients:batchGet
+# -----------------------------
+def test_batch_get_patients_preserves_order_and_reports_missing(mock_supabase):
+    a, b, missing = uuid4(), uuid4(), uuid4()
+    query = mock_supabase.table.return_value.select.return_value.in_
+    # Database returns rows in its own order
+    query.return_value.execute.return_value.data = [patient(a, "Ann"), patient(b, "Bob")]
+
+    response = client.post("/patients:batchGet", json={"ids": [str(b), str(missing), str(a), str(b)]})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["name"] for p in data["patients"]] == ["Bob", "Ann"]
+    assert data["missing"] == [str(missing)]
+    query.assert_called_once_with("patient_id", [str(b), str(missing), str(a)])
+
+
+def test_batch_get_requires_ids(mock_supabase):
+    assert client.post("/patients:batchGet", json={"ids": []}).status_code == 422
+
+
+# -----------------------------
+# Test: sessions:batchGet
+# -----------------------------
+def test_batch_get_sessions(mock_supabase):
+    p, s1, s2 = uuid4(), uuid4(), uuid4()
+    mock_supabase.table.return_value.select.return_value.in_.return_value.execute.return_value.data = [session(s2, p, 2)]
+
+    data = client.post("/sessions:batchGet", json={"ids": [str(s1), str(s2)]}).json()
+
+    assert [s["session_id"] for s in data["sessions"]] == [str(s2)]
+    assert data["missing"] == [str(s1)]
+    mock_supabase.table.assert_called_once_with("sessions")
+
+
+# -----------------------------
+# Test: sessions by patient IDs
+# -----------------------------
+def test_sessions_by_patient_ids_one_query_with_limit(mock_supabase):
+    p1, p2, p3 = uuid4(), uuid4(), uuid4()
+    ordered = mock_supabase.table.return_value.select.return_value.in_.return_value.order
+    ordered.return_value.execute.return_value.data = [
+        session(uuid4(), p1, 9), session(uuid4(), p2, 8), session(uuid4(), p1, 7), session(uuid4(), p1, 6),
+    ]
+
+    response = client.post("/sessions:batchGetByPatient", json={
+        "patient_ids": [str(p2), str(p1), str(p3)],
+        "limit_per_patient": 2,
+    })
+
+    results = response.json()["results"]
+    assert [r["patient_id"] for r in results] == [str(p2), str(p1), str(p3)]
+    assert [len(r["sessions"]) for r in results] == [1, 2, 0]
+    assert results[1]["sessions"][0]["session_date"] == "2025-01-09T10:00:00"
+    ordered.assert_called_once_with("session_date", desc=True)
+    assert mock_supabase.table.call_count == 1
+
+
+# -----------------------------
+# Test: patient detail (embedded relations)
+# -----------------------------
+def test_patient_detail_is_one_embedded_query(mock_supabase):
+    p, s = uuid4(), uuid4()
+    query = mock_supabase.table.return_value.select.return_value.eq.return_value
+    query.order.return_value = query
+    query.limit.return_value = query
+    query.execute.return_value.data = [dict(
+        patient(p, "Ann"),
+        recent_sessions=[dict(session(s, p, 3), notable_events=["fall"])],
+        top_memories=[{"memory_id": str(uuid4()), "title": "Wedding", "significance_level": 9}],
+        doctor_records=None,
+    )]
+
+    response = client.get(f"/patients/{p}/detail?sessions_limit=3")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["name"] == "Ann"
+    assert data["recent_sessions"][0]["notable_events"] == ["fall"]
+    assert "transcript" not in data["recent_sessions"][0]
+    assert data["top_memories"][0]["title"] == "Wedding"
+    assert data["doctor_records"] == []
+    mock_supabase.table.assert_called_once_with("patients")
+
+    select = mock_supabase.table.return_value.select.call_args[0][0]
+    assert "recent_sessions:sessions(session_id,session_date," in select
+    assert "top_memories:memories(" in select and "embedding" not in select
+    query.order.assert_any_call("significance_level", desc=True, foreign_table="top_memories")
+    query.limit.assert_any_call(3, foreign_table="recent_sessions")
+    query.limit.assert_any_call(5, foreign_table="doctor_records")
+
+
+def test_patient_detail_not_found(mock_supabase):
+    query = mock_supabase.table.return_value.select.return_value.eq.return_value
+    query.order.return_value = query
+    query.limit.return_value = query
+    query.execute.return_value.data = []
+
+    assert client.get(f"/patients/{uuid4()}/detail").status_code == 404
@@ -0,0 +1,313 @@
+# test_call_ingestion.py
+import httpx
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID, uuid4
+
+from NewMindmate import beyond_presence_standin as standin
+from NewMindmate.services import beyond_presence_client as beyond_presence
+from NewMindmate.services import call_ingestion
+from NewMindmate.services.call_ingestion import (
+    INGEST_MAX_ATTEMPTS, INGEST_RETRY_BASE_SECONDS, CallIngestionPipeline, assemble_transcript, is_due,
+    next_high_water_mark, poll_once, with_failure,
+)
+
+
+MESSAGES = [
+    {"message": "Hi there!", "sent_at": "2025-11-09T15:30:02Z", "sender": "ai"},
+    {"message": "Hello!", "sent_at": "2025-11-09T15:30:00Z", "sender": "user"},
+]
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def standin_api(monkeypatch):
+    """Beyond Presence client wired to the local stand-in app"""
+    standin._calls.clear()
+    beyond_presence.MESSAGE_CACHE.clear()
+    monkeypatch.setattr(
+        beyond_presence, "get_client",
+        lambda: httpx.AsyncClient(base_url="http://standin/v1", transport=httpx.ASGITransport(app=standin.app))
+    )
+    yield standin
+    standin._calls.clear()
+    beyond_presence.MESSAGE_CACHE.clear()
+
+
+@pytest.fixture
+def tables():
+    tables = {"call_ingestions": MagicMock(), "sessions": MagicMock()}
+    tables["call_ingestions"].select.return_value.in_.return_value.execute.return_value.data = []
+    tables["sessions"].select.return_value.in_.return_value.execute.return_value.data = []
+    return tables
+
+
+@pytest.fixture
+def mock_supabase(tables):
+    client = MagicMock()
+    client.table.side_effect = lambda name: tables[name]
+    return client
+
+
+def saved_checkpoints(tables):
+    """Latest checkpoint per call_id across all upserts"""
+    latest = {}
+    for call in tables["call_ingestions"].upsert.call_args_list:
+        for row in call[0][0]:
+            latest[row["call_id"]] = row
+    return latest
+
+
+# -----------------------------
+# Test: transcript assembly
+# -----------------------------
+def test_assemble_transcript_orders_by_sent_at():
+    assert assemble_transcript(MESSAGES) == "Patient: Hello!\nAssistant: Hi there!"
+
+
+# -----------------------------
+# Test: end-to-end ingest against the stand-in
+# -----------------------------
+@pytest.mark.asyncio
+async def test_ingest_creates_sessions_and_analyzes(standin_api, mock_supabase, tables):
+    patient_id = str(uuid4())
+    standin_api.add_call({"id": "c1", "messages": MESSAGES, "ended_at": "2025-11-09T16:00:00Z"})
+    standin_api.add_call({"id": "c2", "messages": MESSAGES[:1], "ended_at": "2025-11-09T16:00:00Z"})
+    analyze = AsyncMock(return_value=True)
+
+    pipeline = CallIngestionPipeline(mock_supabase, "key", analyze, concurrency=2)
+    summary = await pipeline.ingest([
+        {"call_id": "c1", "patient_id": patient_id},
+        {"call_id": "c2", "patient_id": patient_id},
+        {"call_id": "missing", "patient_id": patient_id},
+    ])
+
+    assert summary == {"skipped": 0, "created": 2, "analyzed": 2, "failed": 0, "deferred": 0}
+    tables["sessions"].upsert.assert_called_once()
+    sessions = tables["sessions"].upsert.call_args[0][0]
+    assert [s["transcript"] for s in sessions] == ["Patient: Hello!\nAssistant: Hi there!", "Assistant: Hi there!"]
+    assert {call[0][0] for call in analyze.call_args_list} == {UUID(s["session_id"]) for s in sessions}
+
+    checkpoints = saved_checkpoints(tables)
+    assert checkpoints["c1"]["status"] == "analyzed"
+    assert checkpoints["missing"]["status"] == "pending" and checkpoints["missing"]["error"]
+
+
+# -----------------------------
+# Test: resume from checkpoints
+# -----------------------------
+@pytest.mark.asyncio
+async def test_resume_skips_done_and_reuses_created_session(standin_api, mock_supabase, tables):
+    patient_id, session_id = str(uuid4()), str(uuid4())
+    tables["call_ingestions"].select.return_value.in_.return_value.execute.return_value.data = [
+        {"call_id": "done", "patient_id": patient_id, "session_id": str(uuid4()), "status": "analyzed"},
+        {"call_id": "crashed", "patient_id": patient_id, "session_id": session_id, "status": "pending"},
+    ]
+    # The session insert landed before the restart
+    tables["sessions"].select.return_value.in_.return_value.execute.return_value.data = [{"session_id": session_id}]
+    analyze = AsyncMock(return_value=False)
+
+    summary = await CallIngestionPipeline(mock_supabase, "key", analyze).ingest([
+        {"call_id": "done", "patient_id": patient_id},
+        {"call_id": "crashed", "patient_id": patient_id},
+    ])
+
+    assert summary == {"skipped": 1, "created": 1, "analyzed": 0, "failed": 1, "deferred": 0}
+    tables["sessions"].upsert.assert_not_called()
+    analyze.assert_awaited_once_with(UUID(session_id))
+    crashed = saved_checkpoints(tables)["crashed"]
+    assert crashed["status"] == "failed" and crashed["attempts"] == 1 and crashed["next_retry_at"]
+
+
+# -----------------------------
+# Test: retry backoff
+# -----------------------------
+def test_failures_back_off_and_give_up():
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    row = {"call_id": "c1", "status": "failed"}
+    waits = []
+    for _ in range(INGEST_MAX_ATTEMPTS - 1):
+        row = with_failure(row, "boom", now)
+        retry_at = datetime.fromisoformat(row["next_retry_at"])
+        waits.append((retry_at - now).total_seconds())
+        assert not is_due(row, now) and is_due(row, retry_at)
+    assert waits == [INGEST_RETRY_BASE_SECONDS * 2 ** i for i in range(INGEST_MAX_ATTEMPTS - 1)]
+
+    row = with_failure(row, "boom", now)
+    assert row["attempts"] == INGEST_MAX_ATTEMPTS and row["next_retry_at"] is None
+    assert not is_due(row, now + timedelta(days=365))
+
+
+@pytest.mark.asyncio
+async def test_failed_calls_wait_for_retry(standin_api, mock_supabase, tables):
+    patient_id = str(uuid4())
+    later = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    tables["call_ingestions"].select.return_value.in_.return_value.execute.return_value.data = [
+        {"call_id": "waiting", "patient_id": patient_id, "session_id": str(uuid4()), "status": "failed",
+         "attempts": 1, "next_retry_at": later},
+        {"call_id": "exhausted", "patient_id": patient_id, "session_id": str(uuid4()), "status": "failed",
+         "attempts": INGEST_MAX_ATTEMPTS, "next_retry_at": None},
+        {"call_id": "unfetched", "patient_id": patient_id, "session_id": str(uuid4()), "status": "pending",
+         "attempts": 2, "next_retry_at": later},
+    ]
+    analyze = AsyncMock(return_value=True)
+
+    summary = await CallIngestionPipeline(mock_supabase, "key", analyze).ingest([
+        {"call_id": call_id, "patient_id": patient_id} for call_id in ("waiting", "exhausted", "unfetched")
+    ])
+
+    assert summary == {"skipped": 0, "created": 0, "analyzed": 0, "failed": 0, "deferred": 3}
+    analyze.assert_not_awaited()
+
+
+# -----------------------------
+# Test: webhook and poller racing for a call
+# -----------------------------
+@pytest.mark.asyncio
+async def test_call_claimed_by_another_run_is_skipped(standin_api, mock_supabase, tables):
+    patient_id, their_session = str(uuid4()), str(uuid4())
+    standin_api.add_call({"id": "c1", "messages": MESSAGES, "ended_at": "2025-11-09T16:00:00Z"})
+    standin_api.add_call({"id": "c2", "messages": MESSAGES, "ended_at": "2025-11-09T16:00:00Z"})
+    # Nothing stored when this run starts; by the time it claims, the webhook holds c1
+    tables["call_ingestions"].select.return_value.in_.return_value.execute.side_effect = [
+        MagicMock(data=[]),
+        MagicMock(data=[{"call_id": "c1", "patient_id": patient_id, "session_id": their_session, "status": "pending"}]),
+    ]
+    analyze = AsyncMock(return_value=True)
+
+    summary = await CallIngestionPipeline(mock_supabase, "key", analyze).ingest([
+        {"call_id": "c1", "patient_id": patient_id},
+        {"call_id": "c2", "patient_id": patient_id},
+    ])
+
+    assert summary == {"skipped": 1, "created": 1, "analyzed": 1, "failed": 0, "deferred": 0}
+    claim = tables["call_ingestions"].upsert.call_args_list[0]
+    assert claim[1] == {"on_conflict": "call_id", "ignore_duplicates": True}
+    sessions = tables["sessions"].upsert.call_args[0][0]
+    assert [s["session_id"] for s in sessions] != [their_session] and len(sessions) == 1
+    assert "c1" not in {row["call_id"] for row in tables["call_ingestions"].upsert.call_args_list[-1][0][0]}
+
+
+# -----------------------------
+# Test: polling from a high-water mark
+# -----------------------------
+@pytest.mark.asyncio
+async def test_list_calls_stops_at_high_water_mark(standin_api, monkeypatch):
+    monkeypatch.setattr(standin_api, "PAGE_SIZE", 2)
+    for day in range(1, 8):
+        standin_api.add_call({"id": f"c{day}", "started_at": f"2025-11-0{day}T10:00:00Z", "ended_at": f"2025-11-0{day}T11:00:00Z"})
+    requests = []
+    original = beyond_presence._get
+
+    async def counting_get(*args, **kwargs):
+        requests.append(args[0])
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(beyond_presence, "_get", counting_get)
+
+    calls = await beyond_presence.list_calls("key", started_after="2025-11-05T10:00:00Z")
+    assert [call["id"] for call in calls] == ["c7", "c6", "c5"]
+    assert len(requests) == 2
+
+    assert len(await beyond_presence.list_completed_calls("key")) == 7
+
+
+def test_high_water_mark_waits_for_running_calls():
+    ended = {"started_at": "2025-11-02T10:00:00Z", "ended_at": "2025-11-02T11:00:00Z"}
+    running = {"started_at": "2025-11-01T10:00:00Z", "status": "active"}
+    previous = "2025-10-30T10:00:00Z"
+
+    assert next_high_water_mark([ended], previous) == ended["started_at"]
+    assert next_high_water_mark([ended, running], previous) == running["started_at"]
+    assert next_high_water_mark([], previous) == previous
+
+
+# -----------------------------
+# Test: analysis already running elsewhere
+# -----------------------------
+@pytest.mark.asyncio
+async def test_analysis_in_progress_stays_retryable(standin_api, mock_supabase, tables):
+    patient_id = str(uuid4())
+    tables["call_ingestions"].select.return_value.in_.return_value.execute.return_value.data = [
+        {"call_id": "c1", "patient_id": patient_id, "session_id": str(uuid4()), "status": "session_created"},
+    ]
+
+    summary = await CallIngestionPipeline(mock_supabase, "key", AsyncMock(return_value=None)).ingest([
+        {"call_id": "c1", "patient_id": patient_id},
+    ])
+
+    assert summary == {"skipped": 0, "created": 0, "analyzed": 0, "failed": 0, "deferred": 1}
+    assert "c1" not in saved_checkpoints(tables)
+
+
+# -----------------------------
+# Test: retries of calls older than the high-water mark
+# -----------------------------
+class CheckpointTable:
+    """call_ingestions in memory: upsert, and select filtered by in_ / lt (or_ and order are not evaluated)"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        for row in rows:
+            if not (ignore_duplicates and row["call_id"] in self.rows):
+                self.rows[row["call_id"]] = dict(self.rows.get(row["call_id"], {}), **row)
+        return MagicMock()
+
+    def select(self, columns):
+        return CheckpointQuery(self)
+
+
+class CheckpointQuery:
+    def __init__(self, table):
+        self.table = table
+        self.filters = []
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: (row.get(column) or 0) < value)
+        return self
+
+    def or_(self, filters):
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        return MagicMock(data=[dict(row) for row in self.table.rows.values() if all(f(row) for f in self.filters)])
+
+
+@pytest.mark.asyncio
+async def test_failed_call_is_retried_on_a_later_poll(standin_api, mock_supabase, tables, monkeypatch):
+    monkeypatch.setattr(call_ingestion, "INGEST_RETRY_BASE_SECONDS", 0)
+    tables["call_ingestions"] = checkpoints = CheckpointTable()
+    patient_id = str(uuid4())
+    metadata = {"patient_id": patient_id}
+    standin_api.add_call({"id": "c1", "started_at": "2025-11-01T10:00:00Z", "ended_at": "2025-11-01T11:00:00Z",
+                          "messages": MESSAGES, "metadata": metadata})
+    analyze = AsyncMock(side_effect=[False, True, True])
+    pipeline = CallIngestionPipeline(mock_supabase, "key", analyze)
+
+    mark = await poll_once(pipeline)
+    assert checkpoints.rows["c1"]["status"] == "failed" and checkpoints.rows["c1"]["attempts"] == 1
+
+    # A newer call moves the mark past c1, which is no longer listed
+    standin_api.add_call({"id": "c2", "started_at": "2025-11-02T10:00:00Z", "ended_at": "2025-11-02T11:00:00Z",
+                          "messages": MESSAGES, "metadata": metadata})
+    mark = await poll_once(pipeline, mark)
+    assert mark == "2025-11-02T10:00:00Z"
+    retried = {await_args[0][0] for await_args in analyze.await_args_list[1:]}
+    assert retried == {UUID(checkpoints.rows[call_id]["session_id"]) for call_id in ("c1", "c2")}
+    assert checkpoints.rows["c1"]["status"] == "analyzed" and checkpoints.rows["c1"]["attempts"] == 0
+    assert checkpoints.rows["c2"]["status"] == "analyzed"
@@ -0,0 +1,234 @@
+# test_change_feed.py
+import asyncio
+import json
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+
+from NewMindmate.main import app
+from NewMindmate.db.memory_index import MEMORY_INDEX, PatientMemoryIndex
+from NewMindmate.services import metrics
+from NewMindmate.services.change_feed import (
+    CHANGE_FEED, ChangeFeed, DashboardHub, RowChange, _TableCursor, poll_table,
+)
+from NewMindmate.services.entity_cache import ENTITY_CACHE
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Test: NOTIFY payloads
+# -----------------------------
+def test_payload_parsing():
+    change = RowChange.from_payload(json.dumps(
+        {"table": "sessions", "op": "UPDATE", "id": "s1", "patient_id": "p1", "updated_at": "2025-01-01T00:00:00"}
+    ))
+    assert change == RowChange("sessions", "UPDATE", "s1", "p1", "2025-01-01T00:00:00")
+
+    patient = RowChange.from_payload('{"table": "patients", "op": "INSERT", "id": "p2"}')
+    assert patient.patient_id == "p2"
+
+    truncate = RowChange.from_payload('{"table": "memories", "op": "TRUNCATE"}')
+    assert truncate.id is None
+
+    assert RowChange.from_payload("not json") is None
+    assert RowChange.from_payload('{"table": "doctors", "op": "UPDATE", "id": "d1"}') is None
+
+
+def test_failing_listener_does_not_block_others():
+    feed = ChangeFeed()
+    seen = []
+
+    def broken(change):
+        raise RuntimeError("boom")
+
+    feed.subscribe(broken)
+    feed.subscribe(seen.append)
+    feed.publish(RowChange("sessions", "UPDATE", "s1", "p1"))
+    assert [c.id for c in seen] == ["s1"]
+
+
+# -----------------------------
+# Test: cache invalidation
+# -----------------------------
+def test_changes_invalidate_entity_cache():
+    ENTITY_CACHE.get_or_load("sessions", "s-feed", lambda: {"session_id": "s-feed"})
+    ENTITY_CACHE.get_or_load("sessions", "s-other", lambda: {"session_id": "s-other"})
+    ENTITY_CACHE.get_or_load("patients", "p-feed", lambda: {"patient_id": "p-feed"})
+    before = metrics.CHANGE_FEED_EVENTS.value("sessions", "UPDATE")
+
+    CHANGE_FEED.publish(RowChange("sessions", "UPDATE", "s-feed", "p-feed"))
+    assert ("sessions", "s-feed") not in ENTITY_CACHE
+    assert ("sessions", "s-other") in ENTITY_CACHE
+    assert metrics.CHANGE_FEED_EVENTS.value("sessions", "UPDATE") == before + 1
+
+    # TRUNCATE (or a resync) drops the whole table, and only that table
+    CHANGE_FEED.publish(RowChange("sessions", "TRUNCATE"))
+    assert ("sessions", "s-other") not in ENTITY_CACHE
+    assert ("patients", "p-feed") in ENTITY_CACHE
+    ENTITY_CACHE.invalidate("patients", "p-feed")
+
+
+def test_memory_changes_update_search_index_in_place():
+    index = PatientMemoryIndex("p-index", 3)
+    index.add("m-own", np.array([1.0, 0.0, 0.0]), {"title": "own"})
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"memory_id": "m-new", "patient_id": "p-index", "title": "elsewhere", "embedding": [0.0, 1.0, 0.0]}
+    ]
+
+    MEMORY_INDEX._indexes["p-index"] = index
+    with patch("NewMindmate.db.supabase_client.get_supabase", return_value=supabase), \
+         patch.object(MEMORY_INDEX, "invalidate") as invalidate:
+        # Echo of this process's own insert: already indexed, nothing is fetched
+        CHANGE_FEED.publish(RowChange("memories", "INSERT", "m-own", "p-index"))
+        assert not supabase.table.called
+
+        # Insert from another writer: one row is loaded into the index
+        CHANGE_FEED.publish(RowChange("memories", "INSERT", "m-new", "p-index"))
+        assert "m-new" in index and "m-own" in index
+        assert index.search(np.array([0.0, 1.0, 0.0]), k=1)[0]["title"] == "elsewhere"
+
+        # Patients without a loaded index are built fresh on their next search anyway
+        CHANGE_FEED.publish(RowChange("memories", "UPDATE", "m9", "p-other"))
+        assert supabase.table.call_count == 1
+
+        CHANGE_FEED.publish(RowChange("memories", "DELETE", "m-new", "p-index"))
+        assert "m-new" not in index
+        invalidate.assert_not_called()
+    MEMORY_INDEX.invalidate("p-index")
+
+
+# -----------------------------
+# Test: polling stand-in
+# -----------------------------
+class FakeQuery:
+    """Just enough of a PostgREST query builder (eq / gt / order / limit) over a list of rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.orders = []
+        self.max_rows = None
+
+    def select(self, columns, count=None):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row[column]) == str(value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: str(row[column]) > str(value))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.max_rows = n
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: str(row[column]), reverse=desc)
+        return MagicMock(data=rows[:self.max_rows], count=len(rows))
+
+
+def fake_table(rows):
+    supabase = MagicMock()
+    supabase.table.side_effect = lambda name: FakeQuery(rows)
+    return supabase
+
+
+def test_poll_table_reports_updates_once():
+    cursor = _TableCursor()
+    rows = [{"session_id": "s1", "patient_id": "p1", "updated_at": "2025-01-01T00:00:01"}]
+    assert poll_table(fake_table(rows), "sessions", cursor) == []  # first poll only sets the cursor
+    assert poll_table(fake_table(rows), "sessions", cursor) == []
+
+    rows.append({"session_id": "s2", "patient_id": "p2", "updated_at": "2025-01-01T00:00:05"})
+    changes = poll_table(fake_table(rows), "sessions", cursor)
+    assert [(c.op, c.id, c.patient_id) for c in changes] == [("UPDATE", "s2", "p2")]
+
+    # Another write in the same timestamp as the cursor is still reported, s2 is not repeated
+    rows.append({"session_id": "s3", "patient_id": "p1", "updated_at": "2025-01-01T00:00:05"})
+    changes = poll_table(fake_table(rows), "sessions", cursor)
+    assert [c.id for c in changes] == ["s3"]
+
+
+def test_poll_table_pages_through_rows_sharing_a_timestamp():
+    cursor = _TableCursor()
+    rows = [{"session_id": "s000", "patient_id": "p1", "updated_at": "2025-01-01T00:00:00"}]
+    poll_table(fake_table(rows), "sessions", cursor)
+
+    # One bulk write: more rows with the same updated_at than fit in a page
+    rows += [{"session_id": f"s{i:03d}", "patient_id": "p1", "updated_at": "2025-01-01T00:00:05"} for i in range(1, 8)]
+    rows.append({"session_id": "s100", "patient_id": "p2", "updated_at": "2025-01-01T00:00:09"})
+    with patch("NewMindmate.services.change_feed.POLL_BATCH", 3):
+        changes = poll_table(fake_table(rows), "sessions", cursor)
+    assert [c.id for c in changes] == [f"s{i:03d}" for i in range(1, 8)] + ["s100"]
+
+
+def test_poll_table_reports_deletes_table_wide():
+    cursor = _TableCursor()
+    rows = [
+        {"memory_id": "m1", "patient_id": "p1", "updated_at": "2025-01-01T00:00:01"},
+        {"memory_id": "m2", "patient_id": "p1", "updated_at": "2025-01-01T00:00:02"},
+    ]
+    poll_table(fake_table(rows), "memories", cursor)
+    changes = poll_table(fake_table(rows[:1]), "memories", cursor)
+    assert [(c.op, c.id) for c in changes] == [("DELETE", None)]
+
+
+# -----------------------------
+# Test: dashboard hub and WebSocket
+# -----------------------------
+@pytest.mark.asyncio
+async def test_hub_filters_by_patient_and_resyncs_slow_clients():
+    hub = DashboardHub(queue_size=2)
+    mine = hub.connect({"p1"})
+    everyone = hub.connect()
+    before = metrics.DASHBOARD_RESYNCS.value()
+
+    hub.publish(RowChange("sessions", "UPDATE", "s1", "p1"))
+    hub.publish(RowChange("sessions", "UPDATE", "s2", "p2"))
+    await asyncio.sleep(0)
+    assert (await mine.get())["id"] == "s1"
+    assert mine.queue.empty()
+
+    hub.publish(RowChange("sessions", "UPDATE", "s3", "p2"))  # everyone is now two behind
+    await asyncio.sleep(0)
+    assert await everyone.get() == {"type": "resync", "table": None}
+    assert metrics.DASHBOARD_RESYNCS.value() == before + 1
+
+    hub.publish(RowChange("memories", "TRUNCATE"))
+    await asyncio.sleep(0)
+    assert await mine.get() == {"type": "resync", "table": "memories"}
+
+    hub.disconnect(mine)
+    hub.disconnect(everyone)
+
+
+def test_dashboard_stream_pushes_changes():
+    with client.websocket_connect("/dashboard/stream?patient_id=p1") as websocket:
+        assert websocket.receive_json() == {"type": "subscribed", "patient_ids": ["p1"]}
+        assert metrics.DASHBOARD_SUBSCRIBERS.value() == 1
+
+        CHANGE_FEED.publish(RowChange("sessions", "UPDATE", "s9", "p9"))
+        CHANGE_FEED.publish(RowChange("memories", "INSERT", "m1", "p1", "2025-01-01T00:00:00"))
+        assert websocket.receive_json() == {
+            "type": "change", "table": "memories", "op": "INSERT", "id": "m1",
+            "patient_id": "p1", "updated_at": "2025-01-01T00:00:00",
+        }
+
+    # The stream disconnects from the hub once it notices the client left
+    for _ in range(50):
+        if metrics.DASHBOARD_SUBSCRIBERS.value() == 0:
+            break
+        time.sleep(0.01)
+    assert metrics.DASHBOARD_SUBSCRIBERS.value() == 0
@@ -0,0 +1,158 @@
+# test_compression.py
+import gzip
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from NewMindmate.services.compression import CompressionMiddleware, choose_encoding
+from NewMindmate.services.conditional import etag_matches, make_etag, not_modified, with_etag
+from NewMindmate.services.serialization import ContentNegotiationMiddleware, FastJSONResponse
+
+ROWS = [{"session_id": str(i), "transcript": "Patient: I remember the garden. " * 20} for i in range(50)]
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def client():
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/rows")
+    def rows():
+        response = FastJSONResponse(ROWS)
+        response.headers["ETag"] = '"abc123"'
+        return response
+
+    @app.get("/versioned")
+    def versioned(if_none_match: str = Header(None)):
+        etag = make_etag("rows", "50:x")
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return with_etag(FastJSONResponse(ROWS), etag)
+
+    @app.get("/small")
+    def small():
+        return {"status": "ok"}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"x" * 4096, b"y" * 4096]), media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, min_bytes=1024, encoders={"br": lambda b: b"br:" + b, "gzip": lambda b: gzip.compress(b, mtime=0)})
+    app.add_middleware(ContentNegotiationMiddleware)
+    return TestClient(app)
+
+
+def raw_get(client, path, accept_encoding):
+    """Response without httpx decoding the body"""
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+# -----------------------------
+# Test: negotiation
+# -----------------------------
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    (None, None),
+])
+def test_choose_encoding(header, expected):
+    encoders = {"br": None, "gzip": None}
+    assert choose_encoding(header, encoders) == expected
+
+
+# -----------------------------
+# Test: middleware
+# -----------------------------
+def test_large_json_is_compressed_with_tagged_etag(client):
+    response, body = raw_get(client, "/rows", "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body) == FastJSONResponse(ROWS).body
+    assert response.headers["etag"] == '"abc123-gzip"'
+    # The tagged ETag still revalidates against the uncompressed one
+    assert etag_matches(response.headers["etag"], '"abc123"')
+
+
+def test_prefers_server_order_on_ties(client):
+    response, body = raw_get(client, "/rows", "gzip, br")
+    assert response.headers["content-encoding"] == "br" and body.startswith(b"br:")
+
+
+def test_small_and_streamed_bodies_pass_through(client):
+    small, _ = raw_get(client, "/small", "gzip")
+    streamed, body = raw_get(client, "/stream", "gzip")
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in streamed.headers and len(body) == 8192
+
+
+# -----------------------------
+# Test: MessagePack negotiation
+# -----------------------------
+def test_msgpack_when_accepted(client):
+    msgpack = pytest.importorskip("msgpack")
+
+    response = client.get("/rows", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "Accept" in response.headers["vary"]
+    assert msgpack.unpackb(response.content) == ROWS
+
+
+def test_json_by_default(client):
+    response = client.get("/rows", headers={"Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == ROWS
+
+
+# -----------------------------
+# Test: ETags across encodings and media types
+# -----------------------------
+def test_not_modified_carries_the_tag_of_the_cached_representation(client):
+    first, _ = raw_get(client, "/versioned", "gzip")
+    tagged = first.headers["etag"]
+    assert tagged.endswith('-gzip"')
+
+    revalidated = client.get("/versioned", headers={"Accept-Encoding": "gzip", "If-None-Match": tagged})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == tagged
+    assert "Accept-Encoding" in revalidated.headers["vary"]
+
+    # A client holding the uncompressed tag gets that tag back
+    bare = tagged.replace("-gzip", "")
+    assert client.get("/versioned", headers={"Accept-Encoding": "gzip", "If-None-Match": bare}).headers["etag"] == bare
+
+
+def test_uncompressed_responses_still_vary_on_accept_encoding(client):
+    small, _ = raw_get(client, "/small", "gzip")
+    identity, _ = raw_get(client, "/rows", "identity")
+    etag = client.get("/versioned", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    revalidated = client.get("/versioned", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+
+    for response in (small, identity, revalidated):
+        assert "content-encoding" not in response.headers
+        assert "Accept-Encoding" in response.headers["vary"]
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+
+
+def test_msgpack_and_json_have_different_etags(client):
+    pytest.importorskip("msgpack")
+
+    json_tag = client.get("/versioned", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    msgpack_tag = client.get(
+        "/versioned", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"}
+    ).headers["etag"]
+
+    assert json_tag != msgpack_tag
+    assert client.get(
+        "/versioned", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity", "If-None-Match": json_tag}
+    ).status_code == 200
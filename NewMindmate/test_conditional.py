@@ -0,0 +1,95 @@
+# test_conditional.py
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services.conditional import etag_matches, make_etag, table_version
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def mock_supabase():
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        supabase = MagicMock()
+        mock_get.return_value = supabase
+        yield supabase
+
+
+def set_version(supabase, count, latest):
+    probe = supabase.table.return_value.select.return_value.order.return_value.limit.return_value.execute.return_value
+    probe.count = count
+    probe.data = [{"updated_at": latest}] if count else []
+
+
+def full_select(supabase):
+    """Selects other than the version probe"""
+    return [c for c in supabase.table.return_value.select.call_args_list if c.args[0] != "updated_at"]
+
+
+# -----------------------------
+# Test: helpers
+# -----------------------------
+def test_table_version_is_one_probe_query():
+    supabase = MagicMock()
+    set_version(supabase, 3, "2025-01-02T00:00:00+00:00")
+
+    assert table_version(supabase, "sessions") == "3:2025-01-02T00:00:00+00:00"
+    supabase.table.return_value.select.assert_called_once_with("updated_at", count="exact")
+    supabase.table.return_value.select.return_value.order.assert_called_once_with("updated_at", desc=True)
+
+
+def test_etag_matching():
+    etag = make_etag("sessions", "3:x")
+    assert etag.startswith('"') and etag == make_etag("sessions", "3:x")
+    assert etag != make_etag("sessions", "4:x")
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+
+
+# -----------------------------
+# Test: endpoints
+# -----------------------------
+def test_sessions_304_skips_full_query(mock_supabase):
+    set_version(mock_supabase, 2, "2025-01-02T00:00:00+00:00")
+    mock_supabase.table.return_value.select.return_value.execute.return_value.data = []
+
+    first = client.get("/sessions")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and full_select(mock_supabase)
+
+    mock_supabase.table.return_value.select.reset_mock()
+    second = client.get("/sessions", headers={"If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert full_select(mock_supabase) == []
+
+
+def test_changed_rows_change_etag(mock_supabase):
+    set_version(mock_supabase, 2, "2025-01-02T00:00:00+00:00")
+    mock_supabase.table.return_value.select.return_value.execute.return_value.data = []
+    etag = client.get("/memories").headers["etag"]
+
+    set_version(mock_supabase, 2, "2025-01-03T00:00:00+00:00")
+    assert client.get("/memories", headers={"If-None-Match": etag}).status_code == 200
+
+    set_version(mock_supabase, 1, "2025-01-02T00:00:00+00:00")
+    assert client.get("/memories", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_embedding_format_is_part_of_etag(mock_supabase):
+    set_version(mock_supabase, 2, "2025-01-02T00:00:00+00:00")
+    mock_supabase.table.return_value.select.return_value.execute.return_value.data = []
+
+    base64 = client.get("/memories").headers["etag"]
+    floats = client.get("/memories?embedding_format=json").headers["etag"]
+
+    assert base64 != floats
@@ -0,0 +1,164 @@
+# test_downsampling.py
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services import metrics
+from NewMindmate.services.change_feed import CHANGE_FEED, RowChange
+from NewMindmate.services.downsampling import (
+    SERIES_CACHE, SeriesCache, SeriesPyramid, downsample_points, lttb, to_epoch,
+)
+
+client = TestClient(app)
+
+
+def reference_lttb(x, y, n_out):
+    """Textbook LTTB, one point at a time"""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n - 1)
+        if i == n_out - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = np.mean(x[next_lo:next_hi]), np.mean(y[next_lo:next_hi])
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+
+# -----------------------------
+# Test: LTTB
+# -----------------------------
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 2.0, 1000))
+    y = rng.normal(size=1000)
+    for n_out in (3, 10, 97, 500):
+        assert lttb(x, y, n_out).tolist() == reference_lttb(x, y, n_out)
+
+
+def test_lttb_keeps_spikes_and_endpoints():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 50
+    y[811] = -30
+    kept = lttb(x, y, 20)
+
+    assert len(kept) == 20 and kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept and 811 in kept
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_short_series_and_bad_sizes():
+    x = np.arange(5, dtype=float)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        lttb(x, x, 2)
+
+
+# -----------------------------
+# Test: pyramid queries
+# -----------------------------
+def test_pyramid_levels_and_queries():
+    n = 10000
+    x = np.arange(n, dtype=float)
+    y = np.sin(x / 50)
+    pyramid = SeriesPyramid(x, y)
+    assert [len(level) for level in pyramid.levels] == [10000, 2500, 625, 156]
+
+    assert len(pyramid.query()) == n
+    assert len(pyramid.query(200)) == 200
+
+    # A narrow range falls back to a finer level with enough points in it
+    in_range = pyramid.query(100, start=1000, end=1400)
+    assert len(in_range) == 100
+    assert in_range.min() >= 1000 and in_range.max() <= 1400
+    assert pyramid.query(None, start=1000, end=1009).tolist() == list(range(1000, 1010))
+
+
+def test_pyramid_maps_back_to_input_order():
+    # Newest first, like rows ordered by session_date desc
+    x = np.arange(300, dtype=float)[::-1]
+    pyramid = SeriesPyramid(x, np.ones(300), min_points=1000)
+    positions = pyramid.query(10)
+    assert positions[0] == 299 and positions[-1] == 0
+
+
+def test_downsample_points_keeps_order_and_range():
+    base = datetime(2024, 1, 1)
+    points = [{"timestamp": (base - timedelta(days=i)).isoformat(), "score": float(i % 7)} for i in range(400)]
+
+    kept = downsample_points(points, max_points=50, start=base - timedelta(days=299))
+    assert len(kept) == 50
+    times = [to_epoch(p["timestamp"]) for p in kept]
+    assert times == sorted(times, reverse=True)
+    assert min(times) >= to_epoch(base - timedelta(days=299))
+    assert downsample_points(points) is points
+
+
+# -----------------------------
+# Test: per-patient cache
+# -----------------------------
+def test_series_cache_rebuilds_on_new_version():
+    cache = SeriesCache(max_entries=2, name="series_test")
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert cache.get_or_build("p1", "3:a", build) == 1
+    assert cache.get_or_build("p1", "3:a", build) == 1
+    assert cache.get_or_build("p1", "4:b", build) == 2
+    assert metrics.CACHE_REQUESTS.value("series_test", "hit") == 1
+
+    cache.get_or_build("p2", "1:a", build)
+    cache.get_or_build("p3", "1:a", build)
+    assert "p1" not in cache and "p3" in cache
+
+
+def test_session_changes_drop_cached_series():
+    SERIES_CACHE.get_or_build("p-series", "1:a", lambda: "series")
+    CHANGE_FEED.publish(RowChange("sessions", "INSERT", "s1", "p-series"))
+    assert "p-series" not in SERIES_CACHE
+
+
+# -----------------------------
+# Test: analytics route
+# -----------------------------
+def test_cognitive_analytics_downsamples_series():
+    patient_id = str(uuid4())
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"patient_id": patient_id, "name": "Ann"}
+    ]
+    base = datetime(2024, 1, 1)
+    series = [{"timestamp": (base + timedelta(days=i)).isoformat(), "score": float(i % 10)} for i in range(1000)]
+    dashboard = {"patientId": patient_id, "memoryMetrics": {"shortTermRecall": series, "workingMemory": []}}
+
+    with patch("NewMindmate.routes.cognitive_routes.supabase", supabase), \
+         patch("NewMindmate.routes.cognitive_routes.get_patient_dashboard", AsyncMock(return_value=dashboard)):
+        response = client.get(
+            f"/cognitive/patients/{patient_id}/cognitive-data",
+            params={"max_points": 100, "end": (base + timedelta(days=499)).isoformat()},
+        )
+        invalid = client.get(f"/cognitive/patients/{patient_id}/analytics", params={"max_points": 2})
+
+    assert response.status_code == 200
+    recall = response.json()["memoryMetrics"]["shortTermRecall"]
+    assert len(recall) == 100
+    assert recall[0] == series[0] and recall[-1] == series[499]
+    assert response.json()["memoryMetrics"]["workingMemory"] == []
+    assert invalid.status_code == 422
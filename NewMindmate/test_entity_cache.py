@@ -0,0 +1,166 @@
+# test_entity_cache.py
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services import metrics
+from NewMindmate.services.entity_cache import ENTITY_CACHE, EntityCache, RedisBackend
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Loader:
+    """Counts database loads and serves whatever row is current"""
+
+    def __init__(self, row):
+        self.row = row
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.row) if self.row is not None else None
+
+
+# -----------------------------
+# Test: read-through, TTL and LRU
+# -----------------------------
+def test_rows_are_served_from_cache_until_ttl():
+    clock = FakeClock()
+    cache = EntityCache(max_entries=10, ttl=60, clock=clock)
+    load = Loader({"patient_id": "p1", "name": "Ann"})
+    before = metrics.CACHE_REQUESTS.value("entity_patients", "hit")
+
+    assert cache.get_or_load("patients", "p1", load)["name"] == "Ann"
+    assert cache.get_or_load("patients", "p1", load)["name"] == "Ann"
+    assert load.calls == 1
+    assert metrics.CACHE_REQUESTS.value("entity_patients", "hit") == before + 1
+
+    clock.now = 61
+    cache.get_or_load("patients", "p1", load)
+    assert load.calls == 2
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EntityCache(max_entries=2, ttl=60)
+    for entity_id in ("a", "b"):
+        cache.get_or_load("sessions", entity_id, Loader({"session_id": entity_id}))
+    cache.get_or_load("sessions", "a", Loader(None))  # touch a
+    cache.get_or_load("sessions", "c", Loader({"session_id": "c"}))
+
+    assert ("sessions", "a") in cache and ("sessions", "c") in cache
+    assert ("sessions", "b") not in cache
+
+
+def test_misses_are_not_cached():
+    cache = EntityCache(ttl=60)
+    load = Loader(None)
+    assert cache.get_or_load("memories", "m1", load) is None
+
+    load.row = {"memory_id": "m1"}
+    assert cache.get_or_load("memories", "m1", load) == {"memory_id": "m1"}
+
+
+def test_invalidate_and_overlapping_load():
+    cache = EntityCache(ttl=60)
+    load = Loader({"session_id": "s1", "transcript": "old"})
+    cache.get_or_load("sessions", "s1", load)
+
+    load.row = {"session_id": "s1", "transcript": "new"}
+    cache.invalidate("sessions", "s1")
+    assert cache.get_or_load("sessions", "s1", load)["transcript"] == "new"
+
+    # A write lands while a read is loading the previous version
+    def slow_old_read():
+        cache.invalidate("sessions", "s1")
+        return {"session_id": "s1", "transcript": "stale"}
+
+    cache.invalidate("sessions", "s1")
+    assert cache.get_or_load("sessions", "s1", slow_old_read)["transcript"] == "stale"
+    assert ("sessions", "s1") not in cache
+
+
+# -----------------------------
+# Test: shared backend (Redis stand-in)
+# -----------------------------
+@pytest.fixture
+def standin_url():
+    pytest.importorskip("redis")
+    from NewMindmate import redis_standin
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(redis_standin.serve("127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}/0"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    redis_standin._data.clear()
+
+
+def test_workers_share_rows_and_invalidations(standin_url):
+    clock = FakeClock()
+    worker_a = EntityCache(ttl=60, backend=RedisBackend(standin_url), local_ttl=2, clock=clock)
+    worker_b = EntityCache(ttl=60, backend=RedisBackend(standin_url), local_ttl=2, clock=clock)
+    load = Loader({"patient_id": "p1", "name": "Ann"})
+
+    worker_a.get_or_load("patients", "p1", load)
+    assert worker_b.get_or_load("patients", "p1", load)["name"] == "Ann"
+    assert load.calls == 1
+
+    load.row = {"patient_id": "p1", "name": "Ann Smith"}
+    worker_b.invalidate("patients", "p1")
+    clock.now = 3  # worker A's local copy expires
+    assert worker_a.get_or_load("patients", "p1", load)["name"] == "Ann Smith"
+    assert load.calls == 2
+
+
+def test_backend_errors_degrade_to_misses():
+    pytest.importorskip("redis")
+    cache = EntityCache(ttl=60, backend=RedisBackend("redis://127.0.0.1:1/0"))
+    load = Loader({"patient_id": "p1"})
+
+    assert cache.get_or_load("patients", "p1", load) == {"patient_id": "p1"}
+    cache.invalidate("patients", "p1")
+
+
+# -----------------------------
+# Test: upload_audio existence checks
+# -----------------------------
+def test_upload_audio_reuses_cached_patient_lookup():
+    patient_id = str(uuid4())
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        supabase = MagicMock()
+        mock_get.return_value = supabase
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {"patient_id": patient_id, "name": "Ann"}
+        ]
+        bucket = supabase.storage.from_.return_value
+        bucket.list.return_value = []
+        bucket.upload.return_value = ({"path": "audio/x.wav"}, None)
+        bucket.get_public_url.return_value = "https://cdn/audio/x.wav"
+
+        for body in (b"RIFF one", b"RIFF two"):
+            response = client.post(
+                "/audio/upload",
+                files={"file": ("a.wav", BytesIO(body), "audio/wav")},
+                data={"patient_id": patient_id, "normalize": "false"},
+            )
+            assert response.status_code == 200
+
+    patient_lookups = [c for c in supabase.table.call_args_list if c.args == ("patients",)]
+    assert len(patient_lookups) == 1
+    ENTITY_CACHE.invalidate("patients", patient_id)
@@ -1,8 +1,10 @@
+import asyncio
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
 
 from NewMindmate.get_all_call_history import app  # ✅ correct import
+from NewMindmate.services import beyond_presence_client as beyond_presence
 
 client = TestClient(app)
 
@@ -13,13 +15,29 @@ def mock_beyondpresence_response():
         {"message": "Hi there!", "sent_at": "2025-11-09T15:30:02Z", "sender": "ai"}
     ]
 
-@patch("NewMindmate.get_all_call_history.requests.get")
-def test_get_call_messages_success(mock_get, mock_beyondpresence_response):
-    mock_response = MagicMock()
-    mock_response.json.return_value = mock_beyondpresence_response
-    mock_response.status_code = 200
-    mock_response.raise_for_status = MagicMock()
-    mock_get.return_value = mock_response
+@pytest.fixture
+def upstream(monkeypatch):
+    """Route Beyond Presence calls to a handler; records requested paths"""
+    state = {"handler": None, "paths": []}
+
+    def handle(request):
+        state["paths"].append(request.url.path + (f"?{request.url.query.decode()}" if request.url.query else ""))
+        return state["handler"](request)
+
+    monkeypatch.setattr(
+        beyond_presence, "get_client",
+        lambda: httpx.AsyncClient(base_url=beyond_presence.BEYOND_PRESENCE_BASE_URL, transport=httpx.MockTransport(handle))
+    )
+    beyond_presence.MESSAGE_CACHE.clear()
+    yield state
+    beyond_presence.MESSAGE_CACHE.clear()
+
+def test_get_call_messages_success(upstream, mock_beyondpresence_response):
+    def handler(request):
+        if request.url.path.endswith("/messages"):
+            return httpx.Response(200, json=mock_beyondpresence_response)
+        return httpx.Response(200, json={"id": "test-call", "ended_at": None})
+    upstream["handler"] = handler
 
     response = client.get(
         "/calls/test-call/messages",
@@ -30,3 +48,63 @@ def test_get_call_messages_success(mock_get, mock_beyondpresence_response):
     data = response.json()
     assert data["call_id"] == "test-call"
     assert len(data["messages"]) == 2
+
+def test_ended_call_is_paginated_and_cached(upstream, mock_beyondpresence_response):
+    first, second = mock_beyondpresence_response
+    def handler(request):
+        if not request.url.path.endswith("/messages"):
+            return httpx.Response(200, json={"id": "done", "ended_at": "2025-11-09T16:00:00Z"})
+        if request.url.params.get("cursor") == "p2":
+            return httpx.Response(200, json={"data": [second], "next_cursor": None})
+        return httpx.Response(200, json={"data": [first], "next_cursor": "p2"})
+    upstream["handler"] = handler
+
+    for _ in range(2):
+        response = client.get("/calls/done/messages", headers={"x-api-key": "fake_api_key"})
+        assert response.json()["messages"] == mock_beyondpresence_response
+
+    message_requests = [p for p in upstream["paths"] if "/messages" in p]
+    assert message_requests == ["/v1/calls/done/messages", "/v1/calls/done/messages?cursor=p2"]
+
+def test_call_ending_mid_read_is_not_cached(upstream, mock_beyondpresence_response):
+    state = {"ended": False}
+    async def handler(request):
+        if not request.url.path.endswith("/messages"):
+            await asyncio.sleep(0.05)  # status answers after the pages were read
+            return httpx.Response(200, json={"id": "live", "ended_at": "2025-11-09T16:00:00Z" if state["ended"] else None})
+        # The call ends right after its messages so far were read
+        state["ended"] = True
+        return httpx.Response(200, json=mock_beyondpresence_response[:1])
+    upstream["handler"] = handler
+
+    response = client.get("/calls/live/messages", headers={"x-api-key": "fake_api_key"})
+    assert len(response.json()["messages"]) == 1
+    assert beyond_presence.MESSAGE_CACHE.get(("fake_api_key", "live")) is None
+
+def test_upstream_error_status_is_forwarded(upstream):
+    upstream["handler"] = lambda request: httpx.Response(404, json={"detail": "not found"})
+
+    response = client.get("/calls/missing/messages", headers={"x-api-key": "fake_api_key"})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_fetch_many_bounds_concurrency(monkeypatch):
+    active = {"now": 0, "peak": 0}
+
+    async def fake_get_call_messages(call_id, api_key):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        if call_id == "bad":
+            raise beyond_presence.BeyondPresenceError(500, "boom")
+        return [{"message": call_id}]
+
+    monkeypatch.setattr(beyond_presence, "get_call_messages", fake_get_call_messages)
+    calls, errors = await beyond_presence.fetch_many_call_messages(
+        [f"c{i}" for i in range(10)] + ["bad", "c0"], "key", concurrency=3
+    )
+
+    assert len(calls) == 10 and calls["c3"] == [{"message": "c3"}]
+    assert errors == {"bad": "boom"}
+    assert active["peak"] == 3
@@ -0,0 +1,227 @@
+# test_memory_index.py
+import numpy as np
+import pytest
+import threading
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from NewMindmate.db.memory_index import (
+    MEMORY_INDEX,
+    MemoryIndexCache,
+    PatientMemoryIndex,
+    QuantizedPatientMemoryIndex,
+    build_patient_index,
+)
+from NewMindmate.db.quantization import quantized_columns
+from NewMindmate.db.vector_utils import (
+    VECTOR_DIM,
+    find_duplicate_groups,
+    merge_memory_fields,
+    search_similar_memories,
+    store_memory_embedding,
+    to_pgvector,
+)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(7)
+    return rng.standard_normal((50, VECTOR_DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def patient_id():
+    pid = str(uuid4())
+    yield pid
+    MEMORY_INDEX.invalidate(pid)
+
+
+@pytest.fixture
+def mock_supabase(vectors, patient_id):
+    client = MagicMock()
+    rows = [
+        {"memory_id": f"m{i}", "patient_id": patient_id, "title": f"Memory {i}", "embedding": to_pgvector(v)}
+        for i, v in enumerate(vectors)
+    ]
+    rows.append({"memory_id": "no-embedding", "patient_id": patient_id, "title": "Text only", "embedding": None})
+    client.table.return_value.select.return_value.eq.return_value.execute.return_value.data = rows
+    client.table.return_value.insert.return_value.execute.return_value.data = [{"memory_id": "new"}]
+    return client
+
+
+# -----------------------------
+# Test: top-k matches brute-force cosine similarity
+# -----------------------------
+def test_search_matches_brute_force(mock_supabase, vectors, patient_id):
+    query = vectors[3] + 0.1 * vectors[10]
+    results = search_similar_memories(mock_supabase, patient_id, query, limit=5)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+
+    assert [r["memory_id"] for r in results] == [f"m{i}" for i in expected]
+    assert results[0]["memory_id"] == "m3"
+    assert "embedding" not in results[0]
+    assert results[0]["similarity"] >= results[-1]["similarity"]
+
+
+def test_index_is_built_once(mock_supabase, vectors, patient_id):
+    search_similar_memories(mock_supabase, patient_id, vectors[0])
+    search_similar_memories(mock_supabase, patient_id, vectors[1])
+    assert mock_supabase.table.return_value.select.call_count == 1
+    assert len(MEMORY_INDEX.get(patient_id)) == len(vectors)
+
+
+# -----------------------------
+# Test: inserts update a loaded index incrementally
+# -----------------------------
+def test_store_updates_loaded_index(mock_supabase, vectors, patient_id):
+    search_similar_memories(mock_supabase, patient_id, vectors[0])
+
+    new_vector = np.ones(VECTOR_DIM, dtype=np.float32)
+    memory_id = store_memory_embedding(mock_supabase, patient_id, "New", "Fresh memory", new_vector)
+    results = search_similar_memories(mock_supabase, patient_id, new_vector, limit=1)
+
+    assert results[0]["memory_id"] == memory_id
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert mock_supabase.table.return_value.select.call_count == 1
+
+
+# -----------------------------
+# Test: remove and LRU eviction
+# -----------------------------
+def test_remove_swaps_last_row(vectors):
+    index = PatientMemoryIndex("p", VECTOR_DIM)
+    for i, v in enumerate(vectors[:4]):
+        index.add(f"m{i}", v)
+
+    assert index.remove("m1")
+    assert not index.remove("m1")
+    assert len(index) == 3
+    assert index.search(vectors[3], k=1)[0]["memory_id"] == "m3"
+
+
+def test_lru_eviction_by_bytes(vectors):
+    one_index_bytes = PatientMemoryIndex("x", VECTOR_DIM, capacity=10).nbytes
+    cache = MemoryIndexCache(max_bytes=one_index_bytes * 2)
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"memory_id": f"m{i}", "embedding": to_pgvector(v)} for i, v in enumerate(vectors[:10])
+    ]
+
+    cache.get_or_build(supabase, "a")
+    cache.get_or_build(supabase, "b")
+    cache.get("a")  # a is now most recently used
+    cache.get_or_build(supabase, "c")
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+
+
+def test_insert_during_build_is_not_lost(vectors):
+    cache = MemoryIndexCache(max_bytes=1 << 30)
+    loading, release = threading.Event(), threading.Event()
+
+    def load():
+        # The build read the table before the insert landed
+        loading.set()
+        release.wait(5)
+        return MagicMock(data=[{"memory_id": f"m{i}", "embedding": to_pgvector(v)} for i, v in enumerate(vectors[:5])])
+
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.side_effect = load
+
+    build = threading.Thread(target=cache.get_or_build, args=(supabase, "p"))
+    build.start()
+    assert loading.wait(5)
+    insert = threading.Thread(target=cache.add, args=("p", "new", vectors[10]))
+    insert.start()
+    insert.join(0.05)
+    release.set()
+    build.join(5)
+    insert.join(5)
+
+    assert cache.get("p").search(vectors[10], k=1)[0]["memory_id"] == "new"
+
+
+# -----------------------------
+# Test: quantized index reranks with full-precision vectors
+# -----------------------------
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_quantized_rerank_returns_exact_scores(vectors, mode):
+    by_id = {f"m{i}": v for i, v in enumerate(vectors)}
+    index = QuantizedPatientMemoryIndex(
+        "p", VECTOR_DIM, mode, lambda ids: {i: by_id[i] for i in ids}, oversample=len(vectors)
+    )
+    for memory_id, vector in by_id.items():
+        index.add(memory_id, vector)
+
+    query = vectors[5]
+    results = index.search(query, k=3)
+
+    assert results[0]["memory_id"] == "m5"
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert index.nbytes < PatientMemoryIndex("p", VECTOR_DIM, capacity=64).nbytes / 3
+
+
+def test_build_quantized_index_from_stored_codes(vectors, patient_id):
+    rows = []
+    for i, v in enumerate(vectors[:5]):
+        row = {"memory_id": f"m{i}", "patient_id": patient_id, "title": f"Memory {i}"}
+        if i < 4:
+            row.update(quantized_columns(v, "int8"))
+        rows.append(row)
+
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = rows
+    # Rerank / backfill fetch of full vectors
+    supabase.table.return_value.select.return_value.in_.return_value.execute.return_value.data = [
+        {"memory_id": f"m{i}", "embedding": to_pgvector(v)} for i, v in enumerate(vectors[:5])
+    ]
+
+    index = build_patient_index(supabase, patient_id, mode="int8")
+
+    assert isinstance(index, QuantizedPatientMemoryIndex)
+    assert len(index) == 5  # m4 had no codes and was quantized from its embedding
+    assert index.search(vectors[4], k=1)[0]["memory_id"] == "m4"
+    assert "embedding_quantized" not in index.search(vectors[0], k=1)[0]
+
+
+# -----------------------------
+# Test: near-duplicate suppression
+# -----------------------------
+def test_store_merges_near_duplicate(mock_supabase, vectors, patient_id):
+    rows = mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data
+    rows[3].update({"tags": ["family"], "significance_level": 4})
+    near = vectors[3] + 0.01 * vectors[4]
+
+    memory_id = store_memory_embedding(
+        mock_supabase, patient_id, "Boston again", "Same trip", near, tags=["travel", "family"], significance_level=6
+    )
+
+    assert memory_id == "m3"
+    mock_supabase.table.return_value.insert.assert_not_called()
+    changes = mock_supabase.table.return_value.update.call_args[0][0]
+    assert changes == {"tags": ["family", "travel"], "significance_level": 7}
+    hit = search_similar_memories(mock_supabase, patient_id, vectors[3], limit=1)[0]
+    assert hit["significance_level"] == 7 and hit["tags"] == ["family", "travel"]
+
+
+def test_store_without_dedupe_inserts(mock_supabase, vectors, patient_id):
+    memory_id = store_memory_embedding(mock_supabase, patient_id, "Copy", "Copy", vectors[3], dedupe=False)
+    assert memory_id != "m3"
+    mock_supabase.table.return_value.insert.assert_called_once()
+
+
+def test_find_duplicate_groups(vectors):
+    batch = np.vstack([vectors[0], vectors[1], vectors[0] * 2, vectors[1] + 0.01 * vectors[2], vectors[0]])
+
+    assert find_duplicate_groups(batch, 0.95, block=2) == {0: [2, 4], 1: [3]}
+
+
+def test_merge_memory_fields_caps_significance():
+    merged = merge_memory_fields({"tags": None, "significance_level": 9}, [{"tags": ["a"]}, {"tags": ["a", "b"]}])
+    assert merged == {"tags": ["a", "b"], "significance_level": 10}
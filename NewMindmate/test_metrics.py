@@ -0,0 +1,93 @@
+# test_metrics.py
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+from datetime import datetime
+
+from NewMindmate.main import app
+from NewMindmate.services import metrics
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def mock_supabase():
+    """Fixture to mock Supabase client for all tests"""
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        mock_client = MagicMock()
+        mock_get.return_value = mock_client
+        yield mock_client
+
+
+# -----------------------------
+# Test: /metrics exposes Prometheus text format
+# -----------------------------
+def test_metrics_endpoint_format():
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE mindmate_http_request_duration_seconds histogram" in body
+    assert 'route="/health"' in body
+
+
+# -----------------------------
+# Test: route label uses the path template, not the raw path
+# -----------------------------
+def test_route_label_is_template(mock_supabase):
+    patient_id = str(uuid4())
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = []
+
+    before = metrics.HTTP_REQUEST_DURATION.count("GET", "/doctor-records/{patient_id}", "200")
+    client.get(f"/doctor-records/{patient_id}")
+    after = metrics.HTTP_REQUEST_DURATION.count("GET", "/doctor-records/{patient_id}", "200")
+
+    assert after == before + 1
+    assert patient_id not in client.get("/metrics").text
+
+
+# -----------------------------
+# Test: Supabase wrapper records latency, rows and errors per table
+# -----------------------------
+def test_instrumented_supabase_execute():
+    raw = MagicMock()
+    raw.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"patient_id": str(uuid4()), "name": "A", "created_at": datetime.now().isoformat()},
+        {"patient_id": str(uuid4()), "name": "B", "created_at": datetime.now().isoformat()},
+    ]
+    supabase = metrics.instrument_supabase(raw)
+
+    before = metrics.SUPABASE_QUERY_ROWS.count("patients", "select")
+    result = supabase.table("patients").select("*").eq("name", "A").execute()
+
+    assert len(result.data) == 2
+    assert metrics.SUPABASE_QUERY_ROWS.count("patients", "select") == before + 1
+    assert metrics.SUPABASE_QUERY_ROWS.sum("patients", "select") >= 2
+
+    raw.table.return_value.delete.return_value.eq.return_value.execute.side_effect = RuntimeError("boom")
+    errors_before = metrics.SUPABASE_QUERY_ERRORS.value("patients", "delete")
+    with pytest.raises(RuntimeError):
+        supabase.table("patients").delete().eq("name", "A").execute()
+    assert metrics.SUPABASE_QUERY_ERRORS.value("patients", "delete") == errors_before + 1
+
+
+# -----------------------------
+# Test: upstream tracking counts error statuses
+# -----------------------------
+def test_track_upstream_error_status():
+    response = MagicMock()
+    response.status_code = 503
+    response.content = b"unavailable"
+
+    before = metrics.UPSTREAM_REQUEST_ERRORS.value("cognitive_api", "/test")
+    with metrics.track_upstream("cognitive_api", "/test") as call:
+        call.response(response)
+
+    assert metrics.UPSTREAM_REQUEST_ERRORS.value("cognitive_api", "/test") == before + 1
+    assert metrics.UPSTREAM_RESPONSE_BYTES.sum("cognitive_api", "/test") >= len(b"unavailable")
@@ -0,0 +1,81 @@
+# test_serialization.py
+import json
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+from datetime import datetime
+
+from NewMindmate.main import app
+from NewMindmate.schemas import SessionResponse
+from NewMindmate.services.serialization import dumps, trusted_rows, construct_trusted
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def mock_supabase():
+    """Fixture to mock Supabase client for all tests"""
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        mock_client = MagicMock()
+        mock_get.return_value = mock_client
+        yield mock_client
+
+
+def session_row(**overrides):
+    row = {
+        "session_id": str(uuid4()),
+        "patient_id": str(uuid4()),
+        "session_date": datetime.now().isoformat(),
+        "transcript": "Patient talked about Boston.",
+        "overall_score": 80.0,
+        "created_at": datetime.now().isoformat(),
+        "audio_url": "https://example.com/a.wav",
+    }
+    row.update(overrides)
+    return row
+
+
+# -----------------------------
+# Test: trusted rows are projected onto the response model
+# -----------------------------
+def test_trusted_rows_projection():
+    row = session_row()
+    projected = trusted_rows([row], SessionResponse)[0]
+
+    assert set(projected) == set(SessionResponse.model_fields)
+    assert "audio_url" not in projected
+    assert projected["exercise_type"] == "memory_recall"  # default filled in
+    assert projected["notable_events"] == []
+
+
+def test_construct_trusted_skips_validation():
+    row = session_row()
+    model = construct_trusted(SessionResponse, row)
+    # No coercion: trusted rows keep their database representation
+    assert model.session_id == row["session_id"]
+
+
+# -----------------------------
+# Test: dumps handles UUIDs, datetimes and models
+# -----------------------------
+def test_dumps_types():
+    uid = uuid4()
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    body = json.loads(dumps({"id": uid, "at": now}))
+    assert body == {"id": str(uid), "at": "2024-05-01T12:00:00"}
+
+
+# -----------------------------
+# Test: list endpoint returns trusted rows
+# -----------------------------
+def test_list_sessions_trusted(mock_supabase):
+    rows = [session_row(), session_row()]
+    mock_supabase.table.return_value.select.return_value.execute.return_value.data = rows
+
+    response = client.get("/sessions")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [d["session_id"] for d in data] == [r["session_id"] for r in rows]
+    assert all("audio_url" not in d for d in data)
@@ -0,0 +1,69 @@
+# test_startup.py
+import subprocess
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+
+from NewMindmate import main
+from NewMindmate.services.startup import lazy_import
+
+
+# -----------------------------
+# Test: readiness endpoint
+# -----------------------------
+def test_ready_reports_503_until_warm(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main, "WARMUP_STEPS", [("slow", lambda: release.wait(5)), ("fast", lambda: None)])
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        pending = client.get("/ready")
+        assert pending.status_code == 503 and pending.json()["ready"] is False
+
+        release.set()
+        for _ in range(500):
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+        assert response.json()["ready"] is True
+        assert set(response.json()["steps"]) == {"slow", "fast"}
+
+
+def test_failed_warm_up_step_keeps_instance_unready(monkeypatch):
+    def broken():
+        raise RuntimeError("Missing Supabase credentials in .env file")
+    monkeypatch.setattr(main, "WARMUP_STEPS", [("supabase_client", broken)])
+
+    with TestClient(main.app) as client:
+        for _ in range(100):
+            report = client.get("/ready").json()
+            if report["error"]:
+                break
+        assert client.get("/ready").status_code == 503
+        assert report["error"].startswith("supabase_client:")
+
+
+# -----------------------------
+# Test: lazy imports
+# -----------------------------
+def test_importing_app_defers_numpy_and_supabase():
+    code = (
+        "import sys; import NewMindmate.main; "
+        "print(any(m.startswith(('numpy.', 'supabase', 'postgrest')) for m in sys.modules))"
+    )
+    env = {"SUPABASE_URL": "", "SUPABASE_SERVICE_KEY": "", "PATH": ""}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=main.Path(main.__file__).parents[1])
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
+
+
+def test_lazy_import_loads_on_first_use():
+    json_module = lazy_import("json")  # already imported: returned as is
+    assert json_module is sys.modules["json"]
+
+    sys.modules.pop("colorsys", None)
+    module = lazy_import("colorsys")
+    assert "colorsys" not in sys.modules
+    assert module.rgb_to_hsv(1, 0, 0) == (0.0, 1.0, 1)
+    assert "colorsys" in sys.modules
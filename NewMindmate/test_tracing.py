@@ -0,0 +1,89 @@
+# test_tracing.py
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services import tracing
+from NewMindmate.services.metrics import instrument_supabase
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def exported_spans():
+    """Route finished spans into a list for the duration of a test"""
+    spans = []
+    tracing.configure(sink=spans.extend)
+    yield spans
+    tracing.configure()
+
+
+@pytest.fixture
+def mock_supabase():
+    """Fixture to mock Supabase client, instrumented like the real one"""
+    with patch("NewMindmate.main.get_supabase") as mock_get:
+        mock_client = MagicMock()
+        mock_get.return_value = instrument_supabase(mock_client)
+        yield mock_client
+
+
+# -----------------------------
+# Test: traceparent parsing
+# -----------------------------
+def test_parse_traceparent():
+    context = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    assert context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert context.span_id == "00f067aa0ba902b7"
+    assert context.sampled is True
+
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+# -----------------------------
+# Test: request span continues incoming trace and parents DB spans
+# -----------------------------
+def test_request_and_supabase_spans_share_trace(exported_spans, mock_supabase):
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = []
+    incoming = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    response = client.get(f"/doctor-records/{uuid4()}", headers={"traceparent": incoming})
+    tracing.flush()
+
+    assert response.status_code == 200
+    assert response.headers["traceparent"].split("-")[1] == "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    server = next(s for s in exported_spans if s.get("kind") == "SERVER")
+    db = next(s for s in exported_spans if s["name"] == "supabase select doctor_records")
+    assert server["name"] == "GET /doctor-records/{patient_id}"
+    assert server["parentId"] == "00f067aa0ba902b7"
+    assert db["traceId"] == server["traceId"]
+    assert db["parentId"] == server["id"]
+
+
+# -----------------------------
+# Test: outbound headers carry the active span
+# -----------------------------
+def test_inject_headers_inside_span(exported_spans):
+    assert "traceparent" not in tracing.inject_headers()
+
+    with tracing.span("outer") as outer:
+        headers = tracing.inject_headers({"Accept": "application/json"})
+
+    assert headers["Accept"] == "application/json"
+    assert headers["traceparent"] == outer.context.traceparent()
+
+
+# -----------------------------
+# Test: tracing disabled is a no-op
+# -----------------------------
+def test_disabled_tracing_is_noop():
+    tracing.configure()
+    with tracing.span("ignored") as span:
+        span.set_attribute("key", "value")
+    assert tracing.current_span_context() is None
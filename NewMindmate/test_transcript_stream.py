@@ -0,0 +1,162 @@
+# test_transcript_stream.py
+import pytest
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from NewMindmate.main import app
+from NewMindmate.services.transcript_stream import TRANSCRIPT_STREAMS, TranscriptStreamManager
+
+client = TestClient(app)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def mock_supabase():
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value.data = []
+    return supabase
+
+
+def inserted_chunks(supabase):
+    return [call[0][0] for call in supabase.table.return_value.insert.call_args_list]
+
+
+def message(i):
+    return {"message": f"line {i}", "sender": "user" if i % 2 else "ai"}
+
+
+# -----------------------------
+# Test: batched appends
+# -----------------------------
+def test_flushes_every_n_messages(mock_supabase):
+    streams = TranscriptStreamManager(max_messages=3, max_seconds=60)
+    session_id = str(uuid4())
+
+    written = [streams.append(mock_supabase, session_id, message(i)) for i in range(7)]
+
+    assert written == [0, 0, 3, 0, 0, 3, 0]
+    chunks = inserted_chunks(mock_supabase)
+    assert [c["seq"] for c in chunks] == [0, 1]
+    assert chunks[1]["content"] == "Patient: line 3\nAssistant: line 4\nPatient: line 5"
+
+    snapshot = streams.read(mock_supabase, session_id)
+    assert snapshot["lines"] == 7 and snapshot["flushed_lines"] == 6 and snapshot["live"]
+
+    transcript = streams.finalize(mock_supabase, session_id)
+    assert transcript.count("\n") == 6
+    assert inserted_chunks(mock_supabase)[-1]["content"] == "Assistant: line 6"
+    mock_supabase.table.return_value.update.assert_called_once_with({"transcript": transcript})
+    mock_supabase.table.return_value.delete.return_value.eq.assert_called_once_with("session_id", session_id)
+    assert streams.get(session_id) is None
+
+
+def test_flushes_after_max_seconds(mock_supabase):
+    streams = TranscriptStreamManager(max_messages=100, max_seconds=0)
+    assert streams.append(mock_supabase, "s", message(1)) == 1
+
+
+def test_resumes_after_stored_chunks(mock_supabase):
+    mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value.data = [
+        {"seq": 0, "content": "Patient: a\nAssistant: b"},
+        {"seq": 1, "content": "Patient: c"},
+    ]
+    streams = TranscriptStreamManager(max_messages=1, max_seconds=60)
+
+    streams.append(mock_supabase, "s", message(2))
+
+    assert inserted_chunks(mock_supabase)[0]["seq"] == 2
+    assert streams.read(mock_supabase, "s")["transcript"] == "Patient: a\nAssistant: b\nPatient: c\nAssistant: line 2"
+
+
+def test_finalized_transcript_is_read_from_the_session(mock_supabase):
+    session_id = str(uuid4())
+    chunks = mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value
+    chunks.data = [{"seq": 0, "content": "Patient: a"}]
+    # The transcript is edited after the stream ends
+    mock_supabase.table.return_value.delete.return_value.eq.return_value.execute.side_effect = lambda: setattr(chunks, "data", [])
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"session_id": session_id, "transcript": "Patient: a (edited)"}
+    ]
+    streams = TranscriptStreamManager()
+    streams.open(mock_supabase, session_id)
+    streams.finalize(mock_supabase, session_id)
+
+    assert streams.read(mock_supabase, session_id) is None
+    with patch("NewMindmate.main.get_supabase", return_value=mock_supabase):
+        assert client.get(f"/sessions/{session_id}/transcript").json()["transcript"] == "Patient: a (edited)"
+
+
+# -----------------------------
+# Test: WebSocket ingest endpoint
+# -----------------------------
+def test_websocket_stream_writes_transcript(mock_supabase):
+    session_id = str(uuid4())
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"session_id": session_id}
+    ]
+
+    with patch("NewMindmate.main.get_supabase", return_value=mock_supabase):
+        with client.websocket_connect(f"/sessions/{session_id}/transcript/stream?flush_messages=2") as ws:
+            for i in range(3):
+                ws.send_json(message(i))
+                ack = ws.receive_json()
+            assert ack == {"type": "ack", "lines": 3, "flushed_lines": 2, "flushed": 0}
+
+            live = client.get(f"/sessions/{session_id}/transcript").json()
+            assert live["live"] and live["lines"] == 3
+
+            ws.send_json({"type": "end"})
+            assert ws.receive_json() == {"type": "final", "lines": 3}
+
+    assert TRANSCRIPT_STREAMS.get(session_id) is None
+    final = mock_supabase.table.return_value.update.call_args[0][0]["transcript"]
+    assert final == "Assistant: line 0\nPatient: line 1\nAssistant: line 2"
+
+
+def test_websocket_reconnect_continues_the_transcript(mock_supabase):
+    session_id = str(uuid4())
+    table = mock_supabase.table.return_value
+    table.select.return_value.eq.return_value.execute.return_value.data = [{"session_id": session_id}]
+    stored = []
+    table.insert.side_effect = lambda row: stored.append(row) or MagicMock()
+    table.select.return_value.eq.return_value.order.return_value.execute.side_effect = lambda: MagicMock(data=list(stored))
+    table.delete.return_value.eq.return_value.execute.side_effect = lambda: stored.clear()
+
+    with patch("NewMindmate.main.get_supabase", return_value=mock_supabase):
+        with client.websocket_connect(f"/sessions/{session_id}/transcript/stream?flush_messages=10") as ws:
+            for i in range(4):
+                ws.send_json(message(i))
+                ws.receive_json()
+            ws.close()
+            # Leaving the block cancels the app, so wait for it to handle the disconnect
+            deadline = time.monotonic() + 5
+            while TRANSCRIPT_STREAMS.get(session_id) is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+        # Dropped without "end": pending lines are flushed, nothing is finalized
+        assert TRANSCRIPT_STREAMS.get(session_id) is None
+        table.update.assert_not_called()
+        assert [chunk["line_count"] for chunk in stored] == [4]
+
+        with client.websocket_connect(f"/sessions/{session_id}/transcript/stream?flush_messages=10") as ws:
+            for i in range(4, 6):
+                ws.send_json(message(i))
+                ws.receive_json()
+            ws.send_json({"type": "end"})
+            assert ws.receive_json() == {"type": "final", "lines": 6}
+
+    final = table.update.call_args[0][0]["transcript"]
+    assert final.splitlines() == [f"{'Patient' if i % 2 else 'Assistant'}: line {i}" for i in range(6)]
+    assert stored == []
+
+
+def test_websocket_rejects_unknown_session(mock_supabase):
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = []
+
+    with patch("NewMindmate.main.get_supabase", return_value=mock_supabase):
+        with pytest.raises(Exception):
+            with client.websocket_connect(f"/sessions/{uuid4()}/transcript/stream") as ws:
+                ws.receive_json()
@@ -0,0 +1,120 @@
+# test_upstream.py
+import asyncio
+import httpx
+import pytest
+
+from NewMindmate.services import metrics
+from NewMindmate.services.upstream import AdaptiveTimeout, request
+
+
+def make_policy(endpoint, samples=(), **kwargs):
+    options = dict(default=10.0, floor=0.5, ceiling=20.0, min_samples=5)
+    options.update(kwargs)
+    policy = AdaptiveTimeout("test_service", endpoint, **options)
+    for seconds in samples:
+        policy.observe(seconds)
+    return policy
+
+
+def response_after(delay, body):
+    async def send(timeout, headers):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json=body)
+    return send
+
+
+# -----------------------------
+# Test: adaptive timeouts
+# -----------------------------
+def test_timeout_uses_default_until_enough_samples():
+    policy = make_policy("/a", samples=[0.1] * 4)
+    assert policy.timeout() == 10.0
+    assert policy.hedge_delay() is None
+
+    policy.observe(0.1)
+    assert policy.timeout() == pytest.approx(0.5)  # 3 x p99 = 0.3, clamped to the floor
+    assert metrics.UPSTREAM_TIMEOUT_SECONDS.value("test_service", "/a") == pytest.approx(0.5)
+
+
+def test_timeout_tracks_p99_within_bounds():
+    policy = make_policy("/b", samples=[1.0] * 99 + [4.0])
+    assert policy.timeout() == pytest.approx(12.0)
+
+    for _ in range(100):
+        policy.observe(30.0)
+    assert policy.timeout() == 20.0
+
+
+@pytest.mark.asyncio
+async def test_consecutive_timeouts_back_off_until_an_answer():
+    policy = make_policy("/c", samples=[0.2] * 5)
+    assert policy.timeout() == pytest.approx(0.6)
+
+    async def stuck(timeout, headers):
+        raise httpx.ReadTimeout("stuck")
+
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            await request(policy, stuck)
+    assert policy.timeout() == pytest.approx(4.8)
+    assert policy.percentile(0.99) == pytest.approx(0.2)
+
+    await request(policy, response_after(0.0, {}))
+    assert policy.timeout() == pytest.approx(0.6)
+
+
+# -----------------------------
+# Test: hedged requests
+# -----------------------------
+@pytest.mark.asyncio
+async def test_fast_first_attempt_is_not_hedged():
+    policy = make_policy("/d", samples=[0.05] * 10)
+    before = metrics.UPSTREAM_HEDGES.value("test_service", "/d")
+
+    response = await request(policy, response_after(0.0, {"ok": 1}), hedge=True)
+
+    assert response.json() == {"ok": 1}
+    assert metrics.UPSTREAM_HEDGES.value("test_service", "/d") == before
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_over_stuck_attempt():
+    policy = make_policy("/e", samples=[0.05] * 10)
+    attempts = []
+
+    async def send(timeout, headers):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            await asyncio.sleep(5)  # stuck connection
+            return httpx.Response(200, json={"attempt": 1})
+        return httpx.Response(200, json={"attempt": 2})
+
+    response = await asyncio.wait_for(request(policy, send, hedge=True), 1)
+
+    assert response.json() == {"attempt": 2}
+    assert len(attempts) == 2
+    assert metrics.UPSTREAM_HEDGES.value("test_service", "/e") == 1
+    assert metrics.UPSTREAM_HEDGE_WINS.value("test_service", "/e") == 1
+    # The abandoned attempt is not counted as an upstream error
+    await asyncio.sleep(0)
+    assert metrics.UPSTREAM_REQUEST_ERRORS.value("test_service", "/e") == 0
+
+
+@pytest.mark.asyncio
+async def test_primary_can_still_win_after_hedge_fired():
+    policy = make_policy("/f", samples=[0.05] * 10)
+    attempts = []
+
+    async def send(timeout, headers):
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.08)
+            return httpx.Response(200, json={"attempt": 1})
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={"attempt": 2})
+
+    response = await asyncio.wait_for(request(policy, send, hedge=True), 1)
+
+    assert response.json() == {"attempt": 1}
+    assert metrics.UPSTREAM_HEDGES.value("test_service", "/f") == 1
+    assert metrics.UPSTREAM_HEDGE_WINS.value("test_service", "/f") == 0
@@ -0,0 +1,145 @@
+# test_vector_utils.py
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from NewMindmate.db import vector_utils
+from NewMindmate.db.vector_utils import (
+    VECTOR_DIM,
+    as_float32,
+    decode_embedding,
+    encode_embedding,
+    format_memory_embedding,
+    hybrid_search_memories,
+    reciprocal_rank_fusion,
+    store_memory_embedding,
+    to_pgvector,
+)
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def embedding():
+    rng = np.random.default_rng(42)
+    vec = rng.standard_normal(VECTOR_DIM).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+@pytest.fixture
+def mock_supabase():
+    client = MagicMock()
+    client.table.return_value.insert.return_value.execute.return_value.data = [{"memory_id": "x"}]
+    return client
+
+
+# -----------------------------
+# Test: compact encodings
+# -----------------------------
+def test_base64_roundtrip(embedding):
+    encoded = encode_embedding(embedding)
+    assert len(encoded) < len(str(embedding.tolist())) / 3
+    assert np.array_equal(decode_embedding(encoded), embedding)
+
+    half = decode_embedding(encode_embedding(embedding, "base64_f16"), "base64_f16")
+    assert half.dtype == np.float32
+    assert np.allclose(half, embedding, atol=1e-3)
+
+
+def test_pgvector_literal_roundtrip(embedding):
+    literal = to_pgvector(embedding)
+    assert literal.startswith("[") and literal.endswith("]")
+    assert np.allclose(as_float32(literal), embedding, rtol=1e-6)
+
+
+def test_as_float32_accepts_lists_and_base64(embedding):
+    assert as_float32(embedding.tolist()).dtype == np.float32
+    assert np.array_equal(as_float32(encode_embedding(embedding)), embedding)
+
+
+# -----------------------------
+# Test: response formatting
+# -----------------------------
+def test_format_memory_embedding(embedding):
+    literal = to_pgvector(embedding)
+
+    row = format_memory_embedding({"embedding": literal}, "base64")
+    assert row["embedding_encoding"] == "float32-le-base64"
+    assert np.allclose(decode_embedding(row["embedding"]), embedding, rtol=1e-6)
+
+    row = format_memory_embedding({"embedding": literal}, "json")
+    assert isinstance(row["embedding"], list) and len(row["embedding"]) == VECTOR_DIM
+
+    assert "embedding" not in format_memory_embedding({"embedding": literal}, "none")
+    assert format_memory_embedding({"embedding": None}, "base64") == {"embedding": None}
+
+
+# -----------------------------
+# Test: store_memory_embedding sends a pgvector literal
+# -----------------------------
+def test_store_memory_embedding_payload(mock_supabase, embedding):
+    store_memory_embedding(mock_supabase, str(uuid4()), "Boston trip", "Visited granddaughter", embedding)
+
+    payload = mock_supabase.table.return_value.insert.call_args[0][0]
+    assert isinstance(payload["embedding"], str)
+    assert np.allclose(as_float32(payload["embedding"]), embedding, rtol=1e-6)
+
+
+# -----------------------------
+# Test: reciprocal rank fusion
+# -----------------------------
+def test_reciprocal_rank_fusion_prefers_agreement():
+    text = [{"memory_id": "boston"}, {"memory_id": "garden"}]
+    vector = [{"memory_id": "granddaughter"}, {"memory_id": "boston"}]
+
+    fused = reciprocal_rank_fusion({"text": text, "vector": vector}, limit=3)
+
+    assert [r["memory_id"] for r in fused] == ["boston", "granddaughter", "garden"]
+    assert fused[0]["text_rank"] == 1 and fused[0]["vector_rank"] == 2
+    assert fused[2]["vector_rank"] is None
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 62)
+
+
+# -----------------------------
+# Test: hybrid search paths
+# -----------------------------
+def test_hybrid_search_patient_scoped_uses_index(embedding):
+    patient_id = str(uuid4())
+    other = -embedding
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"memory_id": "m1", "patient_id": patient_id, "title": "Boston", "emotional_tone": "happy",
+         "significance_level": 3, "embedding": to_pgvector(embedding)},
+        {"memory_id": "m2", "patient_id": patient_id, "title": "Hospital", "emotional_tone": "sad",
+         "significance_level": 1, "embedding": to_pgvector(other)},
+    ]
+    supabase.rpc.return_value.execute.return_value.data = [{"memory_id": "m2", "title": "Hospital"}]
+
+    try:
+        results = hybrid_search_memories(
+            supabase, query="hospital", query_embedding=embedding, patient_id=patient_id, emotional_tone="happy"
+        )
+    finally:
+        vector_utils.MEMORY_INDEX.invalidate(patient_id)
+
+    assert {r["memory_id"] for r in results} == {"m1", "m2"}
+    m1 = next(r for r in results if r["memory_id"] == "m1")
+    assert m1["vector_rank"] == 1 and m1["text_rank"] is None
+    rpc_params = supabase.rpc.call_args[0][1]
+    assert rpc_params["p_query_embedding"] is None  # vector side stayed in-process
+
+
+def test_hybrid_search_unscoped_uses_rpc(embedding):
+    supabase = MagicMock()
+    supabase.rpc.return_value.execute.return_value.data = [{"memory_id": "m1", "score": 0.03}]
+
+    results = hybrid_search_memories(supabase, query="Boston", query_embedding=embedding, min_significance=2)
+
+    name, params = supabase.rpc.call_args[0]
+    assert name == "search_memories_hybrid"
+    assert params["p_query"] == "Boston"
+    assert params["p_query_embedding"].startswith("[")
+    assert params["p_min_significance"] == 2
+    assert results == [{"memory_id": "m1", "score": 0.03}]